@@ -2,12 +2,16 @@
 Server Flask per l'API REST dell'applicazione Running Analyzer
 Versione con approccio geometrico/statistico (no Deep Learning)
 """
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, send_file
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import os
+import re
 import sys
 import json
+import shutil
+import time
+import uuid
 import logging
 import numpy as np
 from datetime import datetime
@@ -15,6 +19,18 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from config import Config
 from pose_engine import PoseEngine
 from baseline_manager import BaselineHistory
+from baseline_registry import BaselineRegistry, DEFAULT_ATHLETE_ID, valid_athlete_id
+from baseline_cache import CachedJsonFile
+from jobs import JobManager, get_job
+from cache_stats import cache_stats, cache_disk_usage
+from skeleton_videos import SkeletonVideoStore
+from video_encoder import probe_encoders
+from gait_cycle import select_gait_cycles, ankle_height_signal, raw_ankle_height, align_to_cycle
+from running_stats import summarize_stats, ESTIMATORS
+from ghost_store import GhostFrameStore, legacy_frame_filename, parse_frame_filename, pack_frames
+import cache_maintenance
+import rescore_analyses
+from scoring import frame_timeline
 
 # Configurazione logging
 def setup_logging():
@@ -37,19 +53,51 @@ logger = logging.getLogger('APP')
 
 app = Flask(__name__)
 app.config.from_object(Config)
-CORS(app)
+CORS(app, expose_headers=['Retry-After'])
 
 # Inizializza le cartelle
 Config.init_app()
 
+# Verifica una volta per processo gli encoder video disponibili (risultato in cache)
+probe_encoders(Config.FFMPEG_BINARY)
+
 # Percorso del file baseline JSON
 BASELINE_JSON_PATH = os.path.join(Config.MODEL_FOLDER, 'baseline.json')
 
+# Baseline corrente in memoria, riletta solo se il file cambia (scritture con write/update)
+baseline_file = CachedJsonFile(BASELINE_JSON_PATH)
+
 # Percorso del file baseline history JSON (per baseline incrementale)
 BASELINE_HISTORY_PATH = os.path.join(Config.MODEL_FOLDER, 'baseline_history.json')
 
 # Inizializza BaselineHistory
-baseline_history = BaselineHistory(BASELINE_HISTORY_PATH, Config.GHOST_FRAMES_FOLDER)
+baseline_history = BaselineHistory(BASELINE_HISTORY_PATH, Config.GHOST_FRAMES_FOLDER,
+                                   ewma_alpha=Config.BASELINE_EWMA_ALPHA)
+
+# Frame Ghost Vision (archivio indicizzato, con fallback ai PNG singoli)
+ghost_frames = GhostFrameStore(Config.GHOST_FRAMES_FOLDER)
+
+# Baseline per atleta, vista e velocità (baseline.json resta la baseline corrente)
+baseline_registry = BaselineRegistry(Config.BASELINE_REGISTRY_FOLDER)
+
+# Coda per i job di manutenzione (bassa priorità, un job alla volta)
+maintenance_jobs = JobManager('maintenance', max_workers=1, low_priority=True)
+
+# Generazione ghost frames in background (una alla volta: scrivono la stessa cartella)
+ghost_jobs = JobManager('ghost_frames', max_workers=1)
+
+# Video con scheletro (renderizzati alla prima richiesta in modalità lazy)
+render_jobs = JobManager('skeleton_render', max_workers=2)
+skeleton_videos = SkeletonVideoStore(Config.PROCESSED_VIDEOS_FOLDER, render_jobs,
+                                     scale=Config.SKELETON_VIDEO_SCALE,
+                                     max_source_age_hours=Config.SKELETON_SOURCE_MAX_AGE_HOURS,
+                                     max_sources_mb=Config.SKELETON_SOURCES_MAX_MB)
+skeleton_videos.prune_sources()  # Sorgenti scaduti durante il fermo del server
+SKELETON_VIDEO_LAZY = Config.SKELETON_VIDEO_MODE == 'lazy'
+
+# ID degli stream HLS progressivi (generato dal server, usato come nome di cartella)
+STREAM_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+STREAM_CLAIM_FILE = '.claimed'  # Creato dall'analisi che scrive lo stream (uno solo per ID)
 
 # Percorsi frontend
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
@@ -91,12 +139,333 @@ def safe_remove_file(filepath):
         return False
 
 
+def send_media_file(path, mimetype, max_age=3600):
+    """
+    Invia un file multimediale con supporto a richieste condizionali e parziali
+    
+    - ETag forte derivato dall'identità del file (inode, dimensione, mtime in ns):
+      cambia quando il file viene rigenerato, anche con lo stesso nome
+    - If-None-Match / If-Modified-Since -> 304 senza corpo
+    - Range -> 206 con solo i byte richiesti (seek nel video senza riscaricarlo)
+    - Senza Range il file viene passato al wsgi.file_wrapper del server (sendfile
+      con gunicorn); con Config.USE_X_SENDFILE l'invio è delegato al proxy
+    
+    Args:
+        path: Percorso del file (già validato)
+        mimetype: Content-Type della risposta
+        max_age: Durata della cache del client in secondi
+        
+    Returns:
+        Risposta Flask (200, 206, 304 o 416)
+    """
+    stat = os.stat(path)
+    etag = f"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"
+    response = send_file(
+        path,
+        mimetype=mimetype,
+        conditional=True,
+        etag=etag,
+        last_modified=stat.st_mtime,
+        max_age=max_age
+    )
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Cache-Control'] = f'public, max-age={max_age}'
+    return response
+
+
+def publish_skeleton_video(video_data, source_path, keep_source=False):
+    """
+    Registra il video con scheletro di un'analisi e ne prepara gli URL
+    
+    In modalità lazy il video caricato viene spostato in sources/ per il
+    rendering su richiesta: va chiamata prima di rimuovere i video temporanei.
+    
+    Args:
+        video_data: Risultato di PoseEngine.process_video
+        source_path: Percorso del video caricato
+        keep_source: True se source_path serve ancora (es. ai ghost frames):
+            il video viene collegato o copiato invece di essere spostato
+        
+    Returns:
+        Tupla (skeleton_video_url, landmarks_url), None se non disponibili
+    """
+    from urllib.parse import quote
+    try:
+        skeleton_filename = skeleton_videos.publish(video_data, source_path, lazy=SKELETON_VIDEO_LAZY,
+                                                    keep_source=keep_source)
+    except Exception as e:
+        logger.warning(f"⚠ Errore nella registrazione del video con scheletro: {type(e).__name__}: {e}")
+        return None, None
+    
+    if not skeleton_filename:
+        logger.warning(f"⚠ Video scheletro non disponibile per: {os.path.basename(source_path)}")
+        return None, None
+    
+    # URL encode il nome del file per gestire caratteri speciali
+    skeleton_video_url = f'/api/processed_video/{quote(skeleton_filename)}'
+    landmarks_url = None
+    if os.path.exists(skeleton_videos.landmarks_path(skeleton_filename)):
+        landmarks_url = f'/api/landmarks/{quote(skeleton_filename)}'
+    logger.info(f"📹 Video con scheletro disponibile: {skeleton_filename}")
+    logger.info(f"📹 URL video: {skeleton_video_url}")
+    return skeleton_video_url, landmarks_url
+
+
+def prune_skeleton_streams():
+    """
+    Rimuove gli stream HLS non modificati da Config.SKELETON_STREAM_MAX_AGE_MINUTES
+    
+    Il video con scheletro definitivo resta su /api/processed_video: gli stream
+    servono solo a seguire l'analisi in corso.
+    
+    Returns:
+        Numero di stream rimossi
+    """
+    max_age = Config.SKELETON_STREAM_MAX_AGE_MINUTES * 60
+    if max_age <= 0:
+        return 0
+    try:
+        names = os.listdir(Config.SKELETON_STREAM_FOLDER)
+    except FileNotFoundError:
+        return 0
+    now = time.time()
+    removed = 0
+    for name in names:
+        stream_dir = os.path.join(Config.SKELETON_STREAM_FOLDER, name)
+        try:
+            # La cartella cambia a ogni segmento e a ogni aggiornamento della playlist
+            age = now - os.stat(stream_dir).st_mtime
+        except OSError:
+            continue
+        if os.path.isdir(stream_dir) and age > max_age:
+            shutil.rmtree(stream_dir, ignore_errors=True)
+            removed += 1
+    if removed:
+        logger.info(f"🧹 Rimossi {removed} stream HLS scaduti")
+    return removed
+
+
+def claim_skeleton_stream(stream_id):
+    """
+    Assegna a un'analisi uno stream riservato con POST /api/skeleton_stream
+    
+    Il file STREAM_CLAIM_FILE viene creato in modo esclusivo: anche con più
+    worker un solo processo scrive nella cartella dello stream.
+    
+    Returns:
+        Cartella dello stream, o None se l'ID non è stato riservato o è già in uso
+    """
+    if not STREAM_ID_PATTERN.match(stream_id):
+        return None
+    stream_dir = os.path.join(Config.SKELETON_STREAM_FOLDER, stream_id)
+    try:
+        os.close(os.open(os.path.join(stream_dir, STREAM_CLAIM_FILE), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except OSError:
+        return None
+    return stream_dir
+
+
+prune_skeleton_streams()  # Stream rimasti da un avvio precedente
+
+
+def generate_ghost_vision(job, video_path, fps, best_video_idx, baseline_created_at, remove_video=False,
+                          cycle=None):
+    """
+    Genera i ghost frames della baseline e li registra in baseline.json
+    
+    Eseguita inline da create_baseline o come job in background
+    (Config.GHOST_FRAMES_DEFERRED).
+    
+    Args:
+        job: Handle del job (None se eseguita inline)
+        video_path: Video migliore della baseline
+        fps: FPS del video
+        best_video_idx: Indice del video tra quelli della baseline
+        baseline_created_at: created_at della baseline a cui appartengono i frame
+        remove_video: Se True, rimuove il video al termine
+        cycle: Ciclo del passo da riprodurre in loop (gait_cycle), None = tutto il video
+    
+    Returns:
+        Informazioni sui ghost frames salvate nella baseline
+    """
+    try:
+        logger.info(f"🎨 Colore silhouette: Ciano/Azzurro (0, 255, 255)")
+        logger.info(f"📁 Cartella output: {Config.GHOST_FRAMES_FOLDER}")
+        logger.info("🔄 Avvio generazione ghost frames...")
+        
+        ghost_engine = PoseEngine(
+            model_complexity=Config.MEDIAPIPE_MODEL_COMPLEXITY,
+            min_detection_confidence=Config.MEDIAPIPE_MIN_DETECTION_CONFIDENCE,
+            min_tracking_confidence=Config.MEDIAPIPE_MIN_TRACKING_CONFIDENCE,
+            enable_segmentation=True
+        )
+        
+        # Genera ghost frames nella cartella dedicata
+        ghost_frames_info = ghost_engine.generate_ghost_frames(
+            video_path,
+            Config.GHOST_FRAMES_FOLDER,
+            fps=fps,
+            ghost_color=(0, 255, 255),  # Ciano/azzurro
+            job=job,
+            cycle=cycle
+        )
+    finally:
+        if remove_video:
+            safe_remove_file(video_path)
+    
+    logger.info("=" * 60)
+    logger.info("✅ GHOST VISION GENERATA CON SUCCESSO!")
+    logger.info(f"📊 Frame processati: {ghost_frames_info['frames_processed']}/{ghost_frames_info['total_frames']}")
+    logger.info(f"📐 Dimensioni video: {ghost_frames_info['video_width']}x{ghost_frames_info['video_height']}")
+    logger.info(f"🎬 FPS: {ghost_frames_info['fps']:.2f}")
+    logger.info(f"📁 Frame salvati in: {ghost_frames_info['output_folder']}")
+    logger.info(f"👻 Ghost Vision disponibile per confronto visivo!")
+    logger.info("=" * 60)
+    
+    ghost_info = {
+        'total_frames': ghost_frames_info['total_frames'],
+        'frames_processed': ghost_frames_info['frames_processed'],
+        'fps': ghost_frames_info['fps'],
+        'video_width': ghost_frames_info['video_width'],
+        'video_height': ghost_frames_info['video_height'],
+        'best_video_index': best_video_idx
+    }
+    if cycle is not None:
+        ghost_info['cycle'] = {'start': cycle['start'], 'length': cycle['length'], 'n_cycles': cycle['n_cycles']}
+    
+    # Aggiorna baseline.json con le informazioni sui ghost_frames
+    # (solo se nel frattempo non è stata creata un'altra baseline)
+    logger.info("💾 Aggiornamento baseline.json con informazioni Ghost Vision...")
+    def add_ghost_info(baseline_stats):
+        if baseline_stats is None or baseline_stats.get('created_at') != baseline_created_at:
+            return None
+        return dict(baseline_stats, ghost_frames=ghost_info)
+    
+    try:
+        if baseline_file.update(add_ghost_info) is None:
+            logger.warning("  ⚠ Baseline sostituita durante la generazione: baseline.json non aggiornato")
+        else:
+            logger.info("  ✓ Baseline aggiornata con successo (include ghost_frames)")
+    except Exception as e:
+        logger.error(f"⚠ Errore nell'aggiornamento baseline: {type(e).__name__}: {str(e)}", exc_info=True)
+    
+    return ghost_info
+
+
+def compute_ghost_frame_map(image_landmarks, fps, pack=None):
+    """
+    Allineamento di fase tra il video dell'utente e il ciclo Ghost Vision
+    
+    Args:
+        image_landmarks: Landmark 2D del video dell'utente (n_frame, 33, 3)
+        fps: FPS del video dell'utente
+        pack: Archivio ghost già aperto (default: quello corrente), da passare
+            quando serve anche altro dallo stesso archivio (es. l'etag)
+    
+    Returns:
+        Array con il frame ghost per ogni frame dell'utente, o None se la baseline
+        non ha un ciclo del passo in loop (frame ghost = frame utente)
+    """
+    if pack is None:
+        pack = ghost_frames.open_pack()
+    if pack is None or image_landmarks is None:
+        return None
+    cycle = pack.cycle
+    if cycle is None or 'ankle_height' not in cycle:
+        return None
+    ghost_fps = pack.meta.get('fps') or fps
+    return align_to_cycle(ankle_height_signal(image_landmarks), fps, cycle, ghost_fps)
+
+
+def ghost_vision_status():
+    """
+    Stato della Ghost Vision della baseline corrente
+
+    Returns:
+        Dizionario con 'state' ('pending' se la generazione è in coda o in
+        corso, 'ready', 'error' o 'unavailable'), 'frames' disponibili e, se
+        presente, l'ultimo job di generazione ('job')
+    """
+    jobs = ghost_jobs.list('ghost_frames')
+    job = jobs[0] if jobs else None
+    n_frames = ghost_frames.frame_count()
+
+    if job is not None and job['status'] in ('queued', 'running'):
+        state = 'pending'
+    elif n_frames > 0:
+        state = 'ready'
+    elif job is not None and job['status'] == 'error':
+        state = 'error'
+    else:
+        state = 'unavailable'
+
+    status = {'state': state, 'frames': n_frames if state == 'ready' else 0, 'job': job}
+    if job is not None:
+        status['progress'] = job['progress']
+        status['message'] = job['error'] if state == 'error' else job['message']
+    return status
+
+
+def load_current_baseline():
+    """Baseline corrente (baseline.json, dalla cache: da non modificare), o None se non è stata ancora creata"""
+    return baseline_file.get()
+
+
+def register_current_baseline():
+    """Aggiunge al registro la baseline corrente creata prima del registro (una volta)"""
+    try:
+        baseline_stats = load_current_baseline()
+        if baseline_stats is None or 'speed_kmh' not in baseline_stats:
+            return
+        athlete_id = baseline_stats.get('athlete_id', DEFAULT_ATHLETE_ID)
+        view_type = baseline_stats.get('view_type', 'posterior')
+        if baseline_registry.get(athlete_id, view_type, baseline_stats['speed_kmh']) is None:
+            baseline_registry.register(dict(baseline_stats, view_type=view_type), athlete_id)
+    except Exception as e:
+        logger.warning(f"⚠ Baseline corrente non aggiunta al registro: {type(e).__name__}: {e}")
+
+
+def select_baseline(athlete_id, view_type, speed):
+    """
+    Baseline per un'analisi
+
+    La baseline corrente (baseline.json, l'unica con Ghost Vision) se
+    corrisponde ad atleta, vista e velocità; altrimenti quella del registro
+    con la velocità più vicina o interpolata (BaselineRegistry.select).
+
+    Args:
+        athlete_id: ID atleta (None = atleta della baseline corrente)
+        view_type: 'posterior' o 'lateral'
+        speed: Velocità del tapis roulant (km/h)
+
+    Returns:
+        Tupla (statistiche baseline o None, modalità: 'current', 'exact',
+        'nearest', 'interpolated' o 'none', ID atleta)
+    """
+    current = load_current_baseline()
+    if athlete_id is None:
+        athlete_id = current.get('athlete_id', DEFAULT_ATHLETE_ID) if current else DEFAULT_ATHLETE_ID
+    if current is not None and current.get('athlete_id', DEFAULT_ATHLETE_ID) == athlete_id and \
+            current.get('view_type', 'posterior') == view_type and \
+            abs(speed - current['speed_kmh']) <= Config.BASELINE_SPEED_TOLERANCE_KMH:
+        return current, 'current', athlete_id
+    baseline_stats, mode = baseline_registry.select(athlete_id, view_type, speed,
+                                                    Config.BASELINE_SPEED_TOLERANCE_KMH,
+                                                    Config.BASELINE_INTERPOLATION_MAX_GAP_KMH)
+    return baseline_stats, mode, athlete_id
+
+
+register_current_baseline()
+
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Endpoint per verificare lo stato del server"""
     return jsonify({
         'status': 'success',
-        'message': 'Running Analyzer Server attivo'
+        'message': 'Running Analyzer Server attivo',
+        'video_encoders': probe_encoders(Config.FFMPEG_BINARY),
+        'baseline_videos': {'min': Config.BASELINE_MIN_VIDEOS, 'max': Config.BASELINE_MAX_VIDEOS}
     })
 
 
@@ -118,6 +487,27 @@ def get_processed_video(filename):
     logger.debug(f"📹 Percorso completo: {video_path}")
     logger.debug(f"📹 File esiste: {os.path.exists(video_path)}")
     
+    # Rendering su richiesta: il video viene disegnato in un job alla prima richiesta e
+    # il client riprova dopo Retry-After (la richiesta non attende il rendering)
+    if not os.path.exists(video_path) and skeleton_videos.can_render(filename):
+        job_id = skeleton_videos.request_render(filename)
+        job = get_job(job_id) or {}
+        if job.get('status') == 'error':
+            return jsonify({
+                'status': 'error',
+                'message': f"Errore nel rendering del video: {job.get('error')}"
+            }), 500
+        if not os.path.exists(video_path):
+            logger.info(f"🎬 Rendering video con scheletro su richiesta: {filename} (job {job_id})")
+            response = jsonify({
+                'status': 'pending',
+                'message': 'Video con scheletro in preparazione',
+                'job_id': job_id,
+                'retry_after': Config.SKELETON_VIDEO_RETRY_AFTER_SECONDS
+            })
+            response.headers['Retry-After'] = str(Config.SKELETON_VIDEO_RETRY_AFTER_SECONDS)
+            return response, 202
+    
     if not os.path.exists(video_path):
         logger.warning(f"⚠ Video non trovato: {video_path}")
         # Lista tutti i file nella directory per debug
@@ -139,12 +529,163 @@ def get_processed_video(filename):
     
     logger.info(f"✅ Invio video: {filename}")
     
-    # Aggiungi headers per supporto video streaming e CORS
-    response = send_from_directory(Config.PROCESSED_VIDEOS_FOLDER, filename)
-    response.headers['Accept-Ranges'] = 'bytes'
-    response.headers['Content-Type'] = 'video/mp4'
-    response.headers['Cache-Control'] = 'public, max-age=3600'
-    return response
+    # Range, ETag e richieste condizionali per lo streaming del video
+    return send_media_file(video_path, 'video/mp4')
+
+
+@app.route('/api/skeleton_stream', methods=['POST'])
+def create_skeleton_stream():
+    """
+    Endpoint per riservare lo stream HLS di un'analisi
+    
+    L'ID è generato dal server: il client lo invia a /api/detect_anomaly (campo
+    stream_id) e intanto segue la playlist restituita. Un ID vale per una sola analisi.
+    """
+    prune_skeleton_streams()
+    stream_id = uuid.uuid4().hex
+    os.makedirs(os.path.join(Config.SKELETON_STREAM_FOLDER, stream_id))
+    return jsonify({
+        'status': 'success',
+        'stream_id': stream_id,
+        'playlist_url': f'/api/skeleton_stream/{stream_id}/index.m3u8'
+    })
+
+
+@app.route('/api/skeleton_stream/<stream_id>/<filename>', methods=['GET'])
+def get_skeleton_stream(stream_id, filename):
+    """
+    Endpoint per lo stream HLS con scheletro scritto durante l'analisi
+    
+    La playlist (index.m3u8) cresce mentre l'analisi procede: il client la
+    ricarica finché non contiene #EXT-X-ENDLIST. Prima del primo segmento
+    la risposta è 404.
+    """
+    if not STREAM_ID_PATTERN.match(stream_id):
+        return jsonify({
+            'status': 'error',
+            'message': 'stream_id non valido'
+        }), 400
+    
+    filename = os.path.basename(filename)
+    if filename == 'index.m3u8':
+        mimetype = 'application/vnd.apple.mpegurl'
+    elif filename.endswith('.ts'):
+        mimetype = 'video/mp2t'
+    else:
+        return jsonify({
+            'status': 'error',
+            'message': 'Accesso negato'
+        }), 403
+    
+    path = os.path.join(Config.SKELETON_STREAM_FOLDER, stream_id, filename)
+    if not os.path.exists(path):
+        return jsonify({
+            'status': 'error',
+            'message': f'Stream non (ancora) disponibile: {stream_id}/{filename}'
+        }), 404
+    
+    # La playlist cambia durante l'analisi: va sempre rivalidata; i segmenti sono immutabili
+    return send_media_file(path, mimetype, max_age=0 if filename == 'index.m3u8' else 3600)
+
+
+@app.route('/api/landmarks/<path:filename>', methods=['GET'])
+def get_landmarks(filename):
+    """
+    Endpoint per i landmark 2D di un video con scheletro
+    
+    Per i client che disegnano l'overlay da soli (nessuna codifica video).
+    Query param 'format': 'json' (default) oppure 'bin' (float32 little-endian
+    n_frame x 33 x 3 con x, y normalizzati e visibility; NaN = pose assente).
+    """
+    from urllib.parse import unquote
+    
+    filename = os.path.basename(unquote(filename))
+    landmarks = skeleton_videos.load_landmarks(filename)
+    if landmarks is None:
+        return jsonify({
+            'status': 'error',
+            'message': f'Landmark non trovati: {filename}'
+        }), 404
+    
+    points = landmarks['landmarks']
+    output_format = request.args.get('format', 'json')
+    
+    if output_format == 'bin':
+        response = app.response_class(
+            points.astype('<f4', copy=False).tobytes(),
+            mimetype='application/octet-stream'
+        )
+        response.headers['X-Landmarks-Shape'] = ','.join(str(d) for d in points.shape)
+        response.headers['X-Landmarks-Fps'] = str(landmarks['fps'])
+        response.headers['Access-Control-Expose-Headers'] = 'X-Landmarks-Shape, X-Landmarks-Fps'
+        response.headers['Cache-Control'] = 'public, max-age=3600'
+        return response
+    
+    if output_format != 'json':
+        return jsonify({
+            'status': 'error',
+            'message': "Formato non valido (usa 'json' o 'bin')"
+        }), 400
+    
+    frames = [None if np.isnan(frame[0, 0]) else np.round(frame, 4).tolist() for frame in points]
+    return jsonify({
+        'status': 'success',
+        'fps': landmarks['fps'],
+        'n_frames': len(frames),
+        'connections': PoseEngine.POSE_CONNECTIONS,
+        'landmarks': frames
+    })
+
+
+@app.route('/api/ghost_alignment/<path:filename>', methods=['GET'])
+def get_ghost_alignment(filename):
+    """
+    Endpoint per la mappa frame utente -> frame ghost di un video analizzato
+    
+    Calcolata dai landmark salvati del video (vedi compute_ghost_frame_map):
+    il client legge il frame ghost da mostrare con map[frame] invece di
+    affidarsi al solo numero di frame. Query param 'format': 'json' (default)
+    oppure 'bin' (int32 little-endian).
+    """
+    from urllib.parse import unquote
+    
+    filename = os.path.basename(unquote(filename))
+    landmarks = skeleton_videos.load_landmarks(filename)
+    if landmarks is None:
+        return jsonify({
+            'status': 'error',
+            'message': f'Landmark non trovati: {filename}'
+        }), 404
+    
+    output_format = request.args.get('format', 'json')
+    if output_format not in ('json', 'bin'):
+        return jsonify({
+            'status': 'error',
+            'message': "Formato non valido (usa 'json' o 'bin')"
+        }), 400
+    
+    # Mappa ed etag dallo stesso archivio, anche se nel frattempo viene rigenerato o rimosso
+    pack = ghost_frames.open_pack()
+    frame_map = compute_ghost_frame_map(landmarks['landmarks'], landmarks['fps'], pack) if pack is not None else None
+    if frame_map is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Allineamento non disponibile (la baseline non ha un ciclo Ghost Vision)'
+        }), 404
+    
+    if output_format == 'bin':
+        response = app.response_class(frame_map.astype('<i4').tobytes(), mimetype='application/octet-stream')
+    else:
+        response = jsonify({
+            'status': 'success',
+            'fps': landmarks['fps'],
+            'n_frames': len(frame_map),
+            'ghost_frame_map': frame_map.tolist()
+        })
+    # Cambia se cambia l'archivio ghost o se il video viene rianalizzato
+    landmarks_mtime = os.stat(skeleton_videos.landmarks_path(filename)).st_mtime_ns
+    response.set_etag(f"{pack.etag}-{landmarks_mtime:x}-{output_format}")
+    return response.make_conditional(request)
 
 
 @app.route('/api/ghost_frame/<path:filename>', methods=['GET'])
@@ -159,12 +700,30 @@ def get_ghost_frame(filename):
     # Sanitizza il nome del file per sicurezza (rimuove path traversal)
     filename = os.path.basename(filename)  # Rimuove eventuali percorsi
     
-    ghost_path = os.path.join(Config.GHOST_FRAMES_FOLDER, filename)
-    
     logger.debug(f"👻 Richiesta ghost frame: {filename}")
+    
+    # Archivio: il frame è letto con una pread dall'offset indicizzato
+    # (nel formato 'contour' il PNG è disegnato dal poligono salvato)
+    pack = ghost_frames.open_pack()
+    frame_number = parse_frame_filename(filename)
+    if pack is not None and frame_number is not None:
+        ghost_frame_number = pack.resolve(frame_number)
+        payload = ghost_frames.frame_png(pack, ghost_frame_number) if ghost_frame_number is not None else None
+        if payload is None:
+            return jsonify({
+                'status': 'error',
+                'message': f'Ghost frame non trovato: {filename}'
+            }), 404
+        response = app.response_class(payload, mimetype='image/png')
+        response.set_etag(f"{pack.etag}-{ghost_frame_number}")
+        response.headers['Cache-Control'] = 'public, max-age=3600'
+        return response.make_conditional(request)
+    
+    # Formato precedente: un PNG per frame
+    ghost_path = os.path.join(Config.GHOST_FRAMES_FOLDER, filename)
     logger.debug(f"👻 Percorso completo: {ghost_path}")
     
-    if not os.path.exists(ghost_path):
+    if frame_number is None or not ghost_frames.has_frame(frame_number):
         logger.warning(f"⚠ Ghost frame non trovato: {ghost_path}")
         return jsonify({
             'status': 'error',
@@ -181,11 +740,8 @@ def get_ghost_frame(filename):
     
     logger.debug(f"✅ Invio ghost frame: {filename}")
     
-    # Aggiungi headers per immagini PNG con trasparenza
-    response = send_from_directory(Config.GHOST_FRAMES_FOLDER, filename)
-    response.headers['Content-Type'] = 'image/png'
-    response.headers['Cache-Control'] = 'public, max-age=3600'
-    return response
+    # PNG con trasparenza: ETag e 304 evitano di riscaricare i frame già visti
+    return send_media_file(ghost_path, 'image/png')
 
 
 @app.route('/api/ghost_frame_by_number/<int:frame_number>', methods=['GET'])
@@ -193,17 +749,16 @@ def get_ghost_frame_by_number(frame_number):
     """
     Endpoint per ottenere un ghost frame specifico per numero di frame
     Usato per sincronizzazione con il video dell'utente
+    
+    Se la baseline salva un solo ciclo del passo, il frame restituito è quello
+    del ciclo nella stessa posizione (riproduzione in loop).
     """
-    from config import Config
     from urllib.parse import quote
     
-    # Genera il nome del file ghost basato sul numero di frame
-    ghost_filename = f"ghost_frame_{frame_number:06d}.png"
-    ghost_path = os.path.join(Config.GHOST_FRAMES_FOLDER, ghost_filename)
-    
     logger.debug(f"👻 Richiesta ghost frame #{frame_number}")
     
-    if not os.path.exists(ghost_path):
+    ghost_frame_number = ghost_frames.resolve_frame(frame_number)
+    if ghost_frame_number is None:
         # Se il frame specifico non esiste, restituisci un errore 404
         # Il frontend può gestire questo caso mostrando nessun overlay
         return jsonify({
@@ -211,32 +766,183 @@ def get_ghost_frame_by_number(frame_number):
             'message': f'Ghost frame {frame_number} non disponibile'
         }), 404
     
-    # Verifica sicurezza
-    if not os.path.abspath(ghost_path).startswith(os.path.abspath(Config.GHOST_FRAMES_FOLDER)):
-        logger.warning(f"⚠ Tentativo di accesso non autorizzato: {ghost_path}")
-        return jsonify({
-            'status': 'error',
-            'message': 'Accesso negato'
-        }), 403
+    # Genera il nome del file ghost basato sul numero di frame
+    ghost_filename = legacy_frame_filename(ghost_frame_number)
     
     # Restituisci l'URL del ghost frame
     return jsonify({
         'status': 'success',
         'frame_number': frame_number,
+        'ghost_frame_number': ghost_frame_number,
         'ghost_url': f'/api/ghost_frame/{quote(ghost_filename)}',
         'filename': ghost_filename
     })
 
 
+@app.route('/api/ghost_frames', methods=['GET'])
+def get_ghost_frames_batch():
+    """
+    Endpoint per più frame ghost in una sola risposta (prefetch lato client)
+    
+    Query: start + count (intervallo contiguo) oppure frames=1,2,3 (lista);
+    payload=png per ricevere PNG anche da un archivio in formato 'contour'.
+    La risposta ha lo stesso formato di ghost_frames.pack (vedi ghost_store.py),
+    indicizzata per i frame richiesti (con un ciclo in loop, vedi
+    GhostPack.resolve): i frame non disponibili sono assenti dall'indice.
+    """
+    try:
+        if 'frames' in request.args:
+            frame_numbers = [int(n) for n in request.args['frames'].split(',') if n.strip()]
+        else:
+            start = int(request.args['start'])
+            count = int(request.args.get('count', 30))
+            # Limite controllato prima di costruire l'intervallo
+            if not 0 <= count <= Config.GHOST_BATCH_MAX_FRAMES:
+                return jsonify({
+                    'status': 'error',
+                    'message': f'Massimo {Config.GHOST_BATCH_MAX_FRAMES} frame per richiesta'
+                }), 400
+            frame_numbers = list(range(start, start + count))
+    except (KeyError, ValueError):
+        return jsonify({
+            'status': 'error',
+            'message': 'Specificare start e count oppure frames=1,2,3'
+        }), 400
+    
+    if len(frame_numbers) > Config.GHOST_BATCH_MAX_FRAMES:
+        return jsonify({
+            'status': 'error',
+            'message': f'Massimo {Config.GHOST_BATCH_MAX_FRAMES} frame per richiesta'
+        }), 400
+    
+    as_png = request.args.get('payload', 'raw') == 'png'
+    pack = ghost_frames.open_pack()
+    if pack is not None:
+        # Con un ciclo in loop più frame richiesti condividono lo stesso frame ghost
+        resolved = {n: pack.resolve(n) for n in set(frame_numbers)}
+        ghost_numbers = sorted({g for g in resolved.values() if g is not None})
+        if as_png and pack.format == 'contour':
+            payloads = {g: ghost_frames.frame_png(pack, g) for g in ghost_numbers}
+            meta = dict(pack.meta, format='png')
+        else:
+            payloads = dict(pack.read_many(ghost_numbers))
+            meta = pack.meta
+        frames = [(n, payloads[g]) for n, g in sorted(resolved.items()) if g is not None]
+    else:
+        # Formato precedente: un PNG per frame
+        frames = []
+        for n in sorted(set(frame_numbers)):
+            if ghost_frames.has_frame(n):
+                with open(ghost_frames.legacy_frame_path(n), 'rb') as f:
+                    frames.append((n, f.read()))
+        meta = {'format': 'png'}
+    
+    response = app.response_class(pack_frames(frames, meta), mimetype='application/octet-stream')
+    response.headers['X-Ghost-Frames'] = str(len(frames))
+    if pack is not None:
+        response.set_etag(f"{pack.etag}-{hash((tuple(n for n, _ in frames), as_png)) & 0xffffffff:x}")
+        response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response.make_conditional(request)
+
+
+@app.route('/api/ghost_contour/<int:frame_number>', methods=['GET'])
+def get_ghost_contour(frame_number):
+    """
+    Endpoint per il poligono della silhouette di un frame (archivio in formato 'contour')
+    
+    Permette al client di disegnare la silhouette da solo (es. su canvas) invece
+    di scaricare un PNG per frame.
+    """
+    pack = ghost_frames.open_pack()
+    if pack is None or pack.format != 'contour':
+        return jsonify({
+            'status': 'error',
+            'message': 'Poligoni ghost non disponibili'
+        }), 404
+    ghost_frame_number = pack.resolve(frame_number)
+    points = pack.read_contour(ghost_frame_number) if ghost_frame_number is not None else None
+    if points is None:
+        return jsonify({
+            'status': 'error',
+            'message': f'Ghost frame {frame_number} non disponibile'
+        }), 404
+    response = jsonify({
+        'status': 'success',
+        'frame_number': frame_number,
+        'ghost_frame_number': ghost_frame_number,
+        'width': pack.meta.get('video_width'),
+        'height': pack.meta.get('video_height'),
+        'color': pack.meta.get('color'),
+        'points': points.tolist()
+    })
+    response.set_etag(f"{pack.etag}-{ghost_frame_number}")
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response.make_conditional(request)
+
+
+@app.route('/api/ghost_pack', methods=['GET'])
+def get_ghost_pack():
+    """
+    Endpoint per l'archivio completo dei frame ghost
+    
+    Supporta Range: con l'indice di /api/ghost_pack/index il client può
+    scaricare tutto in una richiesta o solo gli intervalli di frame che servono.
+    """
+    if ghost_frames.open_pack() is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Archivio ghost frames non disponibile'
+        }), 404
+    return send_media_file(ghost_frames.pack_path, 'application/octet-stream')
+
+
+@app.route('/api/ghost_pack/index', methods=['GET'])
+def get_ghost_pack_index():
+    """Endpoint per l'indice dell'archivio ghost: [frame_number, offset, lunghezza] per frame"""
+    pack = ghost_frames.open_pack()
+    if pack is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Archivio ghost frames non disponibile'
+        }), 404
+    response = jsonify({
+        'status': 'success',
+        'meta': pack.meta,
+        'etag': pack.etag,
+        'frames': pack.index.tolist()
+    })
+    response.set_etag(pack.etag)
+    return response.make_conditional(request)
+
+
+@app.route('/api/ghost_status', methods=['GET'])
+def get_ghost_status():
+    """
+    Endpoint per lo stato della Ghost Vision (generazione in background dopo create_baseline)
+    Il frontend lo interroga finché lo stato non è 'ready' o 'error'
+    """
+    status = ghost_vision_status()
+    return jsonify({
+        'status': 'success',
+        'ghost_vision_status': status['state'],
+        'ghost_vision_available': status['state'] == 'ready',
+        'ghost_frames_count': status['frames'],
+        'progress': status.get('progress'),
+        'message': status.get('message'),
+        'job': status['job']
+    })
+
+
 @app.route('/api/create_baseline', methods=['POST'])
 def create_baseline():
     """
-    Endpoint per creare la baseline da 5 video di riferimento
+    Endpoint per creare la baseline da N video di riferimento
     
     Workflow:
-    1. Riceve 5 video di baseline
+    1. Riceve da BASELINE_MIN_VIDEOS a BASELINE_MAX_VIDEOS video di baseline
     2. Usa PoseEngine per processarli (geometrico)
-    3. Calcola statistiche aggregate (Media, StdDev, Min, Max)
+    3. Aggiunge ogni video alle statistiche (Media, StdDev, Min, Max) appena
+       elaborato: le serie dei frame non restano in memoria
     4. Salva un file JSON con le statistiche
     """
     logger.info("=" * 60)
@@ -251,11 +957,12 @@ def create_baseline():
         
         files = request.files.getlist('videos')
         
-        # Verifica 5 video
-        if len(files) != 5:
+        # Verifica numero di video
+        if not Config.BASELINE_MIN_VIDEOS <= len(files) <= Config.BASELINE_MAX_VIDEOS:
             return jsonify({
                 'status': 'error',
-                'message': f'Sono richiesti esattamente 5 video, ricevuti {len(files)}'
+                'message': f'Sono richiesti da {Config.BASELINE_MIN_VIDEOS} a {Config.BASELINE_MAX_VIDEOS} video, '
+                           f'ricevuti {len(files)}'
             }), 400
         
         # Salva i video
@@ -330,7 +1037,24 @@ def create_baseline():
                 'message': 'FPS deve essere tra 0 e 240'
             }), 400
         
-        logger.info(f"📊 Parametri baseline: Vista={view_type}, Velocità={speed} km/h, FPS={fps}")
+        # Stimatore di centro e dispersione (opzionale, default Config.BASELINE_ESTIMATOR)
+        estimator = request.form.get('estimator') or Config.BASELINE_ESTIMATOR
+        if estimator not in ESTIMATORS:
+            return jsonify({
+                'status': 'error',
+                'message': f'estimator deve essere uno tra: {", ".join(ESTIMATORS)}'
+            }), 400
+        
+        # Atleta (opzionale): la baseline viene salvata anche nel registro per atleta, vista e velocità
+        athlete_id = request.form.get('athlete_id') or DEFAULT_ATHLETE_ID
+        if not valid_athlete_id(athlete_id):
+            return jsonify({
+                'status': 'error',
+                'message': 'athlete_id non valido (lettere, numeri, "-" e "_", max 64 caratteri)'
+            }), 400
+        
+        logger.info(f"📊 Parametri baseline: Atleta={athlete_id}, Vista={view_type}, Velocità={speed} km/h, "
+                    f"FPS={fps}, Stimatore={estimator}")
         logger.info(f"📁 Directory models: {Config.MODEL_FOLDER}")
         logger.info(f"📁 Directory uploads: {Config.UPLOAD_FOLDER}")
         
@@ -338,13 +1062,14 @@ def create_baseline():
         def process_single_video(i, video_path):
             """Processa un singolo video creando una nuova istanza di PoseEngine (thread-safe)"""
             try:
-                logger.info(f"Processing video {i+1}/5: {os.path.basename(video_path)}")
+                logger.info(f"Processing video {i+1}/{n_videos}: {os.path.basename(video_path)}")
                 # Crea nuova istanza per ogni thread (MediaPipe non è thread-safe)
                 logger.debug(f"  Creazione PoseEngine per video {i+1}...")
                 engine = PoseEngine(
                     model_complexity=Config.MEDIAPIPE_MODEL_COMPLEXITY,
                     min_detection_confidence=Config.MEDIAPIPE_MIN_DETECTION_CONFIDENCE,
-                    min_tracking_confidence=Config.MEDIAPIPE_MIN_TRACKING_CONFIDENCE
+                    min_tracking_confidence=Config.MEDIAPIPE_MIN_TRACKING_CONFIDENCE,
+                    generate_skeleton_video=not SKELETON_VIDEO_LAZY
                 )
                 logger.debug(f"  PoseEngine creato, avvio processing video {i+1}...")
                 result = engine.process_video(video_path, fps=fps, view_type=view_type)
@@ -354,12 +1079,18 @@ def create_baseline():
                 logger.error(f"  ❌ Errore in process_single_video per video {i+1}: {type(e).__name__}: {str(e)}", exc_info=True)
                 raise
         
-        # Processa tutti i 5 video in parallelo
+        # Processa i video in parallelo; ogni video entra nelle statistiche appena completato
         logger.info("Fase 1: Processing video con PoseEngine (parallelo)...")
-        videos_data = [None] * len(video_paths)
+        n_videos = len(video_paths)
+        engine = PoseEngine()  # Solo per le statistiche (non usa MediaPipe)
+        accumulator = engine.baseline_accumulator(view_type, estimator, Config.BASELINE_TRIM_FRACTION)
+        # Dei video si conservano solo il segnale della caviglia (ciclo Ghost Vision)
+        # e i dati dell'ultimo (video con scheletro di esempio)
+        ankle_heights = {}
+        last_video_data = None
         errors = []
         
-        with ThreadPoolExecutor(max_workers=5) as executor:
+        with ThreadPoolExecutor(max_workers=min(n_videos, Config.BASELINE_PROCESS_WORKERS)) as executor:
             # Sottometti tutti i task
             future_to_index = {
                 executor.submit(process_single_video, i, vp): i 
@@ -371,30 +1102,34 @@ def create_baseline():
                 i = future_to_index[future]
                 try:
                     idx, video_data = future.result()
-                    videos_data[idx] = video_data
-                    logger.info(f"✓ Completato video {idx+1}/5: {os.path.basename(video_paths[idx])}")
+                    future_to_index[future] = None  # Il future non trattiene più il risultato
+                    accumulator.add_video(video_data, idx)
+                    if video_data.get('image_landmarks') is not None:
+                        ankle_heights[idx] = raw_ankle_height(video_data['image_landmarks'])
+                    if idx == n_videos - 1:
+                        last_video_data = video_data
+                    del video_data
+                    logger.info(f"✓ Completato video {idx+1}/{n_videos}: {os.path.basename(video_paths[idx])}")
+                    logger.info(f"  📈 Baseline parziale ({accumulator.n_videos}/{n_videos} video): "
+                                f"{summarize_stats(accumulator.stats(), accumulator.metrics)}")
                 except Exception as e:
-                    error_msg = f"Errore nell'elaborazione video {i+1}/5 ({os.path.basename(video_paths[i])}): {str(e)}"
+                    error_msg = f"Errore nell'elaborazione video {i+1}/{n_videos} ({os.path.basename(video_paths[i])}): {str(e)}"
                     logger.error(f"⚠ {error_msg}", exc_info=True)
                     errors.append(error_msg)
         
         # Verifica che tutti i video siano stati processati
-        videos_data = [v for v in videos_data if v is not None]
-        if len(videos_data) != len(video_paths):
+        if accumulator.n_videos != n_videos:
             error_details = "; ".join(errors) if errors else "Errore sconosciuto"
-            logger.error(f"❌ Fallimento processing: {len(videos_data)}/{len(video_paths)} video processati. Errori: {error_details}")
+            logger.error(f"❌ Fallimento processing: {accumulator.n_videos}/{n_videos} video processati. Errori: {error_details}")
             return jsonify({
                 'status': 'error',
-                'message': f'Errore: solo {len(videos_data)}/{len(video_paths)} video processati con successo. Dettagli: {error_details}'
+                'message': f'Errore: solo {accumulator.n_videos}/{n_videos} video processati con successo. Dettagli: {error_details}'
             }), 500
         
-        # Crea statistiche baseline
+        # Statistiche baseline finali
         logger.info("Fase 2: Creazione statistiche baseline...")
         try:
-            # Crea un'istanza di engine solo per create_baseline_stats (non usa MediaPipe)
-            engine = PoseEngine()
-            logger.debug("  Calcolo statistiche aggregate...")
-            baseline_stats = engine.create_baseline_stats(videos_data)
+            baseline_stats = engine.finalize_baseline_stats(accumulator)
             logger.info(f"  ✓ Statistiche calcolate: {len(baseline_stats)} metriche")
         except Exception as e:
             logger.error(f"❌ Errore nella creazione statistiche baseline: {type(e).__name__}: {str(e)}", exc_info=True)
@@ -402,6 +1137,7 @@ def create_baseline():
         
         # Aggiungi parametri di calibrazione
         baseline_stats['view_type'] = view_type
+        baseline_stats['athlete_id'] = athlete_id
         baseline_stats['speed_kmh'] = float(speed)
         baseline_stats['fps'] = float(fps)
         baseline_stats['created_at'] = datetime.now().isoformat()
@@ -409,55 +1145,35 @@ def create_baseline():
         # Salva baseline JSON
         logger.info(f"Fase 3: Salvataggio baseline in: {BASELINE_JSON_PATH}")
         try:
-            # Assicurati che la directory esista
-            os.makedirs(os.path.dirname(BASELINE_JSON_PATH), exist_ok=True)
-            with open(BASELINE_JSON_PATH, 'w') as f:
-                json.dump(baseline_stats, f, indent=2)
+            baseline_file.write(baseline_stats)
             logger.info(f"  ✓ Baseline salvata con successo")
+            baseline_registry.register(baseline_stats, athlete_id)
         except Exception as e:
             logger.error(f"❌ Errore nel salvataggio baseline: {type(e).__name__}: {str(e)}", exc_info=True)
             raise
         
         # Pulisci video temporanei (tranne il migliore, che useremo per ghost frames)
         # Trova il video con meno deviazione dalla media (il "migliore")
-        best_video_idx = 0
-        min_deviation = float('inf')
-        
-        for idx, video_data in enumerate(videos_data):
-            # Calcola deviazione media per questo video
-            if view_type == 'posterior':
-                mean_left_valgus = np.mean(video_data['left_knee_valgus'])
-                mean_right_valgus = np.mean(video_data['right_knee_valgus'])
-                mean_pelvic_drop = np.mean(video_data['pelvic_drop'])
-                
-                # Calcola distanza dalla media baseline
-                deviation = (
-                    abs(mean_left_valgus - baseline_stats['left_knee_valgus']['mean']) +
-                    abs(mean_right_valgus - baseline_stats['right_knee_valgus']['mean']) +
-                    abs(mean_pelvic_drop - baseline_stats['pelvic_drop']['mean'])
-                )
-            else:  # lateral
-                mean_overstriding = np.mean(video_data['overstriding'])
-                mean_knee_flexion = np.mean(video_data['knee_flexion_ic'])
-                mean_trunk_lean = np.mean(video_data['trunk_lean'])
-                
-                # Calcola distanza dalla media baseline
-                deviation = (
-                    abs(mean_overstriding - baseline_stats['overstriding']['mean']) +
-                    abs(mean_knee_flexion - baseline_stats['knee_flexion_ic']['mean']) +
-                    abs(mean_trunk_lean - baseline_stats['trunk_lean']['mean'])
-                )
-            
-            if deviation < min_deviation:
-                min_deviation = deviation
-                best_video_idx = idx
+        best_video_idx, min_deviation = accumulator.closest_video(baseline_stats)
         
         best_video_path = video_paths[best_video_idx]
         logger.info(f"📹 Video migliore per Ghost Vision: #{best_video_idx+1} ({os.path.basename(best_video_path)})")
         logger.info(f"📊 Deviazione minima: {min_deviation:.4f}")
         
+        # Prepara URL video con scheletro (usa l'ultimo video processato come esempio)
+        # In modalità lazy il video viene conservato per il rendering: va fatto prima della pulizia
+        # e prima dei ghost frames: se l'ultimo video è anche il migliore in sources/ va un
+        # collegamento (o una copia) e l'originale resta al job dei ghost frames
+        skeleton_video_url = None
+        landmarks_url = None
+        if last_video_data is not None:
+            skeleton_video_url, landmarks_url = publish_skeleton_video(
+                last_video_data, video_paths[-1], keep_source=video_paths[-1] == best_video_path
+            )
+        
         # Genera ghost frames dal video migliore
         ghost_frames_info = None
+        ghost_frames_job_id = None
         try:
             # Verifica che il video esista ancora prima di processarlo
             if not os.path.exists(best_video_path):
@@ -476,53 +1192,32 @@ def create_baseline():
             logger.info(f"📹 Video selezionato per Ghost Vision: {os.path.basename(best_video_path)}")
             logger.info(f"📁 Percorso completo: {best_video_path}")
             logger.info(f"📊 Dimensione file: {os.path.getsize(best_video_path) / (1024*1024):.2f} MB")
-            logger.info(f"📊 Deviazione dalla media: {min_deviation:.4f} (minimo tra i 5 video)")
-            logger.info(f"🎨 Colore silhouette: Ciano/Azzurro (0, 255, 255)")
-            logger.info(f"📁 Cartella output: {Config.GHOST_FRAMES_FOLDER}")
-            logger.info("🔄 Avvio generazione ghost frames...")
-            
-            ghost_engine = PoseEngine(
-                model_complexity=Config.MEDIAPIPE_MODEL_COMPLEXITY,
-                min_detection_confidence=Config.MEDIAPIPE_MIN_DETECTION_CONFIDENCE,
-                min_tracking_confidence=Config.MEDIAPIPE_MIN_TRACKING_CONFIDENCE,
-                enable_segmentation=True
-            )
-            
-            # Genera ghost frames nella cartella dedicata
-            ghost_frames_info = ghost_engine.generate_ghost_frames(
-                best_video_path,
-                Config.GHOST_FRAMES_FOLDER,
-                fps=fps,
-                ghost_color=(0, 255, 255)  # Ciano/azzurro
-            )
-            
-            logger.info("=" * 60)
-            logger.info("✅ GHOST VISION GENERATA CON SUCCESSO!")
-            logger.info(f"📊 Frame processati: {ghost_frames_info['frames_processed']}/{ghost_frames_info['total_frames']}")
-            logger.info(f"📐 Dimensioni video: {ghost_frames_info['video_width']}x{ghost_frames_info['video_height']}")
-            logger.info(f"🎬 FPS: {ghost_frames_info['fps']:.2f}")
-            logger.info(f"📁 Frame salvati in: {ghost_frames_info['output_folder']}")
-            logger.info(f"👻 Ghost Vision disponibile per confronto visivo!")
-            logger.info("=" * 60)
+            logger.info(f"📊 Deviazione dalla media: {min_deviation:.4f} (minimo tra i {n_videos} video)")
             
-            # Salva info ghost frames nella baseline
-            baseline_stats['ghost_frames'] = {
-                'total_frames': ghost_frames_info['total_frames'],
-                'frames_processed': ghost_frames_info['frames_processed'],
-                'fps': ghost_frames_info['fps'],
-                'video_width': ghost_frames_info['video_width'],
-                'video_height': ghost_frames_info['video_height'],
-                'best_video_index': best_video_idx
-            }
+            # Un solo ciclo del passo (in loop) invece di tutto il video
+            cycle = None
+            best_ankle_height = ankle_heights.get(best_video_idx)
+            if Config.GHOST_LOOP_CYCLES > 0 and best_ankle_height is not None:
+                cycle = select_gait_cycles(best_ankle_height, fps, Config.GHOST_LOOP_CYCLES)
+            if cycle is None:
+                logger.info("  Ghost Vision su tutto il video (ciclo del passo non disponibile o disattivato)")
             
-            # Salva di nuovo il baseline.json con le informazioni sui ghost_frames
-            logger.info("💾 Aggiornamento baseline.json con informazioni Ghost Vision...")
-            try:
-                with open(BASELINE_JSON_PATH, 'w') as f:
-                    json.dump(baseline_stats, f, indent=2)
-                logger.info("  ✓ Baseline aggiornata con successo (include ghost_frames)")
-            except Exception as e:
-                logger.error(f"⚠ Errore nell'aggiornamento baseline: {type(e).__name__}: {str(e)}", exc_info=True)
+            if Config.GHOST_FRAMES_DEFERRED:
+                # I frame della baseline precedente non vanno mostrati con la nuova
+                n_removed = ghost_frames.clear()
+                if n_removed:
+                    logger.info(f"🧹 Rimossi {n_removed} ghost frames della baseline precedente")
+                # Il job usa il video migliore dopo la risposta: non va rimosso nella pulizia
+                ghost_frames_job_id = ghost_jobs.submit(
+                    'ghost_frames', generate_ghost_vision, best_video_path, fps,
+                    best_video_idx, baseline_stats['created_at'], remove_video=True, cycle=cycle
+                )
+                logger.info(f"⏳ Generazione ghost frames in background (job {ghost_frames_job_id})")
+            else:
+                ghost_frames_info = generate_ghost_vision(
+                    None, best_video_path, fps, best_video_idx, baseline_stats['created_at'], cycle=cycle
+                )
+                baseline_stats['ghost_frames'] = ghost_frames_info
             
         except Exception as e:
             logger.error(f"⚠ Errore nella generazione ghost frames: {e}", exc_info=True)
@@ -532,40 +1227,34 @@ def create_baseline():
         # IMPORTANTE: Rimuovi i video SOLO dopo aver generato i ghost frames
         logger.info("🧹 Pulizia video temporanei...")
         for idx, video_path in enumerate(video_paths):
+            if ghost_frames_job_id is not None and video_path == best_video_path:
+                logger.debug(f"  Video {idx+1}/{n_videos} conservato per la generazione ghost frames in corso")
+                continue
             if os.path.exists(video_path):
-                logger.debug(f"  Rimozione video {idx+1}/5: {os.path.basename(video_path)}")
+                logger.debug(f"  Rimozione video {idx+1}/{n_videos}: {os.path.basename(video_path)}")
                 safe_remove_file(video_path)
             else:
-                logger.debug(f"  Video {idx+1}/5 già rimosso: {os.path.basename(video_path)}")
+                logger.debug(f"  Video {idx+1}/{n_videos} già rimosso: {os.path.basename(video_path)}")
         logger.info("✅ Pulizia video temporanei completata")
         
         logger.info("✅ Baseline creata con successo!")
         
-        # Prepara URL video con scheletro (usa l'ultimo video processato come esempio)
-        skeleton_video_url = None
-        if videos_data and len(videos_data) > 0:
-            last_video_data = videos_data[-1]
-            if last_video_data.get('skeleton_video_path'):
-                skeleton_path = last_video_data['skeleton_video_path']
-                if os.path.exists(skeleton_path):
-                    skeleton_filename = os.path.basename(skeleton_path)
-                    # URL encode il nome del file per gestire caratteri speciali
-                    from urllib.parse import quote
-                    skeleton_video_url = f'/api/processed_video/{quote(skeleton_filename)}'
-                    logger.info(f"📹 Video esempio con scheletro disponibile: {skeleton_filename}")
-                    logger.info(f"📹 URL video: {skeleton_video_url}")
-                else:
-                    logger.warning(f"⚠ Video scheletro non trovato: {skeleton_path}")
-        
         # Prepara risposta per frontend
         response_data = {
             'status': 'success',
             'message': 'Baseline creata con successo',
             'baselineCreated': True,
             'viewType': view_type,
+            'athlete_id': athlete_id,
+            'estimator': estimator,
             'skeleton_video_url': skeleton_video_url,
+            'landmarks_url': landmarks_url,
             'ghost_vision_available': ghost_frames_info is not None,
             'ghost_frames_count': ghost_frames_info['frames_processed'] if ghost_frames_info else 0,
+            'ghost_frames_job_id': ghost_frames_job_id,
+            'ghost_vision_status': ('pending' if ghost_frames_job_id is not None
+                                    else 'ready' if ghost_frames_info is not None else 'unavailable'),
+            'ghost_status_url': '/api/ghost_status' if ghost_frames_job_id is not None else None,
             'baselineRanges': {}
         }
         
@@ -722,113 +1411,137 @@ def detect_anomaly():
                 'message': 'Velocità e FPS devono essere numeri validi'
             }), 400
         
-        logger.info(f"📊 Parametri analisi: Vista={view_type}, Velocità={speed} km/h, FPS={fps}")
+        # Stream HLS progressivo (opzionale): ID riservato con POST /api/skeleton_stream per
+        # seguire l'analisi su /api/skeleton_stream/<stream_id>/index.m3u8 mentre è in corso
+        stream_id = request.form.get('stream_id')
+        stream_dir = None
+        if stream_id:
+            stream_dir = claim_skeleton_stream(stream_id)
+            if stream_dir is None:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'stream_id non valido o già usato: riservarne uno con POST /api/skeleton_stream'
+                }), 400
         
-        # Carica baseline
-        if not os.path.exists(BASELINE_JSON_PATH):
+        # Atleta (opzionale, default: atleta della baseline corrente)
+        athlete_id = request.form.get('athlete_id') or None
+        if athlete_id is not None and not valid_athlete_id(athlete_id):
             return jsonify({
                 'status': 'error',
-                'message': 'Baseline non trovata. Crea prima una baseline con 5 video.'
+                'message': 'athlete_id non valido (lettere, numeri, "-" e "_", max 64 caratteri)'
             }), 400
         
-        logger.info("Caricamento baseline...")
-        with open(BASELINE_JSON_PATH, 'r') as f:
-            baseline_stats = json.load(f)
-        
-        baseline_speed = baseline_stats['speed_kmh']
-        baseline_fps = baseline_stats['fps']
-        baseline_view_type = baseline_stats.get('view_type', 'posterior')
-        
-        logger.info(f"📊 Baseline: Vista={baseline_view_type}, Velocità={baseline_speed} km/h, FPS={baseline_fps}")
+        logger.info(f"📊 Parametri analisi: Vista={view_type}, Velocità={speed} km/h, FPS={fps}")
         
-        # Valida corrispondenza view_type
-        if view_type != baseline_view_type:
+        # Seleziona la baseline: corrente se corrisponde, altrimenti dal registro
+        logger.info("Caricamento baseline...")
+        baseline_stats, baseline_selection, athlete_id = select_baseline(athlete_id, view_type, speed)
+        if baseline_stats is None:
+            available = baseline_registry.speeds(athlete_id, view_type)
+            if not available and load_current_baseline() is None:
+                message = ('Baseline non trovata. Crea prima una baseline con '
+                           f'{Config.BASELINE_MIN_VIDEOS}-{Config.BASELINE_MAX_VIDEOS} video.')
+            elif not available:
+                message = f'Nessuna baseline per atleta {athlete_id} con vista {view_type}.'
+            else:
+                message = (f'Nessuna baseline per atleta {athlete_id}, vista {view_type} a {speed} km/h. '
+                           f'Velocità disponibili: {", ".join(f"{v:.1f}" for v in available)} km/h.')
             return jsonify({
                 'status': 'error',
-                'message': f'Il tipo di vista non corrisponde alla baseline. Baseline: {baseline_view_type}, Fornito: {view_type}.'
+                'message': message
             }), 400
         
-        # Valida corrispondenza parametri (tolleranza 0.5)
-        if abs(speed - baseline_speed) > 0.5:
-            return jsonify({
-                'status': 'error',
-                'message': f'Velocità non corrisponde alla baseline. Baseline: {baseline_speed} km/h, Fornito: {speed} km/h.'
-            }), 400
+        baseline_speed = baseline_stats['speed_kmh']
+        baseline_fps = baseline_stats['fps']
+        baseline_is_current = baseline_selection == 'current'
+        
+        logger.info(f"📊 Baseline: Atleta={athlete_id}, Vista={view_type}, Velocità={baseline_speed} km/h, "
+                    f"FPS={baseline_fps} ({baseline_selection})")
+        if baseline_selection == 'interpolated':
+            logger.info(f"  Interpolata tra {baseline_stats['interpolated_from'][0]} e "
+                        f"{baseline_stats['interpolated_from'][1]} km/h")
         
         # Inizializza PoseEngine
         engine = PoseEngine(
             model_complexity=Config.MEDIAPIPE_MODEL_COMPLEXITY,
             min_detection_confidence=Config.MEDIAPIPE_MIN_DETECTION_CONFIDENCE,
-            min_tracking_confidence=Config.MEDIAPIPE_MIN_TRACKING_CONFIDENCE
+            min_tracking_confidence=Config.MEDIAPIPE_MIN_TRACKING_CONFIDENCE,
+            generate_skeleton_video=not SKELETON_VIDEO_LAZY
         )
         
         # Processa video
         logger.info("Fase 1: Processing video con PoseEngine...")
-        video_data = engine.process_video(filepath, fps=baseline_fps, view_type=view_type)
+        video_data = engine.process_video(filepath, fps=baseline_fps, view_type=view_type,
+                                          stream_dir=stream_dir)
+        skeleton_stream_url = None
+        if stream_dir and os.path.exists(os.path.join(stream_dir, 'index.m3u8')):
+            skeleton_stream_url = f'/api/skeleton_stream/{stream_id}/index.m3u8'
         
         # Calcola Z-Scores
         logger.info("Fase 2: Calcolo Z-Scores...")
         z_scores = engine.calculate_z_scores(video_data, baseline_stats)
         
+        # Z-Score per frame e livello di anomalia nel tempo (massimo mobile di |Z|)
+        window_frames = int(round(Config.ANOMALY_TIMELINE_WINDOW_SECONDS * video_data['fps']))
+        anomaly_timeline = frame_timeline(video_data, baseline_stats, window_frames,
+                                          method=Config.ANOMALY_TIMELINE_METHOD)
+        logger.info(f"📈 Timeline anomalie: {len(anomaly_timeline['segments'])} tratti sopra 'Ottimale' "
+                    f"(finestra {anomaly_timeline['window_frames']} frame)")
+        
+        # Prepara URL video con scheletro (in modalità lazy conserva il video caricato)
+        skeleton_video_url, landmarks_url = publish_skeleton_video(video_data, filepath)
+        
         # Pulisci video temporaneo
         safe_remove_file(filepath)
         
         logger.info(f"✅ Analisi completata! Stato: {z_scores['overall_status']}")
         
-        # Prepara URL video con scheletro se disponibile
-        skeleton_video_url = None
-        if video_data.get('skeleton_video_path'):
-            skeleton_path = video_data['skeleton_video_path']
-            if os.path.exists(skeleton_path):
-                skeleton_filename = os.path.basename(skeleton_path)
-                # URL encode il nome del file per gestire caratteri speciali
-                from urllib.parse import quote
-                skeleton_video_url = f'/api/processed_video/{quote(skeleton_filename)}'
-                logger.info(f"📹 Video con scheletro disponibile: {skeleton_filename}")
-                logger.info(f"📹 URL video: {skeleton_video_url}")
-            else:
-                logger.warning(f"⚠ Video scheletro non trovato: {skeleton_path}")
-        
         # Verifica se la baseline ha ghost frames disponibili
         ghost_vision_available = False
         ghost_frames_count = 0
         logger.info("🔍 Verifica disponibilità Ghost Vision...")
         logger.info(f"  Baseline stats keys: {list(baseline_stats.keys())}")
         
-        # Verifica sempre la cartella, anche se 'ghost_frames' non è nel JSON
-        # (per supportare baseline create prima di questa modifica)
-        if os.path.exists(Config.GHOST_FRAMES_FOLDER):
-            # Conta i file ghost frame nella cartella
-            ghost_files = [f for f in os.listdir(Config.GHOST_FRAMES_FOLDER) 
-                         if f.startswith('ghost_frame_') and f.endswith('.png')]
-            logger.info(f"  File ghost trovati nella cartella: {len(ghost_files)}")
+        # Verifica sempre i frame disponibili, anche se 'ghost_frames' non è nel JSON
+        # (per supportare baseline create prima di questa modifica).
+        # Conta i frame ghost dall'indice in memoria (archivio o PNG singoli)
+        # Durante la generazione in background i frame non sono ancora completi
+        # I frame ghost sono solo della baseline corrente (non di quelle del registro)
+        ghost_vision_pending = baseline_is_current and ghost_jobs.is_active('ghost_frames')
+        n_ghost_frames = ghost_frames.frame_count() if baseline_is_current and not ghost_vision_pending else 0
+        logger.info(f"  Frame ghost disponibili: {n_ghost_frames}")
+        
+        if n_ghost_frames > 0:
+            ghost_vision_available = True
+            ghost_frames_count = n_ghost_frames
+            logger.info(f"✅ Ghost Vision disponibile: {ghost_frames_count} frame trovati")
             
-            if len(ghost_files) > 0:
-                ghost_vision_available = True
-                ghost_frames_count = len(ghost_files)
-                logger.info(f"✅ Ghost Vision disponibile: {ghost_frames_count} frame trovati")
-                
-                # Se 'ghost_frames' non è nel JSON ma ci sono file, aggiorna il JSON
-                if 'ghost_frames' not in baseline_stats:
-                    logger.info("  ⚠ 'ghost_frames' non presente nel JSON, ma file trovati nella cartella")
-                    logger.info("  💾 Aggiornamento baseline.json con informazioni Ghost Vision...")
-                    try:
-                        # Stima le informazioni dai file trovati
-                        baseline_stats['ghost_frames'] = {
-                            'total_frames': len(ghost_files),
-                            'frames_processed': len(ghost_files),
-                            'fps': baseline_fps,  # Usa FPS dalla baseline
-                            'best_video_index': 0  # Sconosciuto
-                        }
-                        with open(BASELINE_JSON_PATH, 'w') as f:
-                            json.dump(baseline_stats, f, indent=2)
-                        logger.info("  ✓ Baseline aggiornata con informazioni ghost_frames")
-                    except Exception as e:
-                        logger.warning(f"  ⚠ Impossibile aggiornare baseline.json: {e}")
-            else:
-                logger.warning(f"⚠ Nessun file ghost trovato nella cartella")
+            # Se 'ghost_frames' non è nel JSON ma ci sono file, aggiorna il JSON
+            if 'ghost_frames' not in baseline_stats:
+                logger.info("  ⚠ 'ghost_frames' non presente nel JSON, ma file trovati nella cartella")
+                logger.info("  💾 Aggiornamento baseline.json con informazioni Ghost Vision...")
+                try:
+                    # Stima le informazioni dai file trovati (copia: la baseline in cache è condivisa)
+                    baseline_stats = dict(baseline_stats, ghost_frames={
+                        'total_frames': n_ghost_frames,
+                        'frames_processed': n_ghost_frames,
+                        'fps': baseline_fps,  # Usa FPS dalla baseline
+                        'best_video_index': 0  # Sconosciuto
+                    })
+                    created_at = baseline_stats.get('created_at')
+                    baseline_file.update(
+                        lambda current: baseline_stats
+                        if current is not None and current.get('created_at') == created_at else None
+                    )
+                    logger.info("  ✓ Baseline aggiornata con informazioni ghost_frames")
+                except Exception as e:
+                    logger.warning(f"  ⚠ Impossibile aggiornare baseline.json: {e}")
+        elif ghost_vision_pending:
+            logger.info("⏳ Ghost Vision in generazione: disponibile a fine job (/api/ghost_status)")
+        elif not baseline_is_current:
+            logger.info("👻 Ghost Vision non disponibile: baseline dal registro (solo la baseline corrente ha i frame)")
         else:
-            logger.warning(f"⚠ Cartella ghost_frames non esiste: {Config.GHOST_FRAMES_FOLDER}")
+            logger.warning(f"⚠ Nessun frame ghost disponibile")
         
         # Verifica anche le informazioni nel JSON (se presenti)
         if 'ghost_frames' in baseline_stats:
@@ -838,6 +1551,16 @@ def detect_anomaly():
         
         logger.info(f"👻 Risultato verifica: available={ghost_vision_available}, count={ghost_frames_count}")
         
+        # Mappa frame utente -> frame ghost allineata sulla fase del passo
+        ghost_frame_map = None
+        if ghost_vision_available:
+            try:
+                ghost_frame_map = compute_ghost_frame_map(video_data.get('image_landmarks'), video_data['fps'])
+            except Exception as e:
+                logger.warning(f"⚠ Allineamento Ghost Vision non riuscito: {type(e).__name__}: {e}")
+            if ghost_frame_map is not None:
+                logger.info(f"🔁 Ghost Vision allineata sulla fase del passo ({len(ghost_frame_map)} frame)")
+        
         # Prepara risposta per frontend
         response_data = {
             'status': 'success',
@@ -845,10 +1568,22 @@ def detect_anomaly():
             'anomaly_level': z_scores['overall_status'],
             'anomaly_color': z_scores['overall_color'],
             'anomaly_score': z_scores['max_z_score'],
+            'baseline': {
+                'athlete_id': athlete_id,
+                'speed_kmh': baseline_speed,
+                'selection': baseline_selection,
+                'estimator': baseline_stats.get('estimator', 'mean'),
+                'interpolated_from': baseline_stats.get('interpolated_from')
+            },
             'skeleton_video_url': skeleton_video_url,
+            'skeleton_stream_url': skeleton_stream_url,
+            'landmarks_url': landmarks_url,
             'ghost_vision_available': ghost_vision_available,
             'ghost_frames_count': ghost_frames_count,
+            'ghost_vision_pending': ghost_vision_pending,
+            'ghost_frame_map': ghost_frame_map.tolist() if ghost_frame_map is not None else None,
             'metrics': {},
+            'anomaly_timeline': anomaly_timeline,
             'charts': {
                 'timeline': list(range(video_data['n_frames']))
             },
@@ -1013,13 +1748,12 @@ def save_baseline():
         baseline_data['type'] = 'baseline'
         
         # Se disponibile, carica anche i dati raw dalla baseline.json standard
-        if os.path.exists(BASELINE_JSON_PATH):
-            try:
-                with open(BASELINE_JSON_PATH, 'r') as f:
-                    raw_baseline = json.load(f)
+        try:
+            raw_baseline = baseline_file.get()
+            if raw_baseline is not None:
                 baseline_data['raw_baseline_stats'] = raw_baseline
-            except Exception as e:
-                logger.warning(f"⚠ Impossibile caricare baseline raw: {e}")
+        except Exception as e:
+            logger.warning(f"⚠ Impossibile caricare baseline raw: {e}")
         
         # Salva file
         with open(filepath, 'w', encoding='utf-8') as f:
@@ -1103,6 +1837,64 @@ def save_analysis():
         }), 500
 
 
+@app.route('/api/rescore', methods=['POST'])
+def rescore_saved_analyses():
+    """
+    Endpoint per rivalutare in blocco le analisi salvate e in cache rispetto a una baseline
+    
+    Body JSON (tutti opzionali):
+    {
+        'baseline': 'current' | 'incremental' | '<baseline salvata>.json',
+        'sources': ['saved', 'cache'],
+        'format': 'json' | 'csv'
+    }
+    """
+    data = request.get_json(silent=True) or {}
+    sources = data.get('sources', list(rescore_analyses.SOURCES))
+    if not isinstance(sources, list) or not sources or any(src not in rescore_analyses.SOURCES for src in sources):
+        return jsonify({
+            'status': 'error',
+            'message': f"sources deve contenere {' e/o '.join(rescore_analyses.SOURCES)}"
+        }), 400
+    
+    baseline_name = data.get('baseline', 'current')
+    if not isinstance(baseline_name, str) or not baseline_name:
+        return jsonify({
+            'status': 'error',
+            'message': "baseline deve essere 'current', 'incremental' o il nome di una baseline salvata"
+        }), 400
+    
+    try:
+        # Solo nomi di baseline salvate: i percorsi arbitrari restano alla riga di comando
+        baseline_stats = rescore_analyses.load_baseline(baseline_name, allow_paths=False)
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 404
+    
+    try:
+        table = rescore_analyses.rescore(baseline_stats, sources=sources)
+    except Exception as e:
+        logger.error(f"❌ Errore nella rivalutazione delle analisi: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f'Errore interno: {str(e)}'
+        }), 500
+    
+    if data.get('format') == 'csv':
+        return app.response_class(rescore_analyses.table_to_csv(table), mimetype='text/csv')
+    return jsonify({
+        'status': 'success',
+        'baseline': {
+            'name': baseline_name,
+            'view_type': baseline_stats.get('view_type'),
+            'created_at': baseline_stats.get('created_at')
+        },
+        **table
+    })
+
+
 @app.route('/api/baseline/add-run', methods=['POST'])
 def add_run_to_baseline():
     """
@@ -1221,6 +2013,165 @@ def get_current_baseline():
         }), 500
 
 
+@app.route('/api/baselines', methods=['GET'])
+def list_baselines():
+    """
+    Endpoint per elencare le baseline del registro
+
+    Query: athlete_id (opzionale); con view_type e speed restituisce anche la
+    baseline che detect_anomaly userebbe ('selection')
+    """
+    try:
+        athlete_id = request.args.get('athlete_id') or None
+        if athlete_id is not None and not valid_athlete_id(athlete_id):
+            return jsonify({
+                'status': 'error',
+                'message': 'athlete_id non valido (lettere, numeri, "-" e "_", max 64 caratteri)'
+            }), 400
+        response_data = {
+            'status': 'success',
+            'athletes': baseline_registry.athletes(),
+            'baselines': baseline_registry.summary(athlete_id)
+        }
+        
+        view_type = request.args.get('view_type')
+        speed = request.args.get('speed')
+        if view_type and speed:
+            try:
+                speed = float(speed)
+            except ValueError:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Velocità deve essere un numero valido'
+                }), 400
+            baseline_stats, mode, selected_athlete = select_baseline(athlete_id, view_type, speed)
+            response_data['selection'] = {
+                'athlete_id': selected_athlete,
+                'view_type': view_type,
+                'speed_kmh': baseline_stats['speed_kmh'] if baseline_stats else None,
+                'mode': mode,
+                'interpolated_from': baseline_stats.get('interpolated_from') if baseline_stats else None
+            }
+        
+        return jsonify(response_data)
+        
+    except Exception as e:
+        logger.error(f"❌ Errore nell'elenco baseline: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f'Errore interno: {str(e)}'
+        }), 500
+
+
+def start_cache_recompute():
+    """
+    Avvia in background il ricalcolo delle voci obsolete della cache PoseEngine
+    
+    Returns:
+        ID del job (quello già attivo se il ricalcolo è in corso)
+    """
+    for job in maintenance_jobs.list(kind='cache_recompute'):
+        if job['status'] in ('queued', 'running'):
+            return job['id']
+    return maintenance_jobs.submit(
+        'cache_recompute',
+        cache_maintenance.recompute_stale_cache,
+        pause_seconds=Config.CACHE_RECOMPUTE_PAUSE_SECONDS
+    )
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """
+    Endpoint con le statistiche della cache PoseEngine
+    
+    Contatori dall'avvio del processo (hit, miss, eviction, byte scritti,
+    latenza di caricamento, tempo di calcolo risparmiato) e occupazione su disco,
+    in totale e per tipo di vista.
+    """
+    try:
+        counters = cache_stats.snapshot()
+        usage = cache_disk_usage(PoseEngine.CACHE_DIR)
+        
+        by_view_type = {}
+        for view in set(counters['by_view_type']) | set(usage['by_view_type']):
+            by_view_type[view] = dict(counters['by_view_type'].get(view, {}))
+            by_view_type[view].update(usage['by_view_type'].get(view, {'entries': 0, 'bytes_stored': 0}))
+        
+        totals = dict(counters['totals'])
+        totals['entries'] = usage['entries']
+        totals['bytes_stored'] = usage['bytes_stored']
+        
+        return jsonify({
+            'status': 'success',
+            'cache_dir': PoseEngine.CACHE_DIR,
+            'max_bytes': int(Config.POSE_CACHE_MAX_MB * 1024 * 1024),
+            'totals': totals,
+            'by_view_type': by_view_type
+        })
+    except Exception as e:
+        logger.error(f"❌ Errore nel calcolo statistiche cache: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f'Errore interno: {str(e)}'
+        }), 500
+
+
+@app.route('/api/cache/stale', methods=['GET'])
+def get_stale_cache_entries():
+    """
+    Endpoint per individuare le voci obsolete della cache PoseEngine
+    (versione del codice diversa da quella corrente)
+    """
+    try:
+        entries = cache_maintenance.scan_cache()
+        return jsonify({
+            'status': 'success',
+            'landmarks_version': PoseEngine.LANDMARKS_VERSION,
+            'metrics_version': PoseEngine.METRICS_VERSION,
+            'summary': cache_maintenance.summarize_scan(entries),
+            'stale_entries': [
+                {'file': os.path.basename(e['path']), 'status': e['status']}
+                for e in entries if e['status'] != 'current'
+            ]
+        })
+    except Exception as e:
+        logger.error(f"❌ Errore nell'analisi della cache: {str(e)}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f'Errore interno: {str(e)}'
+        }), 500
+
+
+@app.route('/api/cache/recompute', methods=['POST'])
+def recompute_cache():
+    """
+    Endpoint per avviare in background il ricalcolo delle voci obsolete della cache
+    Lo stato del job si consulta con /api/jobs/<job_id>
+    """
+    job_id = start_cache_recompute()
+    return jsonify({
+        'status': 'success',
+        'job_id': job_id,
+        'job_url': f'/api/jobs/{job_id}'
+    }), 202
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Endpoint per consultare lo stato di un job in background"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({
+            'status': 'error',
+            'message': f'Job non trovato: {job_id}'
+        }), 404
+    return jsonify({
+        'status': 'success',
+        'job': job
+    })
+
+
 # Serve frontend statico (se buildato)
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -1271,6 +2222,11 @@ if __name__ == '__main__':
         logger.warning(f"⚠ Model folder non esiste, creazione...")
         os.makedirs(Config.MODEL_FOLDER, exist_ok=True)
     
+    # Ricalcolo voci obsolete della cache (solo nel processo servito dal reloader di debug)
+    if Config.CACHE_RECOMPUTE_ON_STARTUP and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        logger.info("🔄 Avvio ricalcolo in background delle voci obsolete della cache...")
+        start_cache_recompute()
+    
     logger.info("=" * 60)
     logger.info("🚀 Server in avvio su http://0.0.0.0:5000")
     logger.info("=" * 60)
@@ -0,0 +1,116 @@
+"""
+Cache in memoria dei file JSON delle baseline
+
+detect_anomaly e gli endpoint della baseline leggono gli stessi file a ogni
+richiesta. CachedJsonFile tiene in memoria l'ultimo contenuto letto con la
+firma del file (inode, mtime, dimensione): finché la firma non cambia basta
+una stat, altrimenti il file viene riletto. Chi modifica il file passa da
+write/update (scrittura atomica con os.replace e aggiornamento immediato
+della cache).
+
+Contenuto e firma sono sostituiti insieme con un solo assegnamento: chi legge
+mentre un altro thread scrive ottiene la versione precedente o la nuova,
+mai un misto. Il dizionario restituito è condiviso tra le richieste e non va
+modificato: per cambiarlo si scrive una copia.
+"""
+import json
+import logging
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger('BASELINE_CACHE')
+
+FileSignature = Tuple[int, int, int]
+
+
+def file_signature(path: str) -> Optional[FileSignature]:
+    """Inode, mtime (ns) e dimensione del file, o None se non esiste"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def write_json_atomic(path: str, data: Dict) -> Optional[FileSignature]:
+    """
+    Scrive un JSON con un file temporaneo e os.replace (chi legge non vede mai un file a metà)
+
+    Returns:
+        Firma del file scritto
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+    return file_signature(path)
+
+
+class CachedJsonFile:
+    """Contenuto di un file JSON tenuto in memoria e riletto solo quando il file cambia"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # (firma, contenuto): sostituiti insieme
+        self._entry: Tuple[Optional[FileSignature], Optional[Dict]] = (None, None)
+
+    def get(self) -> Optional[Dict]:
+        """
+        Contenuto corrente del file (da non modificare), o None se il file non esiste
+
+        Raises:
+            ValueError: Se il file non è un JSON valido
+        """
+        signature, data = self._entry
+        if signature is not None and signature == file_signature(self.path):
+            return data
+        with self._lock:
+            return self._read_locked()
+
+    def write(self, data: Dict):
+        """Salva il contenuto sul file e nella cache (copia di primo livello di data)"""
+        with self._lock:
+            data = dict(data)
+            self._entry = (write_json_atomic(self.path, data), data)
+
+    def update(self, fn: Callable[[Optional[Dict]], Optional[Dict]]) -> Optional[Dict]:
+        """
+        Lettura e scrittura senza altre scritture nel mezzo
+
+        Args:
+            fn: Riceve il contenuto corrente (o None) e restituisce il nuovo
+                contenuto, oppure None per lasciare il file invariato
+
+        Returns:
+            Il contenuto scritto, o None se fn non ha cambiato nulla
+        """
+        with self._lock:
+            current = self._read_locked()
+            data = fn(current)
+            if data is None:
+                return None
+            data = dict(data)
+            self._entry = (write_json_atomic(self.path, data), data)
+            return data
+
+    def _read_locked(self) -> Optional[Dict]:
+        """Contenuto corrente, riletto se la firma del file è cambiata (con il lock)"""
+        current = file_signature(self.path)
+        if current is None:
+            self._entry = (None, None)
+            return None
+        if self._entry[0] != current:
+            with open(self.path, 'r') as f:
+                # Firma del file effettivamente letto (può essere stato sostituito dopo la stat)
+                st = os.fstat(f.fileno())
+                self._entry = ((st.st_ino, st.st_mtime_ns, st.st_size), json.load(f))
+            logger.debug(f"📄 Ricaricato {os.path.basename(self.path)}")
+        return self._entry[1]
+
+    def invalidate(self):
+        """Dimentica il contenuto in memoria (la prossima get rilegge il file)"""
+        with self._lock:
+            self._entry = (None, None)
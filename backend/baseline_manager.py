@@ -2,13 +2,17 @@
 Modulo per gestione Baseline Incrementale con Persistenza Storica
 Permette di migliorare progressivamente la baseline aggiungendo corse buone nel tempo
 """
+import copy
 import json
 import os
 import logging
 import shutil
+import threading
 from datetime import datetime
 from typing import Dict, Optional, List
-import numpy as np
+
+from baseline_cache import file_signature, write_json_atomic
+from running_stats import ExponentialStats, RunningStats
 
 logger = logging.getLogger('BASELINE_MANAGER')
 
@@ -17,32 +21,58 @@ class BaselineHistory:
     """
     Gestisce lo storico delle baseline e l'aggiornamento incrementale
     Salva un file JSON con statistiche globali e riferimenti alla migliore corsa
+
+    Lo storico resta in memoria: load() rilegge il file solo se è cambiato
+    (inode, mtime, dimensione). update() lavora su una copia e la pubblica
+    dopo il salvataggio, così chi legge vede sempre l'ultima versione salvata.
     """
     
-    def __init__(self, history_file_path: str, ghost_frames_folder: str):
+    def __init__(self, history_file_path: str, ghost_frames_folder: str, ewma_alpha: float = 0.0):
         """
         Inizializza il BaselineHistory
         
         Args:
             history_file_path: Percorso del file baseline_history.json
             ghost_frames_folder: Cartella per i ghost frames
+            ewma_alpha: Peso della corsa più recente nelle statistiche a pesi
+                esponenziali (0 = non calcolate)
         """
         self.history_file_path = history_file_path
         self.ghost_frames_folder = ghost_frames_folder
+        self.ewma_alpha = ewma_alpha
         self.history_data = None
+        # Ultima versione salvata (non modificata dopo la pubblicazione) e firma del file
+        self._snapshot = None
+        self._signature = None
+        self._lock = threading.RLock()
         
     def load(self) -> Dict:
         """
-        Carica lo storico della baseline dal file JSON
+        Carica lo storico della baseline dal file JSON (solo se cambiato dall'ultima lettura)
         Se il file non esiste, crea una struttura vuota
         
         Returns:
             Dizionario con lo storico della baseline
         """
-        if os.path.exists(self.history_file_path):
+        signature = file_signature(self.history_file_path)
+        snapshot = self._snapshot
+        if snapshot is not None and signature is not None and signature == self._signature:
+            return snapshot
+        with self._lock:
+            return self._load_locked()
+    
+    def _load_locked(self) -> Dict:
+        signature = file_signature(self.history_file_path)
+        if self._snapshot is not None and signature is not None and signature == self._signature:
+            return self._snapshot
+        if signature is not None:
             try:
                 with open(self.history_file_path, 'r') as f:
+                    # Firma del file effettivamente letto (può essere stato sostituito dopo la stat)
+                    st = os.fstat(f.fileno())
+                    signature = (st.st_ino, st.st_mtime_ns, st.st_size)
                     self.history_data = json.load(f)
+                self._publish(signature)
                 logger.info(f"✓ Baseline history caricato: {self.history_file_path}")
                 logger.info(f"  Corse totali: {self.history_data.get('run_count', 0)}")
                 logger.info(f"  Best run ID: {self.history_data.get('best_run_id', 'N/A')}")
@@ -69,8 +99,14 @@ class BaselineHistory:
             'global_stats': {},
             'runs_history': []
         }
+        self._publish(None)
         return self.history_data
     
+    def _publish(self, signature):
+        """Rende history_data la versione letta da get_current_baseline e get_stats_summary"""
+        self._snapshot = self.history_data
+        self._signature = signature
+    
     def _calculate_run_error(self, metrics: Dict, view_type: str) -> float:
         """
         Calcola un punteggio di errore totale per una corsa
@@ -103,10 +139,32 @@ class BaselineHistory:
             return total_error / count
         return float('inf')
     
+    def _metric_running_stats(self, stats: Dict) -> RunningStats:
+        """
+        Accumulatore di una metrica dalle statistiche salvate
+        
+        Gli storici salvati prima di count/m2 hanno solo media e StdDev: il
+        conteggio è quello delle corse e M2 è ricostruito dalla StdDev.
+        """
+        if 'count' in stats and 'm2' in stats:
+            return RunningStats.from_dict(stats)
+        count = max(int(self.history_data.get('run_count', 0)), 1)
+        return RunningStats.from_dict({
+            'count': count,
+            'mean': stats['mean'],
+            'm2': float(stats.get('std', 0.0)) ** 2 * count,
+            'min': stats['min'],
+            'max': stats['max']
+        })
+    
     def _update_global_stats_incremental(self, new_metrics: Dict, view_type: str):
         """
-        Aggiorna le statistiche globali usando la media incrementale
-        Formula: new_avg = (old_avg * count + new_value) / (count + 1)
+        Aggiorna le statistiche globali con media e varianza esatte (Welford)
+        
+        Per ogni metrica si salvano conteggio, media, M2, min e max: l'aggiornamento
+        è O(1) e la StdDev resta corretta dopo ogni ricaricamento, qualunque sia il
+        numero di corse. Con ewma_alpha > 0 si aggiornano anche media e StdDev a
+        pesi esponenziali ('ewma').
         
         Args:
             new_metrics: Metriche della nuova corsa
@@ -116,7 +174,6 @@ class BaselineHistory:
             self.history_data['global_stats'] = {}
         
         global_stats = self.history_data['global_stats']
-        current_count = self.history_data['run_count']
         
         if view_type == 'posterior':
             metric_keys = ['left_knee_valgus', 'right_knee_valgus', 'pelvic_drop', 
@@ -133,39 +190,30 @@ class BaselineHistory:
             if new_value is None:
                 continue
             
-            # Inizializza se non esiste
-            if key not in global_stats:
-                global_stats[key] = {
-                    'mean': new_value,
-                    'std': 0.0,
-                    'min': new_value,
-                    'max': new_value,
-                    'values': [new_value]  # Mantieni gli ultimi N valori per calcolare std
-                }
-            else:
-                # Media incrementale
-                old_mean = global_stats[key]['mean']
-                new_mean = (old_mean * current_count + new_value) / (current_count + 1)
-                global_stats[key]['mean'] = new_mean
-                
-                # Aggiorna min/max
-                global_stats[key]['min'] = min(global_stats[key]['min'], new_value)
-                global_stats[key]['max'] = max(global_stats[key]['max'], new_value)
-                
-                # Aggiungi valore alla lista (mantieni ultimi 100 per std)
-                values = global_stats[key].get('values', [])
-                values.append(new_value)
-                if len(values) > 100:
-                    values = values[-100:]  # Mantieni solo ultimi 100
-                global_stats[key]['values'] = values
-                
-                # Calcola deviazione standard
-                if len(values) > 1:
-                    global_stats[key]['std'] = float(np.std(values))
-                
-                logger.debug(f"  {key}: old_mean={old_mean:.2f}, new_value={new_value:.2f}, new_mean={new_mean:.2f}")
-        
-        logger.info("✓ Statistiche globali aggiornate con media incrementale")
+            old_stats = global_stats.get(key)
+            running = self._metric_running_stats(old_stats) if old_stats else RunningStats()
+            old_mean = running.mean
+            running.push(new_value)
+            
+            stats = running.to_dict()
+            stats['std'] = running.std
+            if self.ewma_alpha > 0:
+                if old_stats and 'ewma' in old_stats:
+                    ewma = ExponentialStats.from_dict(old_stats['ewma'])
+                else:
+                    # Parte dalle statistiche esatte già accumulate
+                    ewma = ExponentialStats(self.ewma_alpha)
+                    if old_stats:
+                        ewma.mean, ewma.var, ewma.count = old_mean, running.variance, running.count - 1
+                ewma.alpha = self.ewma_alpha
+                ewma.push(new_value)
+                stats['ewma'] = ewma.to_dict()
+            global_stats[key] = stats
+            
+            logger.debug(f"  {key}: old_mean={old_mean:.2f}, new_value={new_value:.2f}, "
+                         f"new_mean={running.mean:.2f}, std={running.std:.2f} (n={running.count})")
+        
+        logger.info("✓ Statistiche globali aggiornate (media e varianza incrementali)")
     
     def update(self, analysis_data: Dict, analysis_id: str, 
                skeleton_video_path: Optional[str] = None,
@@ -173,6 +221,9 @@ class BaselineHistory:
         """
         Aggiorna lo storico della baseline con una nuova corsa
         
+        Un aggiornamento alla volta, su una copia dello storico: la versione
+        letta dagli altri thread cambia solo dopo il salvataggio.
+        
         Args:
             analysis_data: Dati completi dell'analisi (da detect_anomaly)
             analysis_id: ID univoco dell'analisi
@@ -182,14 +233,22 @@ class BaselineHistory:
         Returns:
             Dizionario con risultati dell'aggiornamento
         """
+        with self._lock:
+            self.load()
+            self.history_data = copy.deepcopy(self._snapshot)
+            try:
+                return self._add_run(analysis_data, analysis_id, skeleton_video_path, is_best_candidate)
+            finally:
+                # Senza salvataggio (errore o vista incompatibile) la copia viene scartata
+                self.history_data = self._snapshot
+    
+    def _add_run(self, analysis_data: Dict, analysis_id: str,
+                 skeleton_video_path: Optional[str], is_best_candidate: bool) -> Dict:
+        """Aggiunge una corsa a history_data (copia di lavoro) e la salva"""
         logger.info("=" * 60)
         logger.info("📊 AGGIORNAMENTO BASELINE INCREMENTALE")
         logger.info("=" * 60)
         
-        # Carica storico se non già caricato
-        if self.history_data is None:
-            self.load()
-        
         # Estrai info
         view_type = analysis_data.get('viewType', analysis_data.get('view_type', 'posterior'))
         metrics = analysis_data.get('metrics', {})
@@ -317,11 +376,13 @@ class BaselineHistory:
         """
         try:
             from pose_engine import PoseEngine
+            from ghost_store import invalidate_folder
             
             # Pulisci cartella ghost frames esistente
             if os.path.exists(self.ghost_frames_folder):
                 logger.info(f"🧹 Pulizia ghost frames esistenti...")
                 shutil.rmtree(self.ghost_frames_folder)
+                invalidate_folder(self.ghost_frames_folder)
             os.makedirs(self.ghost_frames_folder, exist_ok=True)
             
             # Crea engine per generare ghost frames
@@ -355,18 +416,8 @@ class BaselineHistory:
     def _save(self):
         """Salva lo storico della baseline su disco"""
         try:
-            # Assicurati che la directory esista
-            os.makedirs(os.path.dirname(self.history_file_path), exist_ok=True)
-            
-            # Rimuovi 'values' dalle statistiche prima di salvare (troppo grande)
-            history_to_save = self.history_data.copy()
-            if 'global_stats' in history_to_save:
-                for key in history_to_save['global_stats']:
-                    if 'values' in history_to_save['global_stats'][key]:
-                        del history_to_save['global_stats'][key]['values']
-            
-            with open(self.history_file_path, 'w') as f:
-                json.dump(history_to_save, f, indent=2)
+            # Scrittura atomica: chi rilegge il file non vede mai uno storico a metà
+            self._publish(write_json_atomic(self.history_file_path, self.history_data))
             logger.info(f"💾 Baseline history salvato: {self.history_file_path}")
         except Exception as e:
             logger.error(f"❌ Errore nel salvare baseline history: {e}")
@@ -380,37 +431,38 @@ class BaselineHistory:
         Returns:
             Dizionario con statistiche baseline
         """
-        if self.history_data is None:
-            self.load()
+        history_data = self._snapshot if self._snapshot is not None else self.load()
         
-        if self.history_data['run_count'] == 0:
+        if history_data['run_count'] == 0:
             return None
         
         baseline_stats = {
-            'view_type': self.history_data['view_type'],
-            'speed_kmh': self.history_data['speed_kmh'],
-            'fps': self.history_data['fps'],
-            'n_videos': self.history_data['run_count'],
-            'created_at': self.history_data['created_at'],
-            'updated_at': self.history_data['updated_at'],
+            'view_type': history_data['view_type'],
+            'speed_kmh': history_data['speed_kmh'],
+            'fps': history_data['fps'],
+            'n_videos': history_data['run_count'],
+            'created_at': history_data['created_at'],
+            'updated_at': history_data['updated_at'],
             'total_frames': 0,  # Non tracciato in baseline incrementale
             'is_incremental': True,
-            'best_run_id': self.history_data['best_run_id'],
-            'best_run_error': self.history_data['best_run_error']
+            'best_run_id': history_data['best_run_id'],
+            'best_run_error': history_data['best_run_error']
         }
         
         # Aggiungi statistiche globali
-        for key, stats in self.history_data['global_stats'].items():
+        for key, stats in history_data['global_stats'].items():
             baseline_stats[key] = {
                 'mean': stats['mean'],
                 'std': stats['std'],
                 'min': stats['min'],
                 'max': stats['max']
             }
+            if 'ewma' in stats:
+                baseline_stats[key]['ewma'] = {'mean': stats['ewma']['mean'], 'std': stats['ewma']['std']}
         
         # Aggiungi ghost frames info se disponibile
-        if 'ghost_frames' in self.history_data:
-            baseline_stats['ghost_frames'] = self.history_data['ghost_frames']
+        if 'ghost_frames' in history_data:
+            baseline_stats['ghost_frames'] = history_data['ghost_frames']
         
         return baseline_stats
     
@@ -421,18 +473,17 @@ class BaselineHistory:
         Returns:
             Dizionario con statistiche di riepilogo
         """
-        if self.history_data is None:
-            self.load()
+        history_data = self._snapshot if self._snapshot is not None else self.load()
         
         return {
-            'run_count': self.history_data['run_count'],
-            'best_run_id': self.history_data['best_run_id'],
-            'best_run_error': self.history_data['best_run_error'],
-            'view_type': self.history_data['view_type'],
-            'created_at': self.history_data['created_at'],
-            'updated_at': self.history_data['updated_at'],
-            'global_stats_keys': list(self.history_data.get('global_stats', {}).keys()),
-            'recent_runs': self.history_data.get('runs_history', [])[-5:]  # Ultimi 5
+            'run_count': history_data['run_count'],
+            'best_run_id': history_data['best_run_id'],
+            'best_run_error': history_data['best_run_error'],
+            'view_type': history_data['view_type'],
+            'created_at': history_data['created_at'],
+            'updated_at': history_data['updated_at'],
+            'global_stats_keys': list(history_data.get('global_stats', {}).keys()),
+            'recent_runs': history_data.get('runs_history', [])[-5:]  # Ultimi 5
         }
 
 
@@ -0,0 +1,294 @@
+"""
+Registro delle baseline per atleta, vista e velocità
+
+Ogni baseline creata con /api/create_baseline viene salvata anche nel registro
+(models/baselines/<atleta>/<vista>_<velocità>kmh.json), così le baseline di
+atleti e velocità diverse non si sovrascrivono e un solo server può seguire
+una squadra intera. baseline.json resta la baseline corrente (Ghost Vision).
+
+L'indice è in memoria: (atleta, vista) -> {velocità in decimi di km/h: baseline},
+con le velocità ordinate per la ricerca della più vicina. Per una velocità
+senza baseline si usa la più vicina entro la tolleranza, oppure
+l'interpolazione lineare tra le due baseline che la comprendono.
+
+Ogni ricerca confronta la firma (inode, mtime, dimensione) della cartella del
+registro e di quella dell'atleta con quelle lette: le scritture sono atomiche
+(os.replace) e cambiano la firma della cartella, così le baseline registrate
+da altri processi del server vengono lette appena servono (solo i file cambiati).
+"""
+import bisect
+import glob
+import json
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from baseline_cache import FileSignature, file_signature, write_json_atomic
+from running_stats import BASELINE_METRICS, QuantileSketch, percentile_summary
+
+logger = logging.getLogger('BASELINE_REGISTRY')
+
+DEFAULT_ATHLETE_ID = 'default'
+ATHLETE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Campi statistici di ogni metrica che vengono interpolati
+INTERPOLATED_FIELDS = ('mean', 'std', 'frame_std', 'min', 'max')
+
+
+def speed_key(speed_kmh: float) -> int:
+    """Velocità in decimi di km/h (chiave dell'indice e del nome del file)"""
+    return int(round(float(speed_kmh) * 10))
+
+
+def valid_athlete_id(athlete_id: str) -> bool:
+    """True se l'ID atleta è utilizzabile come nome di cartella (lettere, numeri, '-', '_')"""
+    return bool(ATHLETE_ID_PATTERN.match(athlete_id or ''))
+
+
+def interpolate_baselines(lower: Dict, upper: Dict, speed_kmh: float) -> Dict:
+    """
+    Baseline interpolata linearmente tra due baseline della stessa vista
+
+    Args:
+        lower: Baseline a velocità inferiore
+        upper: Baseline a velocità superiore
+        speed_kmh: Velocità richiesta (tra le due)
+
+    Returns:
+        Statistiche baseline con media, StdDev, min e max interpolati per metrica
+        (e quantili dei frame, se entrambe hanno lo sketch); FPS e stimatore
+        della baseline più vicina
+    """
+    span = upper['speed_kmh'] - lower['speed_kmh']
+    weight = (speed_kmh - lower['speed_kmh']) / span if span > 0 else 0.0
+    nearest = upper if weight > 0.5 else lower
+    view_type = lower.get('view_type', 'posterior')
+
+    baseline_stats = {'view_type': view_type}
+    for metric in BASELINE_METRICS[view_type]:
+        if metric not in lower or metric not in upper:
+            if metric in nearest:
+                baseline_stats[metric] = dict(nearest[metric])
+            continue
+        baseline_stats[metric] = {
+            field: (1.0 - weight) * lower[metric][field] + weight * upper[metric][field]
+            for field in INTERPOLATED_FIELDS if field in lower[metric] and field in upper[metric]
+        }
+        if lower[metric].get('sketch') and upper[metric].get('sketch'):
+            sketch = QuantileSketch.interpolate(QuantileSketch.from_dict(lower[metric]['sketch']),
+                                                QuantileSketch.from_dict(upper[metric]['sketch']), weight)
+            baseline_stats[metric]['percentiles'] = percentile_summary(sketch)
+            baseline_stats[metric]['sketch'] = sketch.to_dict()
+    for key in ('estimator', 'trim_fraction'):
+        if key in nearest:
+            baseline_stats[key] = nearest[key]
+    baseline_stats.update({
+        'athlete_id': lower.get('athlete_id', DEFAULT_ATHLETE_ID),
+        'speed_kmh': float(speed_kmh),
+        'fps': nearest['fps'],
+        'n_videos': min(lower.get('n_videos', 0), upper.get('n_videos', 0)),
+        'created_at': max(lower.get('created_at', ''), upper.get('created_at', '')),
+        'interpolated_from': [lower['speed_kmh'], upper['speed_kmh']]
+    })
+    return baseline_stats
+
+
+class BaselineRegistry:
+    """Baseline salvate per (atleta, vista, velocità) con indice in memoria"""
+
+    def __init__(self, folder: str):
+        """
+        Args:
+            folder: Cartella del registro (una sottocartella per atleta)
+        """
+        self.folder = folder
+        self._lock = threading.Lock()
+        # (atleta, vista) -> {chiave velocità: baseline}
+        self._index: Dict[Tuple[str, str], Dict[int, Dict]] = {}
+        # (atleta, vista) -> chiavi velocità ordinate
+        self._speeds: Dict[Tuple[str, str], List[int]] = {}
+        # File letti: percorso -> (firma, gruppo, chiave velocità)
+        self._files: Dict[str, Tuple[Optional[FileSignature], Tuple[str, str], int]] = {}
+        # Firme delle cartelle lette (registro e atleti)
+        self._dir_signatures: Dict[str, Optional[FileSignature]] = {}
+        with self._lock:
+            self._refresh_locked()
+        if self._index:
+            logger.info(f"📚 Registro baseline: {len(self)} baseline, {len(self.athletes())} atleti")
+
+    def _path(self, athlete_id: str, view_type: str, key: int) -> str:
+        return os.path.join(self.folder, athlete_id, f"{view_type}_{key / 10:.1f}kmh.json")
+
+    def _refresh_locked(self, athlete_id: Optional[str] = None):
+        """
+        Rilegge le cartelle cambiate dall'ultima lettura (con il lock)
+
+        Args:
+            athlete_id: Solo la cartella di questo atleta (None = tutte)
+        """
+        if athlete_id is not None and not valid_athlete_id(athlete_id):
+            return
+        if athlete_id is not None:
+            athlete_dirs = [os.path.join(self.folder, athlete_id)]
+        else:
+            root_signature = file_signature(self.folder)
+            if root_signature != self._dir_signatures.get(self.folder):
+                self._dir_signatures[self.folder] = root_signature
+                for path in glob.glob(os.path.join(self.folder, '*', '')):
+                    self._dir_signatures.setdefault(os.path.dirname(path), None)
+            athlete_dirs = [path for path in self._dir_signatures if path != self.folder]
+        for athlete_dir in athlete_dirs:
+            signature = file_signature(athlete_dir)
+            if athlete_dir in self._dir_signatures and signature == self._dir_signatures[athlete_dir]:
+                continue
+            self._dir_signatures[athlete_dir] = signature
+            self._scan_dir_locked(athlete_dir)
+
+    def _scan_dir_locked(self, athlete_dir: str):
+        """Legge i file nuovi o modificati di una cartella atleta e dimentica quelli rimossi"""
+        paths = set(glob.glob(os.path.join(athlete_dir, '*.json')))
+        for path in [p for p in self._files if os.path.dirname(p) == athlete_dir and p not in paths]:
+            self._remove(path)
+        for path in sorted(paths):
+            signature = file_signature(path)
+            if path in self._files and self._files[path][0] == signature:
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    baseline_stats = json.load(f)
+                self._add(baseline_stats, path, signature)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning(f"⚠ Baseline del registro non leggibile, ignorata: {path} ({e})")
+
+    def _add(self, baseline_stats: Dict, path: str, signature: Optional[FileSignature]):
+        if path in self._files:
+            self._remove(path)
+        group = (baseline_stats.get('athlete_id', DEFAULT_ATHLETE_ID), baseline_stats['view_type'])
+        key = speed_key(baseline_stats['speed_kmh'])
+        entries = self._index.setdefault(group, {})
+        if key not in entries:
+            bisect.insort(self._speeds.setdefault(group, []), key)
+        entries[key] = baseline_stats
+        self._files[path] = (signature, group, key)
+
+    def _remove(self, path: str):
+        _, group, key = self._files.pop(path)
+        entries = self._index.get(group, {})
+        # Un altro file può aver sostituito la stessa velocità
+        if any(g == group and k == key for _, g, k in self._files.values()):
+            return
+        entries.pop(key, None)
+        if key in self._speeds.get(group, []):
+            self._speeds[group].remove(key)
+        if not entries:
+            self._index.pop(group, None)
+            self._speeds.pop(group, None)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._index.values())
+
+    def athletes(self) -> List[str]:
+        with self._lock:
+            self._refresh_locked()
+            return sorted({athlete_id for athlete_id, _ in self._index})
+
+    def register(self, baseline_stats: Dict, athlete_id: str = DEFAULT_ATHLETE_ID) -> str:
+        """
+        Salva una baseline nel registro (sostituisce quella con stessa vista e velocità)
+
+        Args:
+            baseline_stats: Statistiche con 'view_type', 'speed_kmh' e 'fps'
+            athlete_id: ID dell'atleta
+
+        Returns:
+            Percorso del file salvato
+
+        Raises:
+            ValueError: Se l'ID atleta non è valido
+        """
+        if not valid_athlete_id(athlete_id):
+            raise ValueError(f'athlete_id non valido: {athlete_id!r}')
+        baseline_stats = dict(baseline_stats, athlete_id=athlete_id)
+        path = self._path(athlete_id, baseline_stats['view_type'], speed_key(baseline_stats['speed_kmh']))
+        with self._lock:
+            self._add(baseline_stats, path, write_json_atomic(path, baseline_stats))
+        logger.info(f"📚 Baseline registrata: {athlete_id} / {baseline_stats['view_type']} / "
+                    f"{baseline_stats['speed_kmh']:.1f} km/h")
+        return path
+
+    def get(self, athlete_id: str, view_type: str, speed_kmh: float) -> Optional[Dict]:
+        """Baseline con esattamente questa velocità (al decimo di km/h), o None"""
+        with self._lock:
+            self._refresh_locked(athlete_id)
+            return self._index.get((athlete_id, view_type), {}).get(speed_key(speed_kmh))
+
+    def speeds(self, athlete_id: str, view_type: str) -> List[float]:
+        """Velocità disponibili (km/h) per atleta e vista, in ordine crescente"""
+        with self._lock:
+            self._refresh_locked(athlete_id)
+            return [key / 10 for key in self._speeds.get((athlete_id, view_type), [])]
+
+    def neighbours(self, athlete_id: str, view_type: str,
+                   speed_kmh: float) -> Tuple[Optional[Dict], Optional[Dict]]:
+        """Baseline alla velocità più alta <= speed_kmh e più bassa >= speed_kmh (None se mancano)"""
+        group = (athlete_id, view_type)
+        with self._lock:
+            self._refresh_locked(athlete_id)
+            keys = self._speeds.get(group, [])
+            entries = self._index.get(group, {})
+            key = speed_key(speed_kmh)
+            i = bisect.bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                return entries[key], entries[key]
+            lower = entries[keys[i - 1]] if i > 0 else None
+            upper = entries[keys[i]] if i < len(keys) else None
+        return lower, upper
+
+    def nearest(self, athlete_id: str, view_type: str, speed_kmh: float) -> Optional[Dict]:
+        """Baseline con la velocità più vicina, o None se l'atleta non ha baseline per la vista"""
+        candidates = [b for b in self.neighbours(athlete_id, view_type, speed_kmh) if b is not None]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda b: abs(b['speed_kmh'] - speed_kmh))
+
+    def select(self, athlete_id: str, view_type: str, speed_kmh: float,
+               tolerance_kmh: float, max_interpolation_gap_kmh: float) -> Tuple[Optional[Dict], str]:
+        """
+        Baseline da usare per un'analisi
+
+        1. la velocità più vicina, se entro tolerance_kmh ('exact' o 'nearest')
+        2. l'interpolazione tra le due velocità vicine, se la comprendono e
+           distano al più max_interpolation_gap_kmh ('interpolated')
+
+        Returns:
+            Tupla (statistiche baseline o None, modalità: 'exact', 'nearest',
+            'interpolated' o 'none')
+        """
+        lower, upper = self.neighbours(athlete_id, view_type, speed_kmh)
+        if lower is not None and lower is upper:
+            return lower, 'exact'
+        nearest = self.nearest(athlete_id, view_type, speed_kmh)
+        if nearest is not None and abs(nearest['speed_kmh'] - speed_kmh) <= tolerance_kmh:
+            return nearest, 'nearest'
+        if lower is not None and upper is not None and \
+                upper['speed_kmh'] - lower['speed_kmh'] <= max_interpolation_gap_kmh:
+            return interpolate_baselines(lower, upper, speed_kmh), 'interpolated'
+        return None, 'none'
+
+    def summary(self, athlete_id: Optional[str] = None) -> List[Dict]:
+        """Elenco delle baseline (atleta, vista, velocità, FPS, video, data di creazione)"""
+        with self._lock:
+            self._refresh_locked(athlete_id)
+            groups = sorted(self._index.items())
+        return [{
+            'athlete_id': group_athlete,
+            'view_type': view_type,
+            'speed_kmh': baseline_stats['speed_kmh'],
+            'fps': baseline_stats.get('fps'),
+            'n_videos': baseline_stats.get('n_videos'),
+            'created_at': baseline_stats.get('created_at')
+        } for (group_athlete, view_type), entries in groups
+            if athlete_id is None or group_athlete == athlete_id
+            for _, baseline_stats in sorted(entries.items())]
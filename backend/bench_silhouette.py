@@ -0,0 +1,109 @@
+"""
+Benchmark dell'estrazione della silhouette Ghost Vision
+
+Confronta l'implementazione precedente (morfologia e contorni a risoluzione
+piena, kernel e immagini allocati per ogni frame) con SilhouetteExtractor a
+diverse scale, su mask sintetiche 720p e 1080p simili a quelle di MediaPipe.
+
+Uso:
+    python bench_silhouette.py --frames 200 --scales 1.0 0.5 0.25
+"""
+import argparse
+import sys
+import time
+from typing import Callable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from silhouette import SilhouetteExtractor
+
+RESOLUTIONS = {'720p': (1280, 720), '1080p': (1920, 1080)}
+
+
+def synthetic_mask(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """Mask float32 (0-1) con una sagoma di corridore, bordi sfumati e rumore"""
+    rng = np.random.default_rng(seed)
+    mask = np.zeros((height, width), dtype=np.float32)
+    cx, s = width // 2, height / 720
+    cv2.circle(mask, (cx, int(140 * s)), int(45 * s), 1.0, -1)
+    cv2.ellipse(mask, (cx, int(330 * s)), (int(75 * s), int(150 * s)), 0, 0, 360, 1.0, -1)
+    for dx, angle in ((-40, 15), (40, -25)):
+        cv2.ellipse(mask, (cx + int(dx * s), int(560 * s)), (int(28 * s), int(130 * s)),
+                    angle, 0, 360, 1.0, -1)
+    mask = cv2.GaussianBlur(mask, (0, 0), 3 * s)
+    noise = rng.random(mask.shape, dtype=np.float32) < 0.002
+    mask[noise] = 1.0
+    return mask
+
+
+def legacy_silhouette(mask: np.ndarray, color: Tuple[int, int, int]) -> np.ndarray:
+    """Implementazione precedente a SilhouetteExtractor (riferimento)"""
+    h, w = mask.shape
+    mask_uint8 = (mask * 255).astype(np.uint8)
+    _, binary_mask = cv2.threshold(mask_uint8, 127, 255, cv2.THRESH_BINARY)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+    binary_mask = cv2.morphologyEx(binary_mask, cv2.MORPH_CLOSE, kernel)
+    binary_mask = cv2.morphologyEx(binary_mask, cv2.MORPH_OPEN, kernel)
+    contours, _ = cv2.findContours(binary_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    ghost_img = np.zeros((h, w, 4), dtype=np.uint8)
+    if contours:
+        largest_contour = max(contours, key=cv2.contourArea)
+        bgr_img = np.zeros((h, w, 3), dtype=np.uint8)
+        cv2.drawContours(bgr_img, [largest_contour], -1, color, -1)
+        cv2.drawContours(bgr_img, [largest_contour], -1, color, 3)
+        ghost_img[:, :, :3] = bgr_img
+        ghost_img[:, :, 3] = binary_mask
+    return ghost_img
+
+
+def time_per_frame(fn: Callable[[], object], frames: int) -> float:
+    """Millisecondi medi per chiamata (dopo una chiamata di riscaldamento)"""
+    fn()
+    start = time.perf_counter()
+    for _ in range(frames):
+        fn()
+    return (time.perf_counter() - start) * 1000 / frames
+
+
+def silhouette_iou(a: np.ndarray, b: np.ndarray) -> float:
+    """Intersection over union dei canali alpha di due silhouette"""
+    a, b = a[:, :, 3] > 0, b[:, :, 3] > 0
+    union = np.logical_or(a, b).sum()
+    return float(np.logical_and(a, b).sum() / union) if union else 1.0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark dell\'estrazione della silhouette Ghost Vision')
+    parser.add_argument('--frames', type=int, default=100, help='Frame per misura')
+    parser.add_argument('--scales', nargs='+', type=float, default=[1.0, 0.5, 0.25],
+                        help='Scale della mask da provare')
+    parser.add_argument('--resolutions', nargs='+', default=list(RESOLUTIONS), choices=list(RESOLUTIONS))
+    args = parser.parse_args(argv)
+
+    color = (0, 255, 255)
+    print("=" * 72)
+    print(f"{'Risoluzione':<12}{'Variante':<28}{'contorno ms':>12}{'immagine ms':>12}{'IoU':>8}")
+    print("-" * 72)
+    for name in args.resolutions:
+        width, height = RESOLUTIONS[name]
+        mask = synthetic_mask(width, height)
+        reference = legacy_silhouette(mask, color)
+        legacy_ms = time_per_frame(lambda: legacy_silhouette(mask, color), args.frames)
+        print(f"{name:<12}{'precedente':<28}{'':>12}{legacy_ms:>12.2f}{1.0:>8.3f}")
+
+        for scale in args.scales:
+            for morphology in (True, False):
+                extractor = SilhouetteExtractor(scale=scale, morphology=morphology)
+                contour_ms = time_per_frame(lambda: extractor.contour(mask), args.frames)
+                image_ms = time_per_frame(
+                    lambda: extractor.render(extractor.contour(mask), width, height, color), args.frames)
+                iou = silhouette_iou(reference, extractor.render(extractor.contour(mask), width, height, color))
+                label = f"scala {scale:g}" + ("" if morphology else ", senza morfologia")
+                print(f"{name:<12}{label:<28}{contour_ms:>12.2f}{image_ms:>12.2f}{iou:>8.3f}")
+        print("-" * 72)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Manutenzione della cache PoseEngine
+
+Individua le voci obsolete (versione del codice diversa da quella corrente)
+e le ricalcola: dai landmark salvati quando cambia solo METRICS_VERSION,
+rielaborando il video sorgente quando cambia LANDMARKS_VERSION.
+"""
+import glob
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from pose_engine import PoseEngine
+from cache_stats import cache_stats, view_type_from_cache_path
+
+logger = logging.getLogger('CACHE_MAINTENANCE')
+
+
+def scan_cache(cache_dir: str = PoseEngine.CACHE_DIR) -> List[Dict]:
+    """
+    Classifica tutte le voci della cache (vedi PoseEngine.inspect_cache_entry)
+
+    Args:
+        cache_dir: Cartella della cache
+
+    Returns:
+        Lista di dizionari con 'path', 'status' e 'meta'
+    """
+    return [PoseEngine.inspect_cache_entry(path)
+            for path in sorted(glob.glob(os.path.join(cache_dir, '*.pkl')))]
+
+
+def summarize_scan(entries: List[Dict]) -> Dict:
+    """Conta le voci della cache per stato"""
+    summary = {'total': len(entries)}
+    for status in ('current', 'recompute', 'reprocess', 'orphan', 'corrupt'):
+        summary[status] = sum(1 for e in entries if e['status'] == status)
+    return summary
+
+
+def _engine_for(meta: Dict) -> PoseEngine:
+    """Crea un PoseEngine con gli stessi parametri della voce (stessa chiave cache)"""
+    return PoseEngine(
+        model_complexity=meta['model_complexity'],
+        min_detection_confidence=meta['min_detection_confidence'],
+        min_tracking_confidence=meta['min_tracking_confidence'],
+        use_cache=True,
+        generate_skeleton_video=False,
+        enable_segmentation=False
+    )
+
+
+def _remove_entry(path: str) -> bool:
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+        cache_stats.record_eviction(view_type_from_cache_path(path), size)
+        return True
+    except OSError as e:
+        logger.warning(f"⚠ Impossibile rimuovere voce cache {os.path.basename(path)}: {e}")
+        return False
+
+
+def recompute_stale_cache(job=None, cache_dir: str = PoseEngine.CACHE_DIR,
+                          reprocess_videos: bool = True, remove_orphans: bool = True,
+                          pause_seconds: float = 0.0) -> Dict:
+    """
+    Ricalcola le voci obsolete della cache
+
+    Pensata per girare come job in background a bassa priorità (vedi jobs.py).
+
+    Args:
+        job: Handle del job per aggiornare il progresso (opzionale)
+        cache_dir: Cartella della cache
+        reprocess_videos: Se True, rielabora i video sorgente quando i landmark sono obsoleti
+        remove_orphans: Se True, rimuove le voci obsolete non ricostruibili
+        pause_seconds: Pausa tra una voce e l'altra per limitare il carico
+
+    Returns:
+        Dizionario con il conteggio delle azioni eseguite
+    """
+    entries = scan_cache(cache_dir)
+    summary = summarize_scan(entries)
+    logger.info(f"🔍 Cache PoseEngine: {summary}")
+
+    stale = [e for e in entries if e['status'] != 'current']
+    stats = {
+        'scanned': summary['total'],
+        'stale': len(stale),
+        'recomputed': 0,
+        'reprocessed': 0,
+        'removed': 0,
+        'failed': 0
+    }
+
+    for i, entry in enumerate(stale):
+        path = entry['path']
+        status = entry['status']
+        name = os.path.basename(path)
+        try:
+            if status == 'recompute':
+                new_path = _engine_for(entry['meta']).recompute_from_cache_entry(path)
+                if new_path:
+                    stats['recomputed'] += 1
+                    if new_path != path:
+                        _remove_entry(path)
+                    logger.info(f"✓ Voce ricalcolata dai landmark: {name}")
+            elif status == 'reprocess' and reprocess_videos:
+                meta = entry['meta']
+                _engine_for(meta).process_video(meta['source_video_path'], fps=meta['fps'],
+                                                view_type=meta['view_type'])
+                stats['reprocessed'] += 1
+                _remove_entry(path)
+                logger.info(f"✓ Voce rielaborata dal video sorgente: {name}")
+            elif status in ('orphan', 'corrupt') and remove_orphans:
+                if _remove_entry(path):
+                    stats['removed'] += 1
+        except Exception as e:
+            stats['failed'] += 1
+            logger.warning(f"⚠ Errore nel ricalcolo della voce {name}: {type(e).__name__}: {e}")
+
+        if job is not None:
+            job.update(progress=(i + 1) / len(stale), message=f"{i + 1}/{len(stale)} voci obsolete", **stats)
+        if pause_seconds > 0:
+            time.sleep(pause_seconds)
+
+    logger.info(f"✅ Manutenzione cache completata: {stats}")
+    return stats
@@ -0,0 +1,135 @@
+"""
+Contatori della cache PoseEngine (hit, miss, eviction, byte, latenze)
+
+I contatori sono per processo e suddivisi per tipo di vista; vengono esposti
+dall'endpoint /api/cache/stats.
+"""
+import glob
+import os
+import threading
+from typing import Dict, Optional
+
+
+class CacheStats:
+    """Contatori thread-safe della cache, suddivisi per tipo di vista"""
+
+    COUNTERS = (
+        'hits',
+        'misses',
+        'evictions',
+        'bytes_written',
+        'bytes_evicted',
+        'load_seconds',
+        'compute_seconds',
+        'compute_seconds_saved'
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_view: Dict[str, Dict[str, float]] = {}
+
+    def _counters(self, view_type: Optional[str]) -> Dict[str, float]:
+        key = view_type or 'unknown'
+        if key not in self._by_view:
+            self._by_view[key] = {name: 0 for name in self.COUNTERS}
+        return self._by_view[key]
+
+    def record_hit(self, view_type: str, load_seconds: float, compute_seconds: Optional[float]):
+        """
+        Registra un hit
+
+        Args:
+            view_type: Tipo di vista
+            load_seconds: Tempo impiegato a caricare la voce
+            compute_seconds: Tempo che era servito a calcolarla (se noto)
+        """
+        with self._lock:
+            counters = self._counters(view_type)
+            counters['hits'] += 1
+            counters['load_seconds'] += load_seconds
+            if compute_seconds:
+                counters['compute_seconds_saved'] += max(0.0, compute_seconds - load_seconds)
+
+    def record_miss(self, view_type: str):
+        with self._lock:
+            self._counters(view_type)['misses'] += 1
+
+    def record_store(self, view_type: str, n_bytes: int, compute_seconds: Optional[float]):
+        with self._lock:
+            counters = self._counters(view_type)
+            counters['bytes_written'] += n_bytes
+            if compute_seconds:
+                counters['compute_seconds'] += compute_seconds
+
+    def record_eviction(self, view_type: Optional[str], n_bytes: int):
+        with self._lock:
+            counters = self._counters(view_type)
+            counters['evictions'] += 1
+            counters['bytes_evicted'] += n_bytes
+
+    @staticmethod
+    def _derive(counters: Dict[str, float]) -> Dict:
+        """Aggiunge hit rate e latenza media ai contatori grezzi"""
+        lookups = counters['hits'] + counters['misses']
+        summary = dict(counters)
+        summary['lookups'] = lookups
+        summary['hit_rate'] = counters['hits'] / lookups if lookups else 0.0
+        summary['avg_load_seconds'] = counters['load_seconds'] / counters['hits'] if counters['hits'] else 0.0
+        return summary
+
+    def snapshot(self) -> Dict:
+        """
+        Restituisce una copia dei contatori
+
+        Returns:
+            Dizionario con 'totals' e 'by_view_type'
+        """
+        with self._lock:
+            by_view = {view: dict(counters) for view, counters in self._by_view.items()}
+
+        totals = {name: 0 for name in self.COUNTERS}
+        for counters in by_view.values():
+            for name in self.COUNTERS:
+                totals[name] += counters[name]
+
+        return {
+            'totals': self._derive(totals),
+            'by_view_type': {view: self._derive(counters) for view, counters in by_view.items()}
+        }
+
+    def reset(self):
+        with self._lock:
+            self._by_view.clear()
+
+
+def cache_disk_usage(cache_dir: str) -> Dict:
+    """
+    Spazio occupato dalla cache su disco
+
+    Returns:
+        Dizionario con numero di voci e byte occupati, in totale e per tipo di vista
+    """
+    usage = {'entries': 0, 'bytes_stored': 0, 'by_view_type': {}}
+    for path in glob.glob(os.path.join(cache_dir, '*.pkl')):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            continue
+        view_type = view_type_from_cache_path(path)
+        view_usage = usage['by_view_type'].setdefault(view_type, {'entries': 0, 'bytes_stored': 0})
+        view_usage['entries'] += 1
+        view_usage['bytes_stored'] += size
+        usage['entries'] += 1
+        usage['bytes_stored'] += size
+    return usage
+
+
+def view_type_from_cache_path(cache_path: str) -> str:
+    """Ricava il tipo di vista dal nome del file cache ('<view>_<hash>.pkl')"""
+    name = os.path.basename(cache_path)
+    prefix = name.split('_', 1)[0] if '_' in name else ''
+    return prefix if prefix in ('posterior', 'lateral') else 'unknown'
+
+
+# Contatori condivisi dal processo
+cache_stats = CacheStats()
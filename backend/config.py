@@ -13,6 +13,7 @@ class Config:
     PROCESSED_VIDEOS_FOLDER = os.path.join(BASE_DIR, 'processed_videos')
     SAVED_ANALYSES_FOLDER = os.path.join(BASE_DIR, 'saved_analyses')
     GHOST_FRAMES_FOLDER = os.path.join(BASE_DIR, 'ghost_frames')
+    BASELINE_REGISTRY_FOLDER = os.path.join(MODEL_FOLDER, 'baselines')  # Baseline per atleta, vista e velocità
     
     # Estensioni video permesse
     ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm'}
@@ -20,11 +21,58 @@ class Config:
     # Dimensione massima file (500 MB)
     MAX_CONTENT_LENGTH = 500 * 1024 * 1024
     
+    # Invio dei file multimediali delegato al reverse proxy (header X-Sendfile, es. nginx/Apache)
+    USE_X_SENDFILE = False
+    
     # Configurazione MediaPipe
     MEDIAPIPE_MODEL_COMPLEXITY = 1
     MEDIAPIPE_MIN_DETECTION_CONFIDENCE = 0.5
     MEDIAPIPE_MIN_TRACKING_CONFIDENCE = 0.5
     
+    # Video con scheletro
+    SKELETON_VIDEO_SCALE = 1.0  # Scala della risoluzione di output (es. 0.5 = metà larghezza e altezza)
+    SKELETON_VIDEO_MODE = 'lazy'  # 'eager' = scritto durante l'analisi, 'lazy' = renderizzato alla prima richiesta
+    SKELETON_VIDEO_RETRY_AFTER_SECONDS = 3  # Retry-After della risposta 202 mentre il video è in rendering
+    SKELETON_SOURCE_MAX_AGE_HOURS = 24  # Sorgenti dei video mai richiesti conservati al massimo (0 = senza limite)
+    SKELETON_SOURCES_MAX_MB = 2048  # Spazio massimo dei sorgenti (0 = illimitato), oltre si rimuovono i più vecchi
+    SKELETON_VIDEO_ENCODER = 'auto'  # 'auto' (ffmpeg se installato), 'ffmpeg' o 'opencv' (cv2.VideoWriter)
+    SKELETON_VIDEO_PRESET = 'balanced'  # Preset ffmpeg: 'fast', 'balanced' o 'quality'
+    FFMPEG_BINARY = 'ffmpeg'  # Nome o percorso dell'eseguibile ffmpeg
+    SKELETON_STREAM_FOLDER = os.path.join(PROCESSED_VIDEOS_FOLDER, 'streams')  # Stream HLS progressivi
+    SKELETON_STREAM_SEGMENT_SECONDS = 2.0  # Durata dei segmenti HLS
+    SKELETON_STREAM_PRESET = 'fast'  # Preset ffmpeg per lo stream (deve stare al passo con l'analisi)
+    SKELETON_STREAM_MAX_AGE_MINUTES = 60  # Stream HLS rimossi dopo questo tempo senza modifiche (0 = mai)
+    
+    # Ghost Vision
+    GHOST_FRAME_FORMAT = 'contour'  # 'contour' = poligono per frame (PNG disegnato su richiesta), 'png' = immagine per frame
+    GHOST_CONTOUR_EPSILON = 1.0  # Semplificazione del poligono in pixel (0 = contorno completo)
+    GHOST_SILHOUETTE_SCALE = 0.5  # Scala della mask per morfologia e contorni (1.0 = risoluzione piena)
+    GHOST_SILHOUETTE_MORPHOLOGY = True  # False = salta la pulizia morfologica (mask già pulita)
+    GHOST_BATCH_MAX_FRAMES = 240  # Frame massimi per richiesta a /api/ghost_frames
+    GHOST_LOOP_CYCLES = 1  # Falcate salvate e riprodotte in loop (0 = tutto il video baseline)
+    GHOST_CYCLE_WARMUP_SECONDS = 0.5  # Frame elaborati prima del ciclo per stabilizzare il tracking
+    GHOST_ENCODE_WORKERS = 2  # Thread per silhouette e codifica durante la generazione (0 = inline)
+    GHOST_ENCODE_QUEUE_SIZE = 16  # Frame in attesa di codifica (limita la memoria)
+    GHOST_PNG_COMPRESSION = 1  # Livello di compressione PNG 0-9 (formato 'png')
+    GHOST_FRAMES_DEFERRED = True  # create_baseline risponde dopo le statistiche, i ghost frames in un job (/api/ghost_status); False = inline
+    
+    # Baseline
+    BASELINE_MIN_VIDEOS = 2  # Video minimi per create_baseline (StdDev tra video)
+    BASELINE_MAX_VIDEOS = 20  # Video massimi per richiesta
+    BASELINE_PROCESS_WORKERS = 5  # Video elaborati in parallelo
+    BASELINE_EWMA_ALPHA = 0.2  # Peso dell'ultima corsa nelle statistiche a pesi esponenziali della baseline incrementale (0 = disattivate)
+    BASELINE_ESTIMATOR = 'mean'  # Stimatore di default: 'mean', 'median' (mediana/MAD) o 'trimmed' (media troncata)
+    BASELINE_TRIM_FRACTION = 0.2  # Frazione di valori tolta per lato con lo stimatore 'trimmed'
+    BASELINE_SPEED_TOLERANCE_KMH = 0.5  # Differenza massima tra velocità dell'analisi e della baseline
+    BASELINE_INTERPOLATION_MAX_GAP_KMH = 4.0  # Distanza massima tra due baseline registrate per interpolarle (0 = mai)
+    ANOMALY_TIMELINE_WINDOW_SECONDS = 0.5  # Finestra del massimo mobile di |Z| nella timeline delle anomalie di detect_anomaly
+    ANOMALY_TIMELINE_METHOD = 'percentile'  # Z dei frame: 'percentile' (rango nei quantili dei frame baseline) o 'zscore'
+    
+    # Manutenzione cache PoseEngine
+    POSE_CACHE_MAX_MB = 0  # Dimensione massima della cache (0 = illimitata), oltre si rimuovono le voci meno usate
+    CACHE_RECOMPUTE_ON_STARTUP = True  # Ricalcola in background le voci obsolete all'avvio
+    CACHE_RECOMPUTE_PAUSE_SECONDS = 0.1  # Pausa tra una voce e l'altra (limita il carico)
+    
     # Configurazione modello LSTM/GRU (ottimizzato)
     LSTM_UNITS = 64
     LATENT_DIM = 32
@@ -0,0 +1,213 @@
+"""
+Rilevamento del ciclo del passo dal segnale della caviglia
+
+Su tapis roulant il corridore ripete sempre la stessa falcata: per Ghost Vision
+basta salvare uno (o pochi) cicli rappresentativi del video baseline e
+riprodurli in loop. Un ciclo va da un picco di altezza della caviglia
+(fase di volo) al picco successivo della stessa caviglia.
+"""
+import logging
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from scipy.signal import find_peaks
+
+logger = logging.getLogger('GAIT_CYCLE')
+
+# Indici MediaPipe delle caviglie (vedi PoseEngine)
+LEFT_ANKLE = 27
+RIGHT_ANKLE = 28
+
+# Punti su cui ricampionare ogni ciclo per confrontarne la forma
+CYCLE_SAMPLES = 64
+
+
+def raw_ankle_height(image_landmarks: np.ndarray, ankle: int = LEFT_ANKLE) -> np.ndarray:
+    """
+    Altezza della caviglia nell'immagine (1 - y normalizzata), NaN nei frame senza pose
+
+    È tutto ciò che serve a select_gait_cycles: chi deve tenere in memoria molti
+    video può conservare questo segnale al posto dei landmark.
+    """
+    return 1.0 - np.asarray(image_landmarks, dtype=np.float64)[:, ankle, 1]
+
+
+def ankle_height_signal(image_landmarks: np.ndarray, ankle: int = LEFT_ANKLE) -> np.ndarray:
+    """
+    Altezza della caviglia nell'immagine per ogni frame
+
+    Args:
+        image_landmarks: Array (n_frame, 33, 3) di PoseEngine.process_video (NaN = pose assente),
+            oppure il segnale (n_frame,) di raw_ankle_height
+        ankle: Indice del landmark della caviglia
+
+    Returns:
+        Array (n_frame,) con l'altezza (1 - y normalizzata, cresce verso l'alto);
+        i frame senza pose sono interpolati dai vicini
+    """
+    height = np.asarray(image_landmarks, dtype=np.float64)
+    if height.ndim != 1:
+        height = raw_ankle_height(height, ankle)
+    valid = ~np.isnan(height)
+    if valid.sum() < 2:
+        return np.zeros_like(height)
+    idx = np.arange(len(height))
+    return np.interp(idx, idx[valid], height[valid])
+
+
+def stride_peaks(height: np.ndarray, fps: float) -> np.ndarray:
+    """
+    Frame dei picchi di altezza della caviglia (un picco per falcata)
+
+    Args:
+        height: Segnale da ankle_height_signal
+        fps: FPS del video
+
+    Returns:
+        Indici dei picchi in ordine crescente
+    """
+    if len(height) < 3:
+        return np.zeros(0, dtype=int)
+    amplitude = float(np.ptp(height))
+    if amplitude <= 0:
+        return np.zeros(0, dtype=int)
+    # Una falcata (stesso piede) dura almeno ~0.5 s anche nello sprint
+    peaks, _ = find_peaks(height, distance=max(1, int(0.5 * fps)), prominence=0.3 * amplitude)
+    return peaks
+
+
+def resample_cycle(segment: np.ndarray, samples: int = CYCLE_SAMPLES) -> np.ndarray:
+    """Ricampiona un ciclo su samples punti, normalizzato a media 0 e ampiezza 1"""
+    x = np.linspace(0.0, 1.0, len(segment))
+    resampled = np.interp(np.linspace(0.0, 1.0, samples), x, segment)
+    resampled = resampled - resampled.mean()
+    amplitude = np.ptp(resampled)
+    return resampled / amplitude if amplitude > 0 else resampled
+
+
+def select_gait_cycles(image_landmarks: np.ndarray, fps: float, n_cycles: int = 1) -> Optional[Dict]:
+    """
+    Sceglie i cicli più rappresentativi del video
+
+    Tra tutte le sequenze di n_cycles falcate consecutive sceglie quella con
+    durata più vicina alla mediana, forma più simile al ciclo medio e meno frame
+    senza pose.
+
+    Args:
+        image_landmarks: Array (n_frame, 33, 3) di PoseEngine.process_video,
+            oppure il segnale (n_frame,) di raw_ankle_height
+        fps: FPS del video
+        n_cycles: Numero di falcate consecutive da tenere
+
+    Returns:
+        Dizionario con 'start', 'end' (escluso), 'length', 'n_cycles',
+        'stride_frames' (durata mediana di una falcata) e 'ankle_height'
+        (segnale del tratto scelto), o None se le falcate non sono rilevabili
+    """
+    image_landmarks = np.asarray(image_landmarks, dtype=np.float64)
+    height = ankle_height_signal(image_landmarks)
+    peaks = stride_peaks(height, fps)
+    if len(peaks) < n_cycles + 1:
+        logger.warning(f"⚠ Falcate insufficienti per il loop Ghost Vision: {max(len(peaks) - 1, 0)} rilevate")
+        return None
+
+    missing = np.isnan(image_landmarks if image_landmarks.ndim == 1 else image_landmarks[:, LEFT_ANKLE, 1])
+    durations = np.diff(peaks)
+    median_duration = float(np.median(durations))
+    template = np.median([resample_cycle(height[a:b + 1]) for a, b in zip(peaks[:-1], peaks[1:])], axis=0)
+
+    best: Optional[Tuple[float, int]] = None
+    for i in range(len(peaks) - n_cycles):
+        start, end = int(peaks[i]), int(peaks[i + n_cycles])
+        duration_error = float(np.abs(durations[i:i + n_cycles] - median_duration).max()) / median_duration
+        shape_error = float(np.mean([
+            np.sqrt(np.mean((resample_cycle(height[a:b + 1]) - template) ** 2))
+            for a, b in zip(peaks[i:i + n_cycles], peaks[i + 1:i + n_cycles + 1])
+        ]))
+        missing_fraction = float(missing[start:end].mean())
+        score = duration_error + shape_error + missing_fraction
+        if best is None or score < best[0]:
+            best = (score, i)
+
+    i = best[1]
+    start, end = int(peaks[i]), int(peaks[i + n_cycles])
+    logger.info(f"🔁 Ciclo Ghost Vision: frame {start}-{end - 1} ({n_cycles} falcate, "
+                f"{(end - start) / fps:.2f}s, punteggio {best[0]:.3f})")
+    return {
+        'start': start,
+        'end': end,
+        'length': end - start,
+        'n_cycles': n_cycles,
+        'stride_frames': median_duration,
+        'ankle_height': height[start:end].tolist()
+    }
+
+
+
+def _circular_lag(a: np.ndarray, b: np.ndarray) -> int:
+    """Spostamento k (in campioni) che massimizza la correlazione circolare a[i] ~ b[i - k]"""
+    spectrum = np.fft.rfft(a) * np.conj(np.fft.rfft(b))
+    return int(np.argmax(np.fft.irfft(spectrum, n=len(a))))
+
+
+def _periodic_template(segment: np.ndarray, samples: int = CYCLE_SAMPLES) -> np.ndarray:
+    """Ciclo ricampionato su samples punti equispaziati in [0, 1) (per la correlazione circolare)"""
+    x = np.arange(len(segment)) / len(segment)
+    resampled = np.interp(np.arange(samples) / samples, x, segment, period=1.0)
+    resampled = resampled - resampled.mean()
+    amplitude = np.ptp(resampled)
+    return resampled / amplitude if amplitude > 0 else resampled
+
+
+def align_to_cycle(user_height: np.ndarray, user_fps: float, cycle: Dict, ghost_fps: float) -> np.ndarray:
+    """
+    Mappa ogni frame del video dell'utente sul frame del ciclo ghost nella stessa fase del passo
+
+    Con almeno due falcate rilevate ogni falcata dell'utente viene stirata
+    sull'intero ciclo (segue le variazioni di cadenza) e la fase viene
+    corretta con la correlazione circolare tra la falcata media dell'utente e
+    il ciclo ghost. Altrimenti il ciclo viene riprodotto alla sua velocità,
+    con lo sfasamento che massimizza la correlazione con il segnale dell'utente.
+
+    Args:
+        user_height: Segnale della caviglia dell'utente (ankle_height_signal)
+        user_fps: FPS del video dell'utente
+        cycle: Ciclo da select_gait_cycles (meta 'cycle' dell'archivio ghost)
+        ghost_fps: FPS del video baseline
+
+    Returns:
+        Array int32 (n_frame_utente,) con il numero di frame ghost per ogni frame
+    """
+    n = len(user_height)
+    length = cycle['length']
+    ghost_template = _periodic_template(np.asarray(cycle['ankle_height'], dtype=np.float64))
+    peaks = stride_peaks(user_height, user_fps)
+
+    if len(peaks) >= 2:
+        phase = np.empty(n, dtype=np.float64)
+        for a, b in zip(peaks[:-1], peaks[1:]):
+            phase[a:b] = np.arange(b - a) / (b - a)
+        # Prima della prima e dopo l'ultima falcata: durata mediana
+        stride = float(np.median(np.diff(peaks)))
+        phase[:peaks[0]] = (np.arange(peaks[0]) - peaks[0]) / stride
+        phase[peaks[-1]:] = np.arange(n - peaks[-1]) / stride
+
+        user_template = np.mean([_periodic_template(user_height[a:b]) for a, b in zip(peaks[:-1], peaks[1:])],
+                                axis=0)
+        lag = _circular_lag(user_template, ghost_template)
+        phase = phase - lag / CYCLE_SAMPLES
+    else:
+        # Ciclo alla sua durata reale, espressa in frame dell'utente
+        period = length / ghost_fps * user_fps
+        phase = np.arange(n) / period
+        user = user_height - user_height.mean()
+        if n >= 2 and np.ptp(user) > 0:
+            # Sfasamento con la massima correlazione tra segnale utente e ciclo ripetuto
+            offsets = np.linspace(0.0, 1.0, CYCLE_SAMPLES, endpoint=False)
+            scores = [np.dot(user, np.interp((phase + o) % 1.0, np.arange(CYCLE_SAMPLES) / CYCLE_SAMPLES,
+                                             ghost_template, period=1.0))
+                      for o in offsets]
+            phase = phase + offsets[int(np.argmax(scores))]
+
+    frames = np.floor((phase % 1.0) * length).astype(np.int32)
+    return cycle['start'] + np.minimum(frames, length - 1)
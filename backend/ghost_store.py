@@ -0,0 +1,463 @@
+"""
+Archivio dei frame Ghost Vision
+
+Invece di un PNG per frame (ghost_frame_000123.png), le silhouette sono salvate
+in un unico file indicizzato (ghost_frames.pack):
+
+    MAGIC | payload frame 0 | payload frame 1 | ... | indice | meta JSON | footer
+
+- payload: dipende da meta['format']
+    'png':     immagine del frame (PNG RGBA, la stessa che prima finiva su disco)
+    'contour': poligono semplificato della silhouette, coppie (x, y) int16
+               little-endian in pixel (vuoto = nessuna silhouette); il PNG
+               viene disegnato solo su richiesta (render_contour_png)
+- indice: righe int64 little-endian (frame_number, offset, lunghezza), ordinate
+- footer: offset dell'indice, numero di righe, lunghezza del meta JSON, MAGIC
+
+Un frame si legge con una sola pread; il file intero o un intervallo di frame
+si servono con una richiesta HTTP Range. Le risposte che contengono più frame
+(/api/ghost_frames) usano lo stesso formato, costruito in memoria (pack_frames). Le cartelle con i vecchi PNG singoli
+restano leggibili (vedi GhostFrameStore).
+
+L'indice nel footer è anche l'indice persistente dei frame disponibili:
+GhostFrameStore lo carica una volta e lo tiene in memoria finché l'archivio
+non cambia, così numero di frame e disponibilità di un frame costano solo la
+stat dell'archivio e della cartella. Il confronto usa la firma dei file
+(inode, mtime, dimensione, vedi baseline_cache.file_signature): anche gli altri
+processi del server vedono subito i frame rigenerati.
+"""
+import glob
+import json
+import logging
+import os
+import re
+import struct
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from baseline_cache import file_signature
+
+logger = logging.getLogger('GHOST_STORE')
+
+PACK_FILENAME = 'ghost_frames.pack'
+PACK_MAGIC = b'GHOSTPK1'
+PACK_VERSION = 1
+
+# index_offset, n_frames, meta_length, magic
+_FOOTER = struct.Struct('<QQQ8s')
+
+LEGACY_FRAME_PATTERN = re.compile(r'^ghost_frame_(\d+)\.png$')
+
+# Generazione corrente dei frame di ogni cartella: incrementata quando i frame
+# cambiano nel processo (anche con firme dei file invariate, es. mtime con
+# risoluzione grossolana); gli altri processi se ne accorgono dalle firme
+_folder_generations: Dict[str, int] = {}
+_generations_lock = threading.Lock()
+
+
+def invalidate_folder(folder: str):
+    """Segnala che i frame ghost di una cartella sono stati rigenerati o rimossi"""
+    key = os.path.abspath(folder)
+    with _generations_lock:
+        _folder_generations[key] = _folder_generations.get(key, 0) + 1
+
+
+def legacy_frame_filename(frame_number: int) -> str:
+    """Nome del PNG singolo di un frame (formato precedente all'archivio)"""
+    return f"ghost_frame_{frame_number:06d}.png"
+
+
+def parse_frame_filename(filename: str) -> Optional[int]:
+    """Numero di frame da 'ghost_frame_000123.png', o None"""
+    match = LEGACY_FRAME_PATTERN.match(filename)
+    return int(match.group(1)) if match else None
+
+
+def encode_contour(points: np.ndarray) -> bytes:
+    """Poligono (k, 2) in pixel -> payload int16 little-endian"""
+    return np.asarray(points, dtype='<i2').reshape(-1, 2).tobytes()
+
+
+def decode_contour(payload: bytes) -> np.ndarray:
+    """Payload int16 little-endian -> poligono (k, 2) int32"""
+    return np.frombuffer(payload, dtype='<i2').reshape(-1, 2).astype(np.int32)
+
+
+def render_contour_png(points: np.ndarray, width: int, height: int,
+                       color: Tuple[int, int, int]) -> bytes:
+    """
+    Disegna la silhouette di un poligono come PNG RGBA (stesso aspetto dei frame PNG)
+
+    Args:
+        points: Poligono (k, 2) in pixel
+        width, height: Dimensioni del frame
+        color: Colore BGR della silhouette
+
+    Returns:
+        PNG codificato
+    """
+    ghost_img = np.zeros((height, width, 4), dtype=np.uint8)
+    if len(points) >= 3:
+        contour = points.reshape(-1, 1, 2)
+        cv2.drawContours(ghost_img, [contour], -1, (*color, 0), -1)
+        cv2.drawContours(ghost_img, [contour], -1, (*color, 0), 3)
+        # Opacità solo dentro la silhouette
+        alpha = np.zeros((height, width), dtype=np.uint8)
+        cv2.drawContours(alpha, [contour], -1, 255, -1)
+        ghost_img[:, :, 3] = alpha
+    ok, encoded = cv2.imencode('.png', ghost_img)
+    if not ok:
+        raise ValueError("Codifica PNG fallita")
+    return encoded.tobytes()
+
+
+def _pack_tail(index: np.ndarray, meta: Optional[Dict], index_offset: int) -> bytes:
+    """Indice, meta JSON e footer di un archivio"""
+    meta_bytes = json.dumps(dict(meta or {}, version=PACK_VERSION)).encode('utf-8')
+    return b''.join((index.tobytes(), meta_bytes,
+                     _FOOTER.pack(index_offset, len(index), len(meta_bytes), PACK_MAGIC)))
+
+
+def pack_frames(frames: List[Tuple[int, bytes]], meta: Optional[Dict] = None) -> bytes:
+    """
+    Archivio in memoria con i frame dati (stesso formato di ghost_frames.pack)
+
+    Args:
+        frames: Coppie (frame_number, payload) in ordine crescente
+        meta: Metadati da includere
+
+    Returns:
+        Archivio completo
+    """
+    parts = [PACK_MAGIC]
+    index = np.empty((len(frames), 3), dtype='<i8')
+    offset = len(PACK_MAGIC)
+    for i, (frame_number, payload) in enumerate(frames):
+        index[i] = (frame_number, offset, len(payload))
+        parts.append(payload)
+        offset += len(payload)
+    parts.append(_pack_tail(index, meta, offset))
+    return b''.join(parts)
+
+
+class GhostPackWriter:
+    """
+    Scrive un archivio di frame ghost
+
+    I dati vanno su un file temporaneo che sostituisce l'archivio esistente solo
+    in close(): chi legge vede sempre un archivio completo.
+    """
+
+    def __init__(self, pack_path: str):
+        self.pack_path = pack_path
+        self._tmp_path = f"{pack_path}.tmp"
+        self._file = open(self._tmp_path, 'wb')
+        self._file.write(PACK_MAGIC)
+        self._offset = len(PACK_MAGIC)
+        self._index: List[Tuple[int, int, int]] = []
+
+    def add(self, frame_number: int, payload: bytes):
+        """Aggiunge un frame (i frame vanno aggiunti in ordine crescente)"""
+        self._file.write(payload)
+        self._index.append((frame_number, self._offset, len(payload)))
+        self._offset += len(payload)
+
+    def close(self, meta: Optional[Dict] = None) -> str:
+        """
+        Scrive indice e footer e pubblica l'archivio
+
+        Args:
+            meta: Metadati del video sorgente (fps, dimensioni, ...)
+
+        Returns:
+            Percorso dell'archivio
+        """
+        index = np.array(self._index, dtype='<i8').reshape(-1, 3)
+        index = index[np.argsort(index[:, 0], kind='stable')]
+
+        self._file.write(_pack_tail(index, meta, self._offset))
+        self._file.close()
+        os.replace(self._tmp_path, self.pack_path)
+        invalidate_folder(os.path.dirname(self.pack_path))
+        return self.pack_path
+
+    def abort(self):
+        """Scarta l'archivio in scrittura"""
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+class GhostPack:
+    """
+    Lettura di un archivio di frame ghost (indice caricato all'apertura)
+
+    Il file resta aperto per tutta la vita dell'oggetto: ogni lettura è una
+    sola pread. Se l'archivio viene sostituito, l'oggetto continua a leggere
+    la versione da cui ha caricato l'indice.
+    """
+
+    def __init__(self, pack_path: str):
+        self.pack_path = pack_path
+        # Un solo descrittore per footer, indice, etag e letture: se l'archivio
+        # viene sostituito nel frattempo si resta sulla versione aperta
+        fd = os.open(pack_path, os.O_RDONLY)
+        try:
+            stat = os.fstat(fd)
+            size = stat.st_size
+            if size < len(PACK_MAGIC) + _FOOTER.size:
+                raise ValueError(f"Archivio ghost troppo corto: {pack_path}")
+            index_offset, n_frames, meta_length, magic = _FOOTER.unpack(
+                os.pread(fd, _FOOTER.size, size - _FOOTER.size))
+            if magic != PACK_MAGIC:
+                raise ValueError(f"Archivio ghost non valido: {pack_path}")
+            tail = os.pread(fd, n_frames * 24 + meta_length, index_offset)
+            index = np.frombuffer(tail[:n_frames * 24], dtype='<i8').reshape(-1, 3)
+            self.meta = json.loads(tail[n_frames * 24:].decode('utf-8'))
+        except Exception:
+            os.close(fd)
+            raise
+
+        self.etag = f"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"
+        self.index = index
+        self.frame_numbers = index[:, 0]
+        self._positions = {int(n): i for i, n in enumerate(self.frame_numbers)}
+        self._fd = fd
+
+    def __del__(self):
+        fd = getattr(self, '_fd', None)
+        if fd is not None:
+            os.close(fd)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def format(self) -> str:
+        return self.meta.get('format', 'png')
+
+    @property
+    def cycle(self) -> Optional[Dict]:
+        """Ciclo del passo riprodotto in loop (vedi gait_cycle), o None se l'archivio copre tutto il video"""
+        return self.meta.get('cycle')
+
+    def has(self, frame_number: int) -> bool:
+        return frame_number in self._positions
+
+    def resolve(self, frame_number: int) -> Optional[int]:
+        """
+        Frame dell'archivio da mostrare per un frame del video
+
+        Con un ciclo in loop ogni frame corrisponde al frame del ciclo nella
+        stessa posizione modulo la sua durata.
+        """
+        cycle = self.cycle
+        if cycle is not None and frame_number >= 0:
+            frame_number = cycle['start'] + (frame_number - cycle['start']) % cycle['length']
+        return frame_number if frame_number in self._positions else None
+
+    def byte_range(self, frame_number: int) -> Optional[Tuple[int, int]]:
+        """(offset, lunghezza) del frame nell'archivio, o None se assente"""
+        position = self._positions.get(frame_number)
+        if position is None:
+            return None
+        _, offset, length = self.index[position]
+        return int(offset), int(length)
+
+    def read(self, frame_number: int) -> Optional[bytes]:
+        """Payload del frame, o None se assente"""
+        byte_range = self.byte_range(frame_number)
+        if byte_range is None:
+            return None
+        offset, length = byte_range
+        return os.pread(self._fd, length, offset)
+
+    def read_many(self, frame_numbers: List[int]) -> List[Tuple[int, bytes]]:
+        """
+        Payload di più frame (quelli assenti vengono saltati)
+
+        I frame adiacenti nell'archivio sono letti con una sola pread: un
+        intervallo contiguo di frame costa una lettura.
+
+        Returns:
+            Coppie (frame_number, payload) in ordine crescente
+        """
+        positions = sorted({self._positions[n] for n in frame_numbers if n in self._positions})
+        if not positions:
+            return []
+
+        frames = []
+        start = 0
+        while start < len(positions):
+            end = start
+            while end + 1 < len(positions) and positions[end + 1] == positions[end] + 1:
+                end += 1
+            rows = self.index[positions[start]:positions[end] + 1]
+            base = int(rows[0, 1])
+            block = os.pread(self._fd, int(rows[-1, 1] + rows[-1, 2]) - base, base)
+            for frame_number, offset, length in rows.tolist():
+                frames.append((frame_number, block[offset - base:offset - base + length]))
+            start = end + 1
+        return frames
+
+    def read_contour(self, frame_number: int) -> Optional[np.ndarray]:
+        """Poligono (k, 2) del frame (solo formato 'contour'), o None se assente"""
+        payload = self.read(frame_number)
+        return decode_contour(payload) if payload is not None else None
+
+    def render_png(self, frame_number: int) -> Optional[bytes]:
+        """PNG RGBA del frame, disegnato dal poligono nel formato 'contour'"""
+        if self.format != 'contour':
+            return self.read(frame_number)
+        points = self.read_contour(frame_number)
+        if points is None:
+            return None
+        color = tuple(self.meta.get('color', (0, 255, 255)))
+        return render_contour_png(points, self.meta['video_width'], self.meta['video_height'], color)
+
+
+class GhostFrameStore:
+    """
+    Accesso ai frame ghost di una cartella
+
+    Usa l'archivio se presente, altrimenti i PNG singoli delle baseline
+    create prima dell'introduzione dell'archivio. L'indice (archivio aperto o
+    insieme dei PNG singoli) viene caricato alla prima richiesta e ricaricato
+    quando cambia la firma dell'archivio o della cartella, o dopo invalidate_folder.
+    """
+
+    def __init__(self, folder: str, png_cache_size: int = 256):
+        """
+        Args:
+            folder: Cartella dei frame ghost
+            png_cache_size: PNG disegnati dai poligoni tenuti in memoria (formato 'contour')
+        """
+        self.folder = folder
+        self.png_cache_size = png_cache_size
+        self._key = os.path.abspath(folder)
+        self._version: Optional[Tuple] = None
+        self._pack: Optional[GhostPack] = None
+        self._legacy_numbers: frozenset = frozenset()
+        self._index_lock = threading.Lock()
+        self._png_cache: 'OrderedDict[Tuple[str, int], bytes]' = OrderedDict()
+        self._png_lock = threading.Lock()
+
+    @property
+    def pack_path(self) -> str:
+        return os.path.join(self.folder, PACK_FILENAME)
+
+    def _current_version(self) -> Tuple:
+        """Generazione del processo e firme di archivio e cartella (i PNG singoli cambiano la cartella)"""
+        return (_folder_generations.get(self._key, 0), file_signature(self.pack_path),
+                file_signature(self.folder))
+
+    def _load_index(self):
+        """Ricarica l'indice se i frame della cartella sono cambiati"""
+        version = self._current_version()
+        if version == self._version:
+            return
+        with self._index_lock:
+            if version == self._version:
+                return
+            try:
+                pack = GhostPack(self.pack_path) if version[1] is not None else None
+            except FileNotFoundError:
+                # Rimosso dopo la stat: la prossima richiesta vede la nuova firma
+                pack = None
+            legacy_numbers = frozenset(self.legacy_frame_numbers()) if pack is None else frozenset()
+            self._pack, self._legacy_numbers = pack, legacy_numbers
+            self._version = version
+            n_frames = len(pack) if pack is not None else len(legacy_numbers)
+            logger.info(f"👻 Indice ghost frames caricato: {n_frames} frame "
+                        f"({'archivio' if pack is not None else 'PNG singoli'})")
+
+    def invalidate(self):
+        """Forza il ricaricamento dell'indice alla prossima richiesta"""
+        invalidate_folder(self.folder)
+
+    def open_pack(self) -> Optional[GhostPack]:
+        """Archivio della cartella (in memoria), o None se non presente"""
+        self._load_index()
+        return self._pack
+
+    def frame_png(self, pack: GhostPack, frame_number: int) -> Optional[bytes]:
+        """
+        PNG di un frame dell'archivio
+
+        Nel formato 'contour' il PNG è disegnato alla prima richiesta e tenuto in
+        una piccola cache LRU (la chiave include l'etag: un archivio rigenerato
+        non riusa i PNG vecchi).
+        """
+        if pack.format != 'contour':
+            return pack.read(frame_number)
+        key = (pack.etag, frame_number)
+        with self._png_lock:
+            png = self._png_cache.get(key)
+            if png is not None:
+                self._png_cache.move_to_end(key)
+                return png
+        png = pack.render_png(frame_number)
+        if png is not None and self.png_cache_size > 0:
+            with self._png_lock:
+                self._png_cache[key] = png
+                while len(self._png_cache) > self.png_cache_size:
+                    self._png_cache.popitem(last=False)
+        return png
+
+    def legacy_frame_path(self, frame_number: int) -> str:
+        return os.path.join(self.folder, legacy_frame_filename(frame_number))
+
+    def legacy_frame_numbers(self) -> List[int]:
+        numbers = []
+        for path in glob.glob(os.path.join(self.folder, 'ghost_frame_*.png')):
+            frame_number = parse_frame_filename(os.path.basename(path))
+            if frame_number is not None:
+                numbers.append(frame_number)
+        return sorted(numbers)
+
+    def frame_count(self) -> int:
+        """Numero di frame ghost disponibili"""
+        pack = self.open_pack()
+        if pack is not None:
+            return len(pack)
+        return len(self._legacy_numbers)
+
+    def has_frame(self, frame_number: int) -> bool:
+        pack = self.open_pack()
+        if pack is not None:
+            return pack.has(frame_number)
+        return frame_number in self._legacy_numbers
+
+    def resolve_frame(self, frame_number: int) -> Optional[int]:
+        """Frame ghost da mostrare per un frame del video (vedi GhostPack.resolve), o None"""
+        pack = self.open_pack()
+        if pack is not None:
+            return pack.resolve(frame_number)
+        return frame_number if frame_number in self._legacy_numbers else None
+
+    def remove_legacy_frames(self) -> int:
+        """Rimuove i PNG singoli (superati dall'archivio); restituisce quanti"""
+        paths = glob.glob(os.path.join(self.folder, 'ghost_frame_*.png'))
+        for path in paths:
+            os.remove(path)
+        if paths:
+            self.invalidate()
+        return len(paths)
+
+    def clear(self) -> int:
+        """
+        Rimuove archivio e PNG singoli (frame di una baseline superata)
+
+        Returns:
+            Numero di frame rimossi
+        """
+        n_frames = self.frame_count()
+        if os.path.exists(self.pack_path):
+            os.remove(self.pack_path)
+        self.remove_legacy_frames()
+        self.invalidate()
+        return n_frames
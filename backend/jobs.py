@@ -0,0 +1,186 @@
+"""
+Gestione dei job in background (thread di lavoro con stato interrogabile via API)
+"""
+import logging
+import os
+import sys
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor, Future
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger('JOBS')
+
+# Tutti i JobManager creati, per cercare un job dal solo ID (vedi get_job)
+_MANAGERS: List['JobManager'] = []
+
+
+def _lower_thread_priority():
+    """
+    Abbassa la priorità del thread corrente (best effort)
+
+    Su Linux ogni thread è un task con la propria niceness, quindi setpriority
+    sul native id riguarda solo questo thread. Su altri sistemi non fa nulla.
+    """
+    if not sys.platform.startswith('linux'):
+        return
+    try:
+        tid = threading.get_native_id()
+        current = os.getpriority(os.PRIO_PROCESS, tid)
+        os.setpriority(os.PRIO_PROCESS, tid, min(current + 10, 19))
+    except (AttributeError, OSError) as e:
+        logger.debug(f"⚠ Impossibile abbassare la priorità del thread: {e}")
+
+
+class Job:
+    """Handle passato alla funzione del job per aggiornarne progresso e messaggio"""
+
+    def __init__(self, manager: 'JobManager', job_id: str):
+        self._manager = manager
+        self.id = job_id
+
+    def update(self, progress: Optional[float] = None, message: Optional[str] = None, **extra):
+        """
+        Aggiorna lo stato del job
+
+        Args:
+            progress: Avanzamento tra 0 e 1
+            message: Messaggio leggibile sullo stato corrente
+            extra: Campi aggiuntivi da esporre nello stato del job
+        """
+        fields = dict(extra)
+        if progress is not None:
+            fields['progress'] = max(0.0, min(1.0, float(progress)))
+        if message is not None:
+            fields['message'] = message
+        self._manager._update(self.id, **fields)
+
+
+class JobManager:
+    """
+    Coda di job eseguiti su un pool di thread limitato
+
+    Ogni job ha uno stato ('queued', 'running', 'done', 'error') consultabile
+    con get() anche dopo il completamento (vengono tenuti gli ultimi max_finished).
+    """
+
+    def __init__(self, name: str, max_workers: int = 1, low_priority: bool = False,
+                 max_finished: int = 100):
+        """
+        Inizializza il JobManager
+
+        Args:
+            name: Nome della coda (usato nei log e nei nomi dei thread)
+            max_workers: Numero massimo di job eseguiti in parallelo
+            low_priority: Se True, i thread di lavoro girano a priorità ridotta
+            max_finished: Numero di job completati da mantenere in memoria
+        """
+        self.name = name
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=f"job-{name}",
+            initializer=_lower_thread_priority if low_priority else None
+        )
+        self._jobs: Dict[str, Dict] = {}
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        _MANAGERS.append(self)
+
+    def submit(self, kind: str, fn: Callable, *args, **kwargs) -> str:
+        """
+        Accoda un job
+
+        Args:
+            kind: Tipo di job (es. 'cache_recompute')
+            fn: Funzione da eseguire, riceve un Job come primo argomento
+            args, kwargs: Argomenti aggiuntivi per fn
+
+        Returns:
+            ID del job
+        """
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._jobs[job_id] = {
+                'id': job_id,
+                'kind': kind,
+                'queue': self.name,
+                'status': 'queued',
+                'progress': 0.0,
+                'message': None,
+                'result': None,
+                'error': None,
+                'created_at': datetime.now().isoformat(),
+                'started_at': None,
+                'finished_at': None
+            }
+            self._futures[job_id] = self._executor.submit(self._run, job_id, fn, args, kwargs)
+        logger.info(f"📋 Job accodato [{self.name}]: {kind} ({job_id})")
+        return job_id
+
+    def _run(self, job_id: str, fn: Callable, args, kwargs):
+        self._update(job_id, status='running', started_at=datetime.now().isoformat())
+        try:
+            result = fn(Job(self, job_id), *args, **kwargs)
+            self._update(job_id, status='done', progress=1.0, result=result,
+                         finished_at=datetime.now().isoformat())
+            logger.info(f"✅ Job completato [{self.name}]: {job_id}")
+            return result
+        except Exception as e:
+            logger.error(f"❌ Job fallito [{self.name}] {job_id}: {type(e).__name__}: {e}")
+            logger.debug(traceback.format_exc())
+            self._update(job_id, status='error', error=f"{type(e).__name__}: {e}",
+                         finished_at=datetime.now().isoformat())
+            raise
+        finally:
+            self._prune()
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def _prune(self):
+        """Rimuove i job completati più vecchi oltre max_finished"""
+        with self._lock:
+            finished = [j for j in self._jobs.values() if j['status'] in ('done', 'error')]
+            excess = len(finished) - self.max_finished
+            if excess > 0:
+                finished.sort(key=lambda j: j['finished_at'] or '')
+                for job in finished[:excess]:
+                    self._jobs.pop(job['id'], None)
+                    self._futures.pop(job['id'], None)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Restituisce una copia dello stato del job (o None se sconosciuto)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def future(self, job_id: str) -> Optional[Future]:
+        """Restituisce il Future del job, per chi deve attenderne la fine"""
+        with self._lock:
+            return self._futures.get(job_id)
+
+    def list(self, kind: Optional[str] = None) -> List[Dict]:
+        """Elenca i job (opzionalmente filtrati per tipo), dal più recente"""
+        with self._lock:
+            jobs = [dict(j) for j in self._jobs.values() if kind is None or j['kind'] == kind]
+        return sorted(jobs, key=lambda j: j['created_at'], reverse=True)
+
+    def is_active(self, kind: str) -> bool:
+        """True se un job del tipo indicato è in coda o in esecuzione"""
+        with self._lock:
+            return any(j['kind'] == kind and j['status'] in ('queued', 'running')
+                       for j in self._jobs.values())
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    """Cerca un job in tutti i JobManager"""
+    for manager in _MANAGERS:
+        job = manager.get(job_id)
+        if job is not None:
+            return job
+    return None
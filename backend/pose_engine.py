@@ -12,9 +12,20 @@ import hashlib
 import pickle
 import warnings
 import sys
+import time
+import glob
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import contextmanager
 from typing import Dict, List, Tuple, Optional
 
+from cache_stats import cache_stats, view_type_from_cache_path
+from skeleton_renderer import SkeletonRenderer
+from silhouette import SilhouetteExtractor
+from video_encoder import open_video_writer, open_hls_writer, release_writer
+from running_stats import BaselineAccumulator, DEFAULT_TRIM_FRACTION, robust_center
+from ghost_store import GhostPackWriter, GhostFrameStore, PACK_FILENAME, legacy_frame_filename, encode_contour
+
 logger = logging.getLogger('POSE_ENGINE')
 
 # Sopprimi warning di MediaPipe timestamp mismatch (sono solo warning, non errori fatali)
@@ -42,6 +53,19 @@ class PoseEngine:
     # Directory per cache
     CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache', 'pose_engine')
     
+    # Memo condiviso delle impronte dei video: (path, size, mtime_ns) -> md5
+    _fingerprint_memo: Dict[Tuple[str, int, int], str] = {}
+    
+    # Versioni del codice che produce i risultati in cache (fanno parte della chiave)
+    # LANDMARKS_VERSION: estrazione dei landmark (uso/parametri di MediaPipe).
+    #   Se cambia, le voci in cache vanno rielaborate dal video sorgente.
+    # METRICS_VERSION: calcolo delle metriche dai landmark (_get_knee_valgus, GCT, cadenza...).
+    #   Se cambia, le voci vengono ricalcolate dai landmark salvati in cache.
+    # Incrementare la versione corrispondente a ogni modifica dei calcoli.
+    # (v2: salvati anche i landmark 2D normalizzati per il rendering differito dello scheletro)
+    LANDMARKS_VERSION = 2
+    METRICS_VERSION = 2
+    
     # Indici dei landmark MediaPipe
     LEFT_SHOULDER = 11
     RIGHT_SHOULDER = 12
@@ -109,6 +133,8 @@ class PoseEngine:
         self.use_cache = use_cache
         self.generate_skeleton_video = generate_skeleton_video
         self.enable_segmentation = enable_segmentation
+        self._skeleton_renderer = None
+        self._silhouette_extractor = None
         
         # Crea directory cache se non esiste
         if self.use_cache:
@@ -118,6 +144,8 @@ class PoseEngine:
         """
         Disegna lo scheletro sul frame usando i landmark MediaPipe
         
+        Il frame viene modificato sul posto (vedi SkeletonRenderer).
+        
         Args:
             frame: Frame del video (BGR)
             landmarks: Landmark MediaPipe (pose_landmarks)
@@ -128,41 +156,108 @@ class PoseEngine:
         if not landmarks or not landmarks.landmark:
             return frame
         
-        frame_copy = frame.copy()
-        h, w = frame_copy.shape[:2]
-        
-        # Colori (BGR per OpenCV)
-        skeleton_color = (0, 255, 0)  # Verde per le connessioni
-        landmark_color = (0, 0, 255)  # Rosso per i landmark
-        landmark_radius = 4
-        connection_thickness = 2
-        
-        # Converti landmark in coordinate pixel
-        landmark_points = []
-        for landmark in landmarks.landmark:
-            # Verifica visibilità (visibility > 0.5)
-            if landmark.visibility > 0.5:
-                x = int(landmark.x * w)
-                y = int(landmark.y * h)
-                landmark_points.append((x, y, True))
-            else:
-                landmark_points.append((None, None, False))
-        
-        # Disegna le connessioni (ossa)
-        for connection in self.POSE_CONNECTIONS:
-            start_idx, end_idx = connection
-            if (start_idx < len(landmark_points) and end_idx < len(landmark_points) and
-                landmark_points[start_idx][2] and landmark_points[end_idx][2]):
-                start_point = (landmark_points[start_idx][0], landmark_points[start_idx][1])
-                end_point = (landmark_points[end_idx][0], landmark_points[end_idx][1])
-                cv2.line(frame_copy, start_point, end_point, skeleton_color, connection_thickness)
-        
-        # Disegna i landmark (giunti) - solo quelli visibili
-        for point_data in landmark_points:
-            if point_data[2]:  # Se visibile
-                cv2.circle(frame_copy, (point_data[0], point_data[1]), landmark_radius, landmark_color, -1)
-        
-        return frame_copy
+        if self._skeleton_renderer is None:
+            self._skeleton_renderer = SkeletonRenderer(self.POSE_CONNECTIONS)
+        return self._skeleton_renderer.render(frame, SkeletonRenderer.landmarks_to_array(landmarks))
+    
+    @staticmethod
+    def skeleton_video_filename(video_path: str) -> str:
+        """
+        Nome del file del video con scheletro per un video sorgente
+        
+        Il nome viene sanitizzato per evitare problemi con caratteri speciali nell'URL.
+        
+        Args:
+            video_path: Percorso del video sorgente
+            
+        Returns:
+            Nome file '<nome_sanitizzato>_skeleton.mp4'
+        """
+        video_basename = os.path.splitext(os.path.basename(video_path))[0]
+        # Sostituisce caratteri problematici con underscore
+        import re
+        safe_basename = re.sub(r'[^\w\-_\.]', '_', video_basename)
+        # Rimuove punti multipli consecutivi
+        safe_basename = re.sub(r'\.+', '.', safe_basename)
+        # Se il nome è vuoto dopo la sanitizzazione, usa un nome generico
+        if not safe_basename or safe_basename == '_':
+            safe_basename = hashlib.md5(video_path.encode()).hexdigest()[:8]
+        return f"{safe_basename}_skeleton.mp4"
+    
+    @staticmethod
+    def open_skeleton_writer(output_path: str, fps: float, frame_size: Tuple[int, int],
+                             encoder: Optional[str] = None):
+        """
+        Apre il writer per il video con scheletro (vedi video_encoder)
+        
+        Usa ffmpeg H.264 in un processo separato se disponibile, altrimenti
+        cv2.VideoWriter provando diversi codec.
+        
+        Args:
+            output_path: Percorso del file di output
+            fps: FPS del video
+            frame_size: (larghezza, altezza) dei frame
+            encoder: Encoder da usare (default: Config.SKELETON_VIDEO_ENCODER);
+                'opencv' per ripiegare su cv2.VideoWriter dopo un errore di ffmpeg
+            
+        Returns:
+            Writer aperto (interfaccia di cv2.VideoWriter), o None se nessun encoder è disponibile
+        """
+        from config import Config
+        return open_video_writer(output_path, fps, frame_size,
+                                 encoder=encoder or Config.SKELETON_VIDEO_ENCODER,
+                                 preset=Config.SKELETON_VIDEO_PRESET,
+                                 ffmpeg_binary=Config.FFMPEG_BINARY)
+    
+    def _reencode_skeleton_video_opencv(self, video_path: str, output_path: str, fps: float,
+                                        frame_size: Tuple[int, int], renderer: SkeletonRenderer,
+                                        points_series: np.ndarray) -> Optional[str]:
+        """
+        Ricodifica il video con scheletro con cv2.VideoWriter dopo un errore di ffmpeg
+        
+        I frame vengono riletti dal video sorgente e lo scheletro ridisegnato dai
+        landmark già estratti (MediaPipe non viene rieseguito).
+        
+        Returns:
+            output_path se il video è stato scritto, None altrimenti
+        """
+        logger.warning(f"⚠ Codifica ffmpeg fallita, ricodifica con cv2.VideoWriter: {os.path.basename(output_path)}")
+        writer = self.open_skeleton_writer(output_path, fps, frame_size, encoder='opencv')
+        if writer is None:
+            logger.error(f"❌ Nessun codec OpenCV disponibile, video con scheletro non generato")
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            return None
+        try:
+            renderer.render_video(video_path, writer, points_series)
+        except Exception as e:
+            logger.error(f"❌ Ricodifica del video con scheletro fallita: {type(e).__name__}: {e}")
+            writer.release()
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            return None
+        writer.release()
+        return output_path
+    
+    def _silhouette(self) -> SilhouetteExtractor:
+        """Estrattore della silhouette Ghost Vision (creato al primo uso con i parametri di Config)"""
+        if self._silhouette_extractor is None:
+            from config import Config
+            self._silhouette_extractor = SilhouetteExtractor(scale=Config.GHOST_SILHOUETTE_SCALE,
+                                                             morphology=Config.GHOST_SILHOUETTE_MORPHOLOGY)
+        return self._silhouette_extractor
+    
+    def _extract_ghost_contour(self, segmentation_mask: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Estrae il contorno della silhouette dalla segmentation mask (vedi SilhouetteExtractor)
+        
+        Args:
+            segmentation_mask: Mask di segmentazione da MediaPipe (valori 0-1)
+            
+        Returns:
+            Contorno più grande in pixel del video, o None se nessuna silhouette
+        """
+        return self._silhouette().contour(segmentation_mask)
     
     def _extract_ghost_silhouette(self, frame: np.ndarray, segmentation_mask: np.ndarray, 
                                    color: Tuple[int, int, int] = (0, 255, 255)) -> np.ndarray:
@@ -178,46 +273,42 @@ class PoseEngine:
             Immagine RGBA con silhouette colorata su sfondo trasparente
         """
         h, w = frame.shape[:2]
+        return self._silhouette().render(self._extract_ghost_contour(segmentation_mask), w, h, color)
+    
+    def _extract_ghost_polygon(self, segmentation_mask: np.ndarray, epsilon: float) -> np.ndarray:
+        """
+        Poligono semplificato della silhouette (formato 'contour' dell'archivio ghost)
         
-        # Converti la mask in formato uint8 (0-255)
-        mask_uint8 = (segmentation_mask * 255).astype(np.uint8)
-        
-        # Applica threshold per binarizzare la mask
-        _, binary_mask = cv2.threshold(mask_uint8, 127, 255, cv2.THRESH_BINARY)
-        
-        # Applica operazioni morfologiche per pulire la mask
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
-        binary_mask = cv2.morphologyEx(binary_mask, cv2.MORPH_CLOSE, kernel)
-        binary_mask = cv2.morphologyEx(binary_mask, cv2.MORPH_OPEN, kernel)
-        
-        # Trova i contorni della silhouette
-        contours, _ = cv2.findContours(binary_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Crea immagine RGBA (con canale alpha per trasparenza)
-        ghost_img = np.zeros((h, w, 4), dtype=np.uint8)
-        
-        if len(contours) > 0:
-            # Trova il contorno più grande (presumibilmente il corpo)
-            largest_contour = max(contours, key=cv2.contourArea)
-            
-            # Crea un'immagine BGR separata e contigua per disegnare i contorni
-            # Questo evita problemi con array non contigui
-            bgr_img = np.zeros((h, w, 3), dtype=np.uint8)
-            
-            # Disegna la silhouette piena con il colore specificato
-            cv2.drawContours(bgr_img, [largest_contour], -1, color, -1)
-            
-            # Disegna il contorno (bordo) più evidente
-            cv2.drawContours(bgr_img, [largest_contour], -1, color, 3)
-            
-            # Copia i canali BGR nell'immagine RGBA
-            ghost_img[:, :, :3] = bgr_img
+        Args:
+            segmentation_mask: Mask di segmentazione da MediaPipe (valori 0-1)
+            epsilon: Distanza massima in pixel tra poligono e contorno (cv2.approxPolyDP)
             
-            # Imposta il canale alpha (opacità)
-            # Usa la mask per impostare l'opacità: 0 = trasparente, 255 = opaco
-            ghost_img[:, :, 3] = binary_mask
+        Returns:
+            Array (k, 2) di punti in pixel (vuoto se nessuna silhouette)
+        """
+        # Semplificato sulla mask ridotta: meno punti da riportare a piena risoluzione
+        largest_contour = self._silhouette().contour(segmentation_mask, epsilon)
+        if largest_contour is None:
+            return np.zeros((0, 2), dtype=np.int32)
+        return largest_contour.reshape(-1, 2)
+    
+    def _encode_ghost_frame(self, frame: np.ndarray, segmentation_mask: np.ndarray, frame_format: str,
+                            ghost_color: Tuple[int, int, int], png_params: List[int],
+                            contour_epsilon: float) -> Optional[bytes]:
+        """
+        Payload di un frame ghost per l'archivio (eseguito sui worker di generate_ghost_frames)
         
-        return ghost_img
+        Returns:
+            Poligono codificato (formato 'contour') o PNG RGBA, None se la codifica fallisce
+        """
+        if frame_format == 'contour':
+            # Solo il poligono della silhouette: poche centinaia di byte per frame
+            return encode_contour(self._extract_ghost_polygon(segmentation_mask, contour_epsilon))
+        
+        # Estrai la silhouette ghost e codificala come PNG (supporta trasparenza)
+        ghost_img = self._extract_ghost_silhouette(frame, segmentation_mask, ghost_color)
+        ok, encoded = cv2.imencode('.png', ghost_img, png_params)
+        return encoded.tobytes() if ok else None
     
     def _get_angle_2d(self, a: np.ndarray, b: np.ndarray, c: np.ndarray) -> float:
         """
@@ -529,10 +620,49 @@ class PoseEngine:
         
         return cadence_series
     
+    def _get_video_fingerprint(self, video_path: str) -> str:
+        """
+        Calcola l'impronta (MD5) del contenuto di un video
+        
+        Il risultato è memorizzato per (percorso, dimensione, mtime) così che
+        lo stesso file non venga riletto più volte nello stesso processo.
+        
+        Args:
+            video_path: Percorso del video
+            
+        Returns:
+            Hash esadecimale del contenuto (stringa vuota se il file non è leggibile)
+        """
+        try:
+            stat = os.stat(video_path)
+        except OSError:
+            return ''
+        
+        memo_key = (os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns)
+        fingerprint = PoseEngine._fingerprint_memo.get(memo_key)
+        if fingerprint is not None:
+            return fingerprint
+        
+        md5 = hashlib.md5()
+        try:
+            with open(video_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    md5.update(chunk)
+        except OSError:
+            return ''
+        
+        fingerprint = md5.hexdigest()
+        PoseEngine._fingerprint_memo[memo_key] = fingerprint
+        return fingerprint
+    
     def _get_cache_path(self, video_path: str, fps: Optional[float] = None, view_type: str = 'posterior') -> str:
         """
         Genera il percorso del file cache per un video
         
+        La chiave usa il contenuto del video (non il percorso), così un video
+        già elaborato viene ritrovato anche quando viene caricato di nuovo
+        in uploads/ o elaborato da un archivio (vedi prewarm_cache.py).
+        
         Args:
             video_path: Percorso del video
             fps: FPS del video
@@ -541,37 +671,157 @@ class PoseEngine:
         Returns:
             Percorso completo del file cache
         """
-        # Ottieni timestamp di modifica del file per invalidare cache se video cambia
-        try:
-            stat = os.stat(video_path)
-            mtime = stat.st_mtime
-        except OSError:
-            mtime = 0
+        fingerprint = self._get_video_fingerprint(video_path) or video_path
+        return self._build_cache_path(fingerprint, fps, view_type)
+    
+    def _build_cache_path(self, fingerprint: str, fps: Optional[float], view_type: str) -> str:
+        """
+        Costruisce il percorso cache da impronta del video e parametri di elaborazione
         
-        # Crea hash del percorso video, timestamp, fps, view_type e parametri MediaPipe
-        cache_key = f"{video_path}_{mtime}_{fps}_{view_type}_{self.model_complexity}_{self.min_detection_confidence}_{self.min_tracking_confidence}"
+        Args:
+            fingerprint: Impronta del contenuto del video
+            fps: FPS richiesti
+            view_type: Tipo di vista ('posterior' o 'lateral')
+            
+        Returns:
+            Percorso completo del file cache
+        """
+        # Crea hash di contenuto video, fps, view_type, parametri MediaPipe e versioni del codice
+        cache_key = (f"{fingerprint}_{fps}_{view_type}_{self.model_complexity}_"
+                     f"{self.min_detection_confidence}_{self.min_tracking_confidence}_"
+                     f"L{self.LANDMARKS_VERSION}_M{self.METRICS_VERSION}")
         cache_hash = hashlib.md5(cache_key.encode()).hexdigest()
-        return os.path.join(self.CACHE_DIR, f"{cache_hash}.pkl")
+        # Il prefisso con la vista permette di ripartire le statistiche senza aprire i file
+        return os.path.join(self.CACHE_DIR, f"{view_type}_{cache_hash}.pkl")
+    
+    def _build_cache_meta(self, video_path: str, fps: Optional[float], view_type: str,
+                          video_fps: Optional[float] = None) -> Dict:
+        """
+        Metadati salvati con ogni voce della cache
+        
+        Servono a riconoscere le voci obsolete e a ricostruirne la chiave
+        quando vengono ricalcolate (vedi cache_maintenance.py): 'fps' sono gli
+        fps richiesti (anche None), gli stessi della chiave; 'video_fps' quelli
+        effettivamente usati.
+        """
+        return {
+            'fingerprint': self._get_video_fingerprint(video_path),
+            'source_video_path': os.path.abspath(video_path),
+            'fps': fps,
+            'video_fps': video_fps if video_fps is not None else fps,
+            'view_type': view_type,
+            'model_complexity': self.model_complexity,
+            'min_detection_confidence': self.min_detection_confidence,
+            'min_tracking_confidence': self.min_tracking_confidence,
+            'landmarks_version': self.LANDMARKS_VERSION,
+            'metrics_version': self.METRICS_VERSION
+        }
+    
+    @classmethod
+    def inspect_cache_entry(cls, cache_path: str) -> Dict:
+        """
+        Classifica una voce della cache rispetto alla versione corrente del codice
+        
+        Stati possibili:
+            'current':   voce aggiornata, nessuna azione
+            'recompute': metriche obsolete, ricalcolabili dai landmark salvati
+            'reprocess': landmark obsoleti o assenti, il video sorgente è ancora disponibile
+            'orphan':    obsoleta e non ricostruibile (nessun landmark né video sorgente)
+            'corrupt':   file non leggibile
+        
+        Args:
+            cache_path: Percorso del file cache
+            
+        Returns:
+            Dizionario con 'path', 'status' e 'meta'
+        """
+        try:
+            with open(cache_path, 'rb') as f:
+                result = pickle.load(f)
+        except Exception as e:
+            return {'path': cache_path, 'status': 'corrupt', 'meta': None, 'error': str(e)}
+        
+        meta = result.get('cache_meta') if isinstance(result, dict) else None
+        if not meta:
+            # Voce creata prima del versionamento: nessun modo di ricostruirla
+            return {'path': cache_path, 'status': 'orphan', 'meta': None}
+        
+        landmarks_ok = meta.get('landmarks_version') == cls.LANDMARKS_VERSION
+        metrics_ok = meta.get('metrics_version') == cls.METRICS_VERSION
+        
+        if landmarks_ok and metrics_ok:
+            status = 'current'
+        elif landmarks_ok and result.get('world_landmarks') is not None:
+            status = 'recompute'
+        elif meta.get('source_video_path') and os.path.exists(meta['source_video_path']):
+            status = 'reprocess'
+        else:
+            status = 'orphan'
+        
+        return {'path': cache_path, 'status': status, 'meta': meta}
+    
+    def recompute_from_cache_entry(self, cache_path: str) -> Optional[str]:
+        """
+        Ricalcola le metriche di una voce obsoleta dai landmark salvati
+        e la salva con la chiave della versione corrente
+        
+        Args:
+            cache_path: Percorso della voce obsoleta
+            
+        Returns:
+            Percorso della nuova voce, o None se non ricalcolabile
+        """
+        with open(cache_path, 'rb') as f:
+            old_result = pickle.load(f)
+        
+        meta = old_result.get('cache_meta')
+        world_landmarks = old_result.get('world_landmarks')
+        if not meta or world_landmarks is None:
+            return None
+        
+        result = self._compute_metrics_from_landmarks(world_landmarks, old_result['fps'], meta['view_type'])
+        result['skeleton_video_path'] = old_result.get('skeleton_video_path')
+        result['world_landmarks'] = world_landmarks
+        result['image_landmarks'] = old_result.get('image_landmarks')
+        result['cache_meta'] = dict(meta, metrics_version=self.METRICS_VERSION)
+        
+        new_path = self._build_cache_path(meta['fingerprint'], meta['fps'], meta['view_type'])
+        self._save_to_cache(result, new_path)
+        return new_path
     
-    def _load_from_cache(self, cache_path: str) -> Optional[Dict]:
+    def _load_from_cache(self, cache_path: str, view_type: Optional[str] = None) -> Optional[Dict]:
         """
         Carica risultati dalla cache se disponibile
         
         Args:
             cache_path: Percorso del file cache
+            view_type: Tipo di vista (per le statistiche della cache)
             
         Returns:
             Dizionario con risultati o None se cache non disponibile
         """
+        view_type = view_type or view_type_from_cache_path(cache_path)
         if os.path.exists(cache_path):
             try:
+                start = time.perf_counter()
                 with open(cache_path, 'rb') as f:
                     result = pickle.load(f)
-                logger.info(f"✓ Risultati caricati dalla cache: {os.path.basename(cache_path)}")
+                load_seconds = time.perf_counter() - start
+                
+                # Aggiorna mtime: l'eviction per dimensione rimuove le voci usate meno di recente
+                try:
+                    os.utime(cache_path)
+                except OSError:
+                    pass
+                
+                compute_seconds = (result.get('cache_meta') or {}).get('processing_seconds')
+                cache_stats.record_hit(view_type, load_seconds, compute_seconds)
+                logger.info(f"✓ Risultati caricati dalla cache: {os.path.basename(cache_path)} ({load_seconds*1000:.1f} ms)")
                 logger.info(f"  Video: {result.get('n_frames', 0)} frame, FPS: {result.get('fps', 0):.2f}")
                 return result
             except Exception as e:
                 logger.warning(f"⚠ Errore nel caricare cache: {e}")
+        cache_stats.record_miss(view_type)
         return None
     
     def _save_to_cache(self, result: Dict, cache_path: str):
@@ -583,155 +833,73 @@ class PoseEngine:
             cache_path: Percorso del file cache
         """
         try:
-            with open(cache_path, 'wb') as f:
+            # Scrittura atomica: i lettori concorrenti (API, prewarm) non vedono file parziali
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
                 pickle.dump(result, f)
+            os.replace(tmp_path, cache_path)
+            
+            compute_seconds = (result.get('cache_meta') or {}).get('processing_seconds')
+            cache_stats.record_store(result.get('view_type'), os.path.getsize(cache_path), compute_seconds)
             logger.info(f"✓ Risultati salvati in cache: {os.path.basename(cache_path)}")
         except Exception as e:
             logger.warning(f"⚠ Errore nel salvare cache: {e}")
+            return
+        
+        self._enforce_cache_limit(keep_path=cache_path)
     
-    def process_video(self, video_path: str, fps: Optional[float] = None, view_type: str = 'posterior') -> Dict:
+    def _enforce_cache_limit(self, keep_path: Optional[str] = None):
         """
-        Processa un video e estrae metriche biomeccaniche
+        Rimuove le voci usate meno di recente finché la cache supera Config.POSE_CACHE_MAX_MB
         
         Args:
-            video_path: Percorso del video da analizzare
-            fps: FPS del video (opzionale, altrimenti usa quelli del video)
-            view_type: Tipo di vista ('posterior' o 'lateral')
-            
-        Returns:
-            Dizionario con metriche e serie temporali.
-            
-            Per vista 'posterior':
-            {
-                'left_knee_valgus': [frame1, frame2, ...],
-                'right_knee_valgus': [...],
-                'pelvic_drop': [...],
-                'cadence': [...],
-                'left_cadence': float,
-                'right_cadence': float,
-                'avg_cadence': float,
-                'fps': float,
-                'n_frames': int,
-                'view_type': 'posterior'
-            }
-            
-            Per vista 'lateral':
-            {
-                'overstriding': [...],
-                'knee_flexion_ic': [...],
-                'trunk_lean': [...],
-                'ground_contact_time': [...],
-                'avg_gct': float,
-                'fps': float,
-                'n_frames': int,
-                'view_type': 'lateral'
-            }
+            keep_path: Voce appena scritta, da non rimuovere
         """
-        logger.info(f"=== Inizio processing video: {video_path} ===")
-        logger.info(f"Vista: {view_type}")
-        
-        # Controlla cache se abilitata
-        if self.use_cache:
-            cache_path = self._get_cache_path(video_path, fps, view_type)
-            cached_result = self._load_from_cache(cache_path)
-            if cached_result is not None:
-                logger.info(f"=== Processing completato (da cache) ===")
-                return cached_result
-        
-        # Apri il video
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            logger.error(f"Impossibile aprire il video: {video_path}")
-            raise ValueError(f"Impossibile aprire il video: {video_path}")
+        from config import Config
+        max_bytes = int(Config.POSE_CACHE_MAX_MB * 1024 * 1024)
+        if max_bytes <= 0:
+            return
         
-        # Ottieni FPS del video se non forniti
-        if fps is None:
-            fps = cap.get(cv2.CAP_PROP_FPS)
+        entries = []
+        for path in glob.glob(os.path.join(self.CACHE_DIR, '*.pkl')):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= max_bytes:
+                break
+            if path == keep_path:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_bytes -= size
+            cache_stats.record_eviction(view_type_from_cache_path(path), size)
+            logger.info(f"🧹 Voce cache rimossa (limite {Config.POSE_CACHE_MAX_MB} MB): {os.path.basename(path)}")
+    
+    def _compute_metrics_from_landmarks(self, world_landmarks: np.ndarray, fps: float,
+                                        view_type: str = 'posterior') -> Dict:
+        """
+        Calcola metriche e serie temporali dai landmark 3D di ogni frame
         
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        logger.info(f"Video: {total_frames} frame, {fps:.2f} FPS, {width}x{height}")
+        Separato da process_video così che le metriche possano essere ricalcolate
+        dai landmark salvati in cache quando cambia METRICS_VERSION.
         
-        # Inizializza VideoWriter per video con scheletro (se richiesto)
-        skeleton_video_path = None
-        video_writer = None
-        if self.generate_skeleton_video:
-            from config import Config
-            os.makedirs(Config.PROCESSED_VIDEOS_FOLDER, exist_ok=True)
-            
-            # Genera nome file univoco (sanitizza per evitare problemi con caratteri speciali)
-            video_basename = os.path.splitext(os.path.basename(video_path))[0]
-            # Sanitizza il nome del file per evitare problemi con caratteri speciali nell'URL
-            # Sostituisce caratteri problematici con underscore
-            import re
-            safe_basename = re.sub(r'[^\w\-_\.]', '_', video_basename)
-            # Rimuove punti multipli consecutivi
-            safe_basename = re.sub(r'\.+', '.', safe_basename)
-            # Se il nome è vuoto dopo la sanitizzazione, usa un nome generico
-            if not safe_basename or safe_basename == '_':
-                import hashlib
-                safe_basename = hashlib.md5(video_path.encode()).hexdigest()[:8]
-            skeleton_video_path = os.path.join(
-                Config.PROCESSED_VIDEOS_FOLDER,
-                f"{safe_basename}_skeleton.mp4"
-            )
-            logger.debug(f"📹 Nome video originale: {video_basename}")
-            logger.debug(f"📹 Nome video sanitizzato: {safe_basename}")
-            logger.debug(f"📹 Percorso video scheletro: {skeleton_video_path}")
-            
-            # Prova diversi codec per compatibilità
-            # H.264 è il più compatibile per i browser
-            codecs_to_try = [
-                ('avc1', 'H.264/AVC'),  # H.264 - migliore compatibilità browser
-                ('mp4v', 'MPEG-4'),      # MPEG-4 - fallback
-                ('XVID', 'Xvid'),        # Xvid - altro fallback
-            ]
-            
-            video_writer = None
-            used_codec = None
-            for fourcc_str, codec_name in codecs_to_try:
-                try:
-                    fourcc = cv2.VideoWriter_fourcc(*fourcc_str)
-                    test_writer = cv2.VideoWriter(skeleton_video_path, fourcc, fps, (width, height))
-                    if test_writer.isOpened():
-                        video_writer = test_writer
-                        used_codec = codec_name
-                        logger.info(f"📹 Codec selezionato: {codec_name} ({fourcc_str})")
-                        break
-                    else:
-                        test_writer.release()
-                except Exception as e:
-                    logger.debug(f"⚠ Codec {codec_name} non disponibile: {e}")
-                    continue
+        Args:
+            world_landmarks: Array (n_frames, 33, 3) con i pose_world_landmarks
+                             (NaN per i frame senza pose rilevata)
+            fps: Frame per secondo del video
+            view_type: Tipo di vista ('posterior' o 'lateral')
             
-            if not video_writer:
-                # Ultimo tentativo con mp4v
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                video_writer = cv2.VideoWriter(skeleton_video_path, fourcc, fps, (width, height))
-                used_codec = 'MPEG-4 (mp4v)'
-                logger.warning(f"⚠ Usando codec di fallback: {used_codec}")
-            
-            if not video_writer.isOpened():
-                logger.warning(f"⚠ Impossibile creare video writer, disabilito generazione video scheletro")
-                video_writer = None
-                self.generate_skeleton_video = False
-            else:
-                logger.info(f"📹 Generazione video con scheletro: {os.path.basename(skeleton_video_path)}")
-        
-        # Inizializza MediaPipe Pose
-        # NOTA: I warning di timestamp mismatch possono apparire con parallelizzazione
-        # ma sono solo warning informativi, non errori fatali. Il processing continua normalmente.
-        # Sopprimiamo questi warning perché non influenzano i risultati.
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            pose = self.mp_pose.Pose(
-                model_complexity=self.model_complexity,
-                min_detection_confidence=self.min_detection_confidence,
-                min_tracking_confidence=0.1,  # Basso per ridurre dipendenze temporali
-                enable_segmentation=self.enable_segmentation,  # Abilita per Ghost Vision
-                smooth_landmarks=False  # Disabilitato per evitare tracking temporale
-            )
+        Returns:
+            Dizionario con metriche e serie temporali (vedi process_video)
+        """
+        frame_count = len(world_landmarks)
         
         # Array per raccogliere dati (inizializzazione diversa per view type)
         if view_type == 'posterior':
@@ -747,65 +915,19 @@ class PoseEngine:
             left_ankle_y_series = []
             right_ankle_y_series = []
         
-        frame_count = 0
         frames_with_pose = 0
         
-        # Processa frame per frame
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # Converti BGR a RGB
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # Processa con MediaPipe
-            # NOTA: I warning di timestamp mismatch vengono soppressi perché sono solo
-            # warning informativi che non bloccano il processing. MediaPipe continua
-            # a funzionare correttamente anche con questi warning.
-            # MediaPipe stampa questi warning su stderr, quindi li sopprimiamo temporaneamente
-            try:
-                with suppress_stderr():
-                    results = pose.process(frame_rgb)
-            except Exception as e:
-                # Se c'è un errore fatale (raro), logga e continua con frame vuoto
-                logger.warning(f"⚠ Errore MediaPipe frame {frame_count}: {e}")
-                results = None
-            
-            # Disegna scheletro sul frame se richiesto
-            if self.generate_skeleton_video and video_writer:
-                if results and results.pose_landmarks:
-                    frame_with_skeleton = self._draw_skeleton(frame, results.pose_landmarks)
-                else:
-                    frame_with_skeleton = frame  # Frame senza scheletro se pose non rilevata
-                video_writer.write(frame_with_skeleton)
-            
-            # Salva segmentation mask per Ghost Vision (se abilitata)
-            # Nota: le mask vengono salvate in memoria durante il processing
-            # e poi processate per estrarre la migliore baseline
-            
-            if results and results.pose_world_landmarks:
-                landmarks = results.pose_world_landmarks.landmark
+        for frame_landmarks in world_landmarks:
+            if not np.isnan(frame_landmarks[0, 0]):
+                landmarks = frame_landmarks.astype(np.float64)
                 
                 # Estrai posizioni 3D comuni
-                l_hip = np.array([landmarks[self.LEFT_HIP].x, 
-                                 landmarks[self.LEFT_HIP].y,
-                                 landmarks[self.LEFT_HIP].z])
-                r_hip = np.array([landmarks[self.RIGHT_HIP].x,
-                                 landmarks[self.RIGHT_HIP].y,
-                                 landmarks[self.RIGHT_HIP].z])
-                l_knee = np.array([landmarks[self.LEFT_KNEE].x,
-                                  landmarks[self.LEFT_KNEE].y,
-                                  landmarks[self.LEFT_KNEE].z])
-                r_knee = np.array([landmarks[self.RIGHT_KNEE].x,
-                                  landmarks[self.RIGHT_KNEE].y,
-                                  landmarks[self.RIGHT_KNEE].z])
-                l_ankle = np.array([landmarks[self.LEFT_ANKLE].x,
-                                   landmarks[self.LEFT_ANKLE].y,
-                                   landmarks[self.LEFT_ANKLE].z])
-                r_ankle = np.array([landmarks[self.RIGHT_ANKLE].x,
-                                   landmarks[self.RIGHT_ANKLE].y,
-                                   landmarks[self.RIGHT_ANKLE].z])
+                l_hip = landmarks[self.LEFT_HIP]
+                r_hip = landmarks[self.RIGHT_HIP]
+                l_knee = landmarks[self.LEFT_KNEE]
+                r_knee = landmarks[self.RIGHT_KNEE]
+                l_ankle = landmarks[self.LEFT_ANKLE]
+                r_ankle = landmarks[self.RIGHT_ANKLE]
                 
                 if view_type == 'posterior':
                     # Calcola metriche vista posteriore
@@ -826,14 +948,7 @@ class PoseEngine:
                     hip_center = (l_hip + r_hip) / 2.0
                     knee_center = (l_knee + r_knee) / 2.0
                     ankle_center = (l_ankle + r_ankle) / 2.0
-                    
-                    l_shoulder = np.array([landmarks[self.LEFT_SHOULDER].x,
-                                          landmarks[self.LEFT_SHOULDER].y,
-                                          landmarks[self.LEFT_SHOULDER].z])
-                    r_shoulder = np.array([landmarks[self.RIGHT_SHOULDER].x,
-                                          landmarks[self.RIGHT_SHOULDER].y,
-                                          landmarks[self.RIGHT_SHOULDER].z])
-                    shoulder_center = (l_shoulder + r_shoulder) / 2.0
+                    shoulder_center = (landmarks[self.LEFT_SHOULDER] + landmarks[self.RIGHT_SHOULDER]) / 2.0
                     
                     overstriding = self._get_overstriding(ankle_center, hip_center)
                     knee_flexion = self._get_knee_flexion_angle(hip_center, knee_center, ankle_center)
@@ -881,28 +996,9 @@ class PoseEngine:
                     right_ankle_y_series.append(
                         right_ankle_y_series[-1] if right_ankle_y_series else 0.0
                     )
-            
-            frame_count += 1
         
-        cap.release()
-        pose.close()
-        
-        # Chiudi VideoWriter se aperto
-        if video_writer:
-            video_writer.release()
-            if skeleton_video_path:
-                if os.path.exists(skeleton_video_path):
-                    file_size_mb = os.path.getsize(skeleton_video_path) / (1024 * 1024)
-                    logger.info(f"✓ Video con scheletro salvato: {os.path.basename(skeleton_video_path)} ({file_size_mb:.2f} MB)")
-                    logger.info(f"  Percorso completo: {skeleton_video_path}")
-                else:
-                    logger.error(f"❌ Video con scheletro non trovato dopo il salvataggio: {skeleton_video_path}")
-                    skeleton_video_path = None  # Imposta a None se il file non esiste
-            else:
-                logger.warning(f"⚠ Video con scheletro non salvato correttamente (percorso non definito)")
-        
-        logger.info(f"Processing completato: {frame_count} frame, {frames_with_pose} con pose rilevata")
-        logger.info(f"Percentuale successo: {(frames_with_pose/frame_count*100):.1f}%")
+        logger.info(f"Processing completato: {frame_count} frame, {frames_with_pose} con pose rilevata")
+        logger.info(f"Percentuale successo: {(frames_with_pose/frame_count*100):.1f}%")
         
         # Prepara risultati in base al tipo di vista
         if view_type == 'posterior':
@@ -951,8 +1047,7 @@ class PoseEngine:
                 'avg_knee_valgus_symmetry': avg_knee_valgus_symmetry,
                 'fps': float(fps),
                 'n_frames': frame_count,
-                'frames_with_pose': frames_with_pose,
-                'skeleton_video_path': skeleton_video_path if skeleton_video_path else None
+                'frames_with_pose': frames_with_pose
             }
         
         else:  # lateral
@@ -1043,28 +1138,271 @@ class PoseEngine:
                 'n_contacts': len(gct_values),
                 'fps': float(fps),
                 'n_frames': frame_count,
-                'frames_with_pose': frames_with_pose,
-                'skeleton_video_path': skeleton_video_path if skeleton_video_path else None
+                'frames_with_pose': frames_with_pose
             }
         
-        # Salva in cache se abilitata
+        return result
+    
+    def is_cached(self, video_path: str, fps: Optional[float] = None, view_type: str = 'posterior') -> bool:
+        """
+        Verifica se i risultati per un video sono già presenti in cache
+        
+        Args:
+            video_path: Percorso del video
+            fps: FPS del video
+            view_type: Tipo di vista ('posterior' o 'lateral')
+            
+        Returns:
+            True se esiste un file cache per la combinazione richiesta
+        """
+        return os.path.exists(self._get_cache_path(video_path, fps, view_type))
+    
+    def process_video(self, video_path: str, fps: Optional[float] = None, view_type: str = 'posterior',
+                      stream_dir: Optional[str] = None) -> Dict:
+        """
+        Processa un video e estrae metriche biomeccaniche
+        
+        Args:
+            video_path: Percorso del video da analizzare
+            fps: FPS del video (opzionale, altrimenti usa quelli del video)
+            view_type: Tipo di vista ('posterior' o 'lateral')
+            stream_dir: Se indicata, scrive in questa cartella lo stream HLS con lo
+                scheletro mentre l'elaborazione è in corso (richiede ffmpeg; ignorata
+                se il risultato è già in cache)
+            
+        Returns:
+            Dizionario con metriche e serie temporali.
+            Contiene anche 'world_landmarks' (array n_frames x 33 x 3, usato per
+            ricalcolare le metriche), 'image_landmarks' (array n_frames x 33 x 3 con
+            x, y normalizzati e visibility, usato per disegnare lo scheletro) e
+            'cache_meta' (metadati della voce in cache).
+            
+            Per vista 'posterior':
+            {
+                'left_knee_valgus': [frame1, frame2, ...],
+                'right_knee_valgus': [...],
+                'pelvic_drop': [...],
+                'cadence': [...],
+                'left_cadence': float,
+                'right_cadence': float,
+                'avg_cadence': float,
+                'fps': float,
+                'n_frames': int,
+                'view_type': 'posterior'
+            }
+            
+            Per vista 'lateral':
+            {
+                'overstriding': [...],
+                'knee_flexion_ic': [...],
+                'trunk_lean': [...],
+                'ground_contact_time': [...],
+                'avg_gct': float,
+                'fps': float,
+                'n_frames': int,
+                'view_type': 'lateral'
+            }
+        """
+        logger.info(f"=== Inizio processing video: {video_path} ===")
+        logger.info(f"Vista: {view_type}")
+        
+        # Controlla cache se abilitata
+        # NOTA: la chiave usa gli fps richiesti (anche None), la stessa usata poi per il salvataggio
+        cache_path = None
         if self.use_cache:
             cache_path = self._get_cache_path(video_path, fps, view_type)
+            cached_result = self._load_from_cache(cache_path, view_type)
+            if cached_result is not None:
+                logger.info(f"=== Processing completato (da cache) ===")
+                return cached_result
+        
+        processing_start = time.perf_counter()
+        
+        # Apri il video
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            logger.error(f"Impossibile aprire il video: {video_path}")
+            raise ValueError(f"Impossibile aprire il video: {video_path}")
+        
+        # Ottieni FPS del video se non forniti (la chiave della cache resta sugli fps richiesti)
+        requested_fps = fps
+        if fps is None:
+            fps = cap.get(cv2.CAP_PROP_FPS)
+        
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        logger.info(f"Video: {total_frames} frame, {fps:.2f} FPS, {width}x{height}")
+        
+        # Inizializza VideoWriter per video con scheletro (se richiesto)
+        from config import Config
+        skeleton_video_path = None
+        video_writer = None
+        stream_writer = None
+        # Renderer condiviso per tutto il video: disegna sul posto, eventualmente a risoluzione ridotta
+        skeleton_renderer = SkeletonRenderer(self.POSE_CONNECTIONS, scale=Config.SKELETON_VIDEO_SCALE)
+        out_width, out_height = skeleton_renderer.output_size(width, height)
+        if self.generate_skeleton_video:
+            os.makedirs(Config.PROCESSED_VIDEOS_FOLDER, exist_ok=True)
+            skeleton_video_path = os.path.join(
+                Config.PROCESSED_VIDEOS_FOLDER,
+                self.skeleton_video_filename(video_path)
+            )
+            logger.debug(f"📹 Percorso video scheletro: {skeleton_video_path}")
+            
+            video_writer = self.open_skeleton_writer(skeleton_video_path, fps, (out_width, out_height))
+            if video_writer is None:
+                logger.warning(f"⚠ Nessun encoder video disponibile, video con scheletro non generato")
+                skeleton_video_path = None
+            else:
+                logger.info(f"📹 Generazione video con scheletro: {os.path.basename(skeleton_video_path)}")
+        
+        # Stream HLS progressivo: riproducibile mentre l'analisi è in corso
+        if stream_dir:
+            stream_writer = open_hls_writer(stream_dir, fps, (out_width, out_height),
+                                            segment_seconds=Config.SKELETON_STREAM_SEGMENT_SECONDS,
+                                            preset=Config.SKELETON_STREAM_PRESET,
+                                            ffmpeg_binary=Config.FFMPEG_BINARY)
+            if stream_writer is None:
+                logger.warning(f"⚠ Stream HLS non disponibile (serve ffmpeg con H.264)")
+        
+        # Inizializza MediaPipe Pose
+        # NOTA: I warning di timestamp mismatch possono apparire con parallelizzazione
+        # ma sono solo warning informativi, non errori fatali. Il processing continua normalmente.
+        # Sopprimiamo questi warning perché non influenzano i risultati.
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            pose = self.mp_pose.Pose(
+                model_complexity=self.model_complexity,
+                min_detection_confidence=self.min_detection_confidence,
+                min_tracking_confidence=0.1,  # Basso per ridurre dipendenze temporali
+                enable_segmentation=self.enable_segmentation,  # Abilita per Ghost Vision
+                smooth_landmarks=False  # Disabilitato per evitare tracking temporale
+            )
+        
+        # Landmark 3D (world) per frame: NaN per i frame senza pose rilevata
+        # Vengono salvati in cache per poter ricalcolare le metriche senza rielaborare il video
+        world_landmarks_series = []
+        missing_landmarks = np.full((33, 3), np.nan, dtype=np.float32)
+        # Landmark 2D normalizzati (x, y, visibility): bastano per disegnare lo scheletro in seguito
+        image_landmarks_series = []
+        
+        frame_count = 0
+        
+        # Processa frame per frame
+        while cap.isOpened():
+            ret, frame = cap.read()
+            if not ret:
+                break
+            
+            # Converti BGR a RGB
+            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            
+            # Processa con MediaPipe
+            # NOTA: I warning di timestamp mismatch vengono soppressi perché sono solo
+            # warning informativi che non bloccano il processing. MediaPipe continua
+            # a funzionare correttamente anche con questi warning.
+            # MediaPipe stampa questi warning su stderr, quindi li sopprimiamo temporaneamente
+            try:
+                with suppress_stderr():
+                    results = pose.process(frame_rgb)
+            except Exception as e:
+                # Se c'è un errore fatale (raro), logga e continua con frame vuoto
+                logger.warning(f"⚠ Errore MediaPipe frame {frame_count}: {e}")
+                results = None
+            
+            # Disegna scheletro sul frame se richiesto
+            points = (SkeletonRenderer.landmarks_to_array(results.pose_landmarks)
+                      if results and results.pose_landmarks else None)
+            image_landmarks_series.append(points if points is not None else missing_landmarks)
+            
+            if video_writer or stream_writer:
+                # Il frame RGB è già stato elaborato: si può disegnare sul posto sul frame BGR
+                frame_with_skeleton = skeleton_renderer.render(frame, points)
+                if video_writer:
+                    video_writer.write(frame_with_skeleton)
+                if stream_writer:
+                    stream_writer.write(frame_with_skeleton)
+            
+            if results and results.pose_world_landmarks:
+                world_landmarks_series.append(np.array(
+                    [[lm.x, lm.y, lm.z] for lm in results.pose_world_landmarks.landmark],
+                    dtype=np.float32
+                ))
+            else:
+                world_landmarks_series.append(missing_landmarks)
+            
+            frame_count += 1
+        
+        cap.release()
+        pose.close()
+        image_landmarks = (np.stack(image_landmarks_series) if image_landmarks_series
+                           else np.zeros((0, 33, 3), dtype=np.float32))
+        
+        # Chiude lo stream: ffmpeg scrive l'ultimo segmento e chiude la playlist
+        if stream_writer:
+            stream_writer.release()
+        
+        # Chiudi VideoWriter se aperto
+        if video_writer:
+            if not release_writer(video_writer) and skeleton_video_path:
+                # ffmpeg è fallito: il file è incompleto, si ricodifica con cv2.VideoWriter
+                skeleton_video_path = self._reencode_skeleton_video_opencv(
+                    video_path, skeleton_video_path, fps, (out_width, out_height),
+                    skeleton_renderer, image_landmarks)
+            if skeleton_video_path:
+                if os.path.exists(skeleton_video_path):
+                    file_size_mb = os.path.getsize(skeleton_video_path) / (1024 * 1024)
+                    logger.info(f"✓ Video con scheletro salvato: {os.path.basename(skeleton_video_path)} ({file_size_mb:.2f} MB)")
+                    logger.info(f"  Percorso completo: {skeleton_video_path}")
+                else:
+                    logger.error(f"❌ Video con scheletro non trovato dopo il salvataggio: {skeleton_video_path}")
+                    skeleton_video_path = None  # Imposta a None se il file non esiste
+            else:
+                logger.warning(f"⚠ Video con scheletro non salvato correttamente (percorso non definito)")
+        
+        # Calcola metriche dai landmark raccolti
+        world_landmarks = (np.stack(world_landmarks_series) if world_landmarks_series
+                           else np.zeros((0, 33, 3), dtype=np.float32))
+        result = self._compute_metrics_from_landmarks(world_landmarks, fps, view_type)
+        result['skeleton_video_path'] = skeleton_video_path if skeleton_video_path else None
+        result['world_landmarks'] = world_landmarks
+        result['image_landmarks'] = image_landmarks
+        result['cache_meta'] = self._build_cache_meta(video_path, requested_fps, view_type, video_fps=fps)
+        result['cache_meta']['processing_seconds'] = time.perf_counter() - processing_start
+        
+        # Salva in cache se abilitata
+        if self.use_cache and cache_path:
             self._save_to_cache(result, cache_path)
         
         return result
     
     def generate_ghost_frames(self, video_path: str, output_folder: str, 
                              fps: Optional[float] = None, 
-                             ghost_color: Tuple[int, int, int] = (0, 255, 255)) -> Dict:
+                             ghost_color: Tuple[int, int, int] = (0, 255, 255),
+                             frame_format: Optional[str] = None, job=None,
+                             cycle: Optional[Dict] = None) -> Dict:
         """
         Genera frame "ghost" (silhouette) da un video baseline per Ghost Vision
         
+        I frame vengono salvati in un unico archivio indicizzato
+        (ghost_store.PACK_FILENAME) che sostituisce quello esistente a fine generazione.
+        
+        Il thread chiamante esegue solo MediaPipe: estrazione della silhouette e
+        codifica girano su Config.GHOST_ENCODE_WORKERS thread, con al massimo
+        Config.GHOST_ENCODE_QUEUE_SIZE frame in attesa (memoria limitata). I
+        payload vengono scritti nell'archivio nell'ordine dei frame.
+        
         Args:
             video_path: Percorso del video da processare
-            output_folder: Cartella dove salvare i frame ghost
+            output_folder: Cartella dove salvare l'archivio dei frame ghost
             fps: FPS del video (opzionale)
             ghost_color: Colore BGR per la silhouette (default: ciano)
+            frame_format: 'contour' (poligono, PNG disegnato su richiesta) o 'png'
+                (immagine RGBA per frame); default Config.GHOST_FRAME_FORMAT
+            job: Handle del job per aggiornare il progresso (opzionale, vedi jobs.py)
+            cycle: Ciclo del passo da gait_cycle.select_gait_cycles: se indicato vengono
+                generati solo i frame del ciclo (riprodotti in loop, vedi GhostFrameStore)
             
         Returns:
             Dizionario con informazioni sui frame generati
@@ -1125,84 +1463,163 @@ class PoseEngine:
             )
         logger.info("✅ MediaPipe Pose inizializzato con segmentazione attiva")
         
+        from config import Config
+        frame_format = frame_format or Config.GHOST_FRAME_FORMAT
+        logger.info(f"💾 Formato archivio ghost: {frame_format}")
+        
         frame_count = 0
         frames_processed = 0
         ghost_frames_info = []
-        
-        logger.info("🎬 Inizio processing frame per generare ghost silhouettes...")
-        
-        # Processa frame per frame
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # Converti BGR a RGB
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # Processa con MediaPipe
-            try:
-                with suppress_stderr():
-                    results = pose.process(frame_rgb)
-            except Exception as e:
-                logger.warning(f"⚠ Errore MediaPipe frame {frame_count}: {e}")
-                results = None
-            
-            # Estrai segmentation mask se disponibile
-            if results and results.segmentation_mask is not None:
-                # Estrai la silhouette ghost
-                ghost_img = self._extract_ghost_silhouette(frame, results.segmentation_mask, ghost_color)
-                
-                # Salva il frame ghost come PNG (supporta trasparenza)
-                ghost_filename = f"ghost_frame_{frame_count:06d}.png"
-                ghost_path = os.path.join(output_folder, ghost_filename)
-                cv2.imwrite(ghost_path, ghost_img)
+        pack_writer = GhostPackWriter(os.path.join(output_folder, PACK_FILENAME))
+        
+        # Con un ciclo si elaborano solo i suoi frame, più un breve riscaldamento
+        # perché il tracking di MediaPipe si stabilizzi
+        first_frame, last_frame = 0, None
+        if cycle is not None:
+            first_frame, last_frame = cycle['start'], cycle['end']
+            warmup_start = max(0, first_frame - int(Config.GHOST_CYCLE_WARMUP_SECONDS * fps))
+            for _ in range(warmup_start):
+                if not cap.grab():
+                    break
+            frame_count = warmup_start
+            logger.info(f"🔁 Generazione solo del ciclo: frame {first_frame}-{last_frame - 1} "
+                        f"(riscaldamento da {warmup_start})")
+        
+        self._silhouette()  # creato prima dei worker che lo condividono
+        png_params = [cv2.IMWRITE_PNG_COMPRESSION, Config.GHOST_PNG_COMPRESSION]
+        n_workers = max(0, Config.GHOST_ENCODE_WORKERS)
+        max_pending = max(1, Config.GHOST_ENCODE_QUEUE_SIZE)
+        executor = ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix='ghost_encode') if n_workers else None
+        pending = deque()  # (frame_number, future) in ordine di frame
+        
+        def write_completed(limit: int):
+            """Scrive nell'archivio i frame codificati finché in coda ne restano al massimo limit"""
+            nonlocal frames_processed
+            while len(pending) > limit:
+                frame_number, future = pending.popleft()
+                payload = future.result()
+                if payload is None:
+                    logger.warning(f"⚠ Codifica fallita per il frame ghost {frame_number}")
+                    continue
                 
+                pack_writer.add(frame_number, payload)
                 ghost_frames_info.append({
-                    'frame_number': frame_count,
-                    'timestamp': frame_count / fps,
-                    'filename': ghost_filename,
-                    'path': ghost_path
+                    'frame_number': frame_number,
+                    'timestamp': frame_number / fps,
+                    'filename': legacy_frame_filename(frame_number),
+                    'size_bytes': len(payload)
                 })
-                
                 frames_processed += 1
                 
                 # Log dettagliato ogni 60 frame
                 if frames_processed % 60 == 0:
-                    progress_pct = (frame_count / total_frames) * 100
+                    progress_pct = (frame_number / total_frames) * 100 if total_frames else 0.0
                     logger.info(f"👻 Ghost frames generati: {frames_processed} frame ({progress_pct:.1f}% video processato)")
-            else:
-                # Log quando segmentation non disponibile
-                if frame_count % 100 == 0:
-                    logger.debug(f"⚠ Frame {frame_count}: segmentation mask non disponibile (pose non rilevata)")
-            
-            frame_count += 1
-            
-            # Log progress generale ogni 30 frame
-            if frame_count % 30 == 0 and frame_count % 60 != 0:
-                logger.debug(f"📹 Processati {frame_count}/{total_frames} frame...")
+                    if job is not None and total_frames:
+                        job.update(progress=frame_number / total_frames,
+                                   message=f"{frames_processed} frame ghost generati")
         
-        cap.release()
-        pose.close()
+        logger.info(f"🎬 Inizio processing frame per generare ghost silhouettes "
+                    f"({n_workers} worker di codifica, PNG compressione {Config.GHOST_PNG_COMPRESSION})...")
+        
+        try:
+            # Processa frame per frame
+            while cap.isOpened():
+                if last_frame is not None and frame_count >= last_frame:
+                    break
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                
+                # Converti BGR a RGB
+                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                
+                # Processa con MediaPipe
+                try:
+                    with suppress_stderr():
+                        results = pose.process(frame_rgb)
+                except Exception as e:
+                    logger.warning(f"⚠ Errore MediaPipe frame {frame_count}: {e}")
+                    results = None
+                
+                # Estrai segmentation mask se disponibile
+                if frame_count < first_frame:
+                    pass  # Riscaldamento del tracking prima del ciclo
+                elif results and results.segmentation_mask is not None:
+                    # Copia della mask: il worker la usa dopo la prossima chiamata a MediaPipe
+                    args = (frame, np.array(results.segmentation_mask), frame_format, ghost_color,
+                            png_params, Config.GHOST_CONTOUR_EPSILON)
+                    if executor is not None:
+                        pending.append((frame_count, executor.submit(self._encode_ghost_frame, *args)))
+                        write_completed(max_pending)
+                    else:
+                        future = Future()
+                        future.set_result(self._encode_ghost_frame(*args))
+                        pending.append((frame_count, future))
+                        write_completed(0)
+                else:
+                    # Log quando segmentation non disponibile
+                    if frame_count % 100 == 0:
+                        logger.debug(f"⚠ Frame {frame_count}: segmentation mask non disponibile (pose non rilevata)")
+                
+                frame_count += 1
+                
+                # Log progress generale ogni 30 frame
+                if frame_count % 30 == 0 and frame_count % 60 != 0:
+                    logger.debug(f"📹 Processati {frame_count}/{total_frames} frame...")
+            
+            # Attendi i frame ancora in codifica
+            write_completed(0)
+        except Exception:
+            for _, future in pending:
+                future.cancel()
+            pack_writer.abort()
+            raise
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+            cap.release()
+            pose.close()
+        
+        meta = {
+            'fps': float(fps),
+            'video_width': width,
+            'video_height': height,
+            'total_frames': frame_count if cycle is None else max(total_frames, frame_count),
+            'format': frame_format,
+            'color': list(ghost_color)
+        }
+        if cycle is not None:
+            meta['cycle'] = cycle
+        pack_path = pack_writer.close(meta)
+        # I PNG singoli di una generazione precedente non servono più
+        removed = GhostFrameStore(output_folder).remove_legacy_frames()
+        if removed:
+            logger.info(f"🧹 Rimossi {removed} ghost frame PNG del formato precedente")
         
         logger.info("=" * 60)
-        logger.info(f"✅ GHOST FRAMES GENERATI: {frames_processed}/{frame_count} frame")
-        logger.info(f"📊 Tasso di successo: {(frames_processed/frame_count*100):.1f}%")
+        n_target = max(frame_count - first_frame, 1)
+        logger.info(f"✅ GHOST FRAMES GENERATI: {frames_processed}/{n_target} frame")
+        logger.info(f"📊 Tasso di successo: {(frames_processed/n_target*100):.1f}%")
         logger.info(f"📁 Cartella output: {output_folder}")
-        logger.info(f"💾 File salvati: {len(ghost_frames_info)} ghost frames PNG")
+        logger.info(f"💾 Archivio: {PACK_FILENAME} ({len(ghost_frames_info)} frame, "
+                    f"{os.path.getsize(pack_path) / (1024*1024):.2f} MB)")
         logger.info("=" * 60)
         
         return {
-            'total_frames': frame_count,
+            'total_frames': meta['total_frames'],
             'frames_processed': frames_processed,
             'fps': float(fps),
             'video_width': width,
             'video_height': height,
             'output_folder': output_folder,
+            'pack_path': pack_path,
+            'cycle': cycle,
             'ghost_frames': ghost_frames_info
         }
     
-    def create_baseline_stats(self, videos_data: List[Dict]) -> Dict:
+    def create_baseline_stats(self, videos_data: List[Dict], estimator: str = 'mean',
+                              trim_fraction: float = DEFAULT_TRIM_FRACTION) -> Dict:
         """
         Crea statistiche baseline da multipli video processati
         Calcola Media, Deviazione Standard, Min e Max per ogni metrica
@@ -1212,6 +1629,9 @@ class PoseEngine:
         
         Args:
             videos_data: Lista di dizionari restituiti da process_video()
+            estimator: 'mean', 'median' (mediana/MAD) o 'trimmed' (media troncata),
+                vedi running_stats.ESTIMATORS
+            trim_fraction: Frazione tolta per lato con 'trimmed'
             
         Returns:
             Dizionario con statistiche aggregate.
@@ -1244,214 +1664,49 @@ class PoseEngine:
         view_type = videos_data[0].get('view_type', 'posterior')
         logger.info(f"Vista: {view_type}")
         
-        # Soglie minime per StdDev (per evitare StdDev troppo piccole)
-        MIN_STD_THRESHOLDS = {
-            'left_knee_valgus': 0.5,      # 0.5° minimo
-            'right_knee_valgus': 0.5,     # 0.5° minimo
-            'pelvic_drop': 0.3,           # 0.3° minimo
-            'cadence': 2.0,               # 2 spm minimo
-            'knee_valgus_symmetry': 1.0,  # 1% minimo
-            'overstriding': 0.005,        # 0.005 m minimo
-            'knee_flexion_ic': 1.0,       # 1.0° minimo
-            'trunk_lean': 0.5,            # 0.5° minimo
-            'ground_contact_time': 0.01   # 0.01s (10ms) minimo
-        }
+        accumulator = self.baseline_accumulator(view_type, estimator, trim_fraction)
+        for video_data in videos_data:
+            accumulator.add_video(video_data)
+        return self.finalize_baseline_stats(accumulator)
+    
+    def baseline_accumulator(self, view_type: str, estimator: str = 'mean',
+                             trim_fraction: float = DEFAULT_TRIM_FRACTION) -> BaselineAccumulator:
+        """
+        Accumulatore per costruire la baseline un video alla volta
         
-        # Aggrega tutti i dati per calcolare Min/Max (per i grafici)
-        # E raccoglie le medie dei video per calcolare StdDev (per Z-Score)
-        if view_type == 'posterior':
-            all_left_valgus = []  # Per Min/Max
-            all_right_valgus = []  # Per Min/Max
-            all_pelvic_drop = []  # Per Min/Max
-            all_cadence = []  # Per Min/Max
-            all_knee_valgus_symmetry = []  # Per Min/Max
-            
-            # Array per le medie dei video (per calcolare StdDev tra video)
-            video_left_valgus_means = []
-            video_right_valgus_means = []
-            video_pelvic_drop_means = []
-            video_cadence_means = []
-            video_symmetry_means = []
-        else:  # lateral
-            all_overstriding = []  # Per Min/Max
-            all_knee_flexion_ic = []  # Per Min/Max
-            all_trunk_lean = []  # Per Min/Max
-            all_gct = []  # Per Min/Max (ma per GCT usiamo già le medie)
-            
-            # Array per le medie dei video (per calcolare StdDev tra video)
-            video_overstriding_means = []
-            video_knee_flexion_ic_means = []
-            video_trunk_lean_means = []
-            video_gct_means = []
+        Args:
+            view_type: 'posterior' o 'lateral'
+            estimator: Stimatore di centro e dispersione ('mean', 'median' o 'trimmed')
+            trim_fraction: Frazione tolta per lato con 'trimmed'
         
-        total_frames = 0
+        Returns:
+            BaselineAccumulator a cui aggiungere i risultati di process_video
+        """
+        return BaselineAccumulator(view_type, symmetry_fn=self._calculate_symmetry,
+                                   estimator=estimator, trim_fraction=trim_fraction)
+    
+    def finalize_baseline_stats(self, accumulator: BaselineAccumulator) -> Dict:
+        """
+        Statistiche finali della baseline da un accumulatore (vedi create_baseline_stats)
         
-        for video_data in videos_data:
-            if view_type == 'posterior':
-                # Aggrega tutti i frame per Min/Max
-                all_left_valgus.extend(video_data['left_knee_valgus'])
-                all_right_valgus.extend(video_data['right_knee_valgus'])
-                all_pelvic_drop.extend(video_data['pelvic_drop'])
-                
-                # Calcola medie del video per StdDev tra video
-                video_left_valgus_means.append(np.mean(video_data['left_knee_valgus']))
-                video_right_valgus_means.append(np.mean(video_data['right_knee_valgus']))
-                video_pelvic_drop_means.append(np.mean(video_data['pelvic_drop']))
-                
-                # Per la cadenza, usa la media della serie temporale
-                cadence_series = video_data.get('cadence', [])
-                if cadence_series and len(cadence_series) > 0:
-                    cadence_series_filtered = [c for c in cadence_series if c > 0]
-                    if len(cadence_series_filtered) > 0:
-                        cadence_mean = np.mean(cadence_series_filtered)
-                        all_cadence.append(cadence_mean)
-                        video_cadence_means.append(cadence_mean)
-                    else:
-                        avg_cad = video_data.get('avg_cadence', 0.0)
-                        all_cadence.append(avg_cad)
-                        video_cadence_means.append(avg_cad)
-                else:
-                    avg_cad = video_data.get('avg_cadence', 0.0)
-                    all_cadence.append(avg_cad)
-                    video_cadence_means.append(avg_cad)
-                
-                # Per la simmetria, usa la serie temporale se disponibile, altrimenti calcola dalla media
-                symmetry_series = video_data.get('knee_valgus_symmetry', [])
-                if symmetry_series and len(symmetry_series) > 0:
-                    all_knee_valgus_symmetry.extend(symmetry_series)
-                    video_symmetry_means.append(np.mean(symmetry_series))
-                else:
-                    # Calcola simmetria dalla media se la serie non è disponibile
-                    left_mean = np.mean(video_data['left_knee_valgus'])
-                    right_mean = np.mean(video_data['right_knee_valgus'])
-                    symmetry = self._calculate_symmetry(left_mean, right_mean)
-                    all_knee_valgus_symmetry.append(symmetry)
-                    video_symmetry_means.append(symmetry)
-            
-            else:  # lateral
-                # Aggrega tutti i frame per Min/Max
-                all_overstriding.extend(video_data['overstriding'])
-                all_knee_flexion_ic.extend(video_data['knee_flexion_ic'])
-                all_trunk_lean.extend(video_data['trunk_lean'])
-                
-                # Calcola medie del video per StdDev tra video
-                video_overstriding_means.append(np.mean(video_data['overstriding']))
-                video_knee_flexion_ic_means.append(np.mean(video_data['knee_flexion_ic']))
-                video_trunk_lean_means.append(np.mean(video_data['trunk_lean']))
-                
-                # Per GCT, usa la media (già calcolata)
-                avg_gct = video_data.get('avg_gct', 0.0)
-                all_gct.append(avg_gct)
-                video_gct_means.append(avg_gct)
-            
-            total_frames += video_data['n_frames']
+        Args:
+            accumulator: Accumulatore con tutti i video della baseline
         
-        # Calcola statistiche in base al tipo di vista
-        if view_type == 'posterior':
-            # Converti in numpy array per Min/Max
-            all_left_valgus = np.array(all_left_valgus)
-            all_right_valgus = np.array(all_right_valgus)
-            all_pelvic_drop = np.array(all_pelvic_drop)
-            all_cadence = np.array(all_cadence)
-            all_knee_valgus_symmetry = np.array(all_knee_valgus_symmetry)
-            
-            # Converti medie dei video in numpy array per StdDev
-            video_left_valgus_means = np.array(video_left_valgus_means)
-            video_right_valgus_means = np.array(video_right_valgus_means)
-            video_pelvic_drop_means = np.array(video_pelvic_drop_means)
-            video_cadence_means = np.array(video_cadence_means)
-            video_symmetry_means = np.array(video_symmetry_means)
-            
-            # Calcola Mean e StdDev usando le medie dei video (più robusto)
-            # Min e Max rimangono su tutti i frame aggregati (per i grafici)
-            baseline_stats = {
-                'view_type': 'posterior',
-                'left_knee_valgus': {
-                    'mean': float(np.mean(all_left_valgus)),  # Media aggregata (per grafici)
-                    'std': float(max(np.std(video_left_valgus_means), MIN_STD_THRESHOLDS['left_knee_valgus'])),  # StdDev tra video + minimo
-                    'min': float(np.min(all_left_valgus)),
-                    'max': float(np.max(all_left_valgus))
-                },
-                'right_knee_valgus': {
-                    'mean': float(np.mean(all_right_valgus)),
-                    'std': float(max(np.std(video_right_valgus_means), MIN_STD_THRESHOLDS['right_knee_valgus'])),
-                    'min': float(np.min(all_right_valgus)),
-                    'max': float(np.max(all_right_valgus))
-                },
-                'pelvic_drop': {
-                    'mean': float(np.mean(all_pelvic_drop)),
-                    'std': float(max(np.std(video_pelvic_drop_means), MIN_STD_THRESHOLDS['pelvic_drop'])),
-                    'min': float(np.min(all_pelvic_drop)),
-                    'max': float(np.max(all_pelvic_drop))
-                },
-                'cadence': {
-                    'mean': float(np.mean(all_cadence)),
-                    'std': float(max(np.std(video_cadence_means), MIN_STD_THRESHOLDS['cadence'])),
-                    'min': float(np.min(all_cadence)),
-                    'max': float(np.max(all_cadence))
-                },
-                'knee_valgus_symmetry': {
-                    'mean': float(np.mean(all_knee_valgus_symmetry)),
-                    'std': float(max(np.std(video_symmetry_means), MIN_STD_THRESHOLDS['knee_valgus_symmetry'])),
-                    'min': float(np.min(all_knee_valgus_symmetry)),
-                    'max': float(np.max(all_knee_valgus_symmetry))
-                },
-                'n_videos': len(videos_data),
-                'total_frames': total_frames
-            }
-            
+        Returns:
+            Dizionario con statistiche aggregate
+        """
+        baseline_stats = accumulator.stats()
+        
+        if accumulator.estimator != 'mean':
+            logger.info(f"Stimatore robusto: {accumulator.estimator} (μ = centro, ± = dispersione robusta)")
+        if accumulator.view_type == 'posterior':
             logger.info("=== Statistiche Baseline (Vista Posteriore) ===")
             logger.info(f"Valgismo Ginocchio SX: μ={baseline_stats['left_knee_valgus']['mean']:.2f}° ± {baseline_stats['left_knee_valgus']['std']:.2f}°")
             logger.info(f"Valgismo Ginocchio DX: μ={baseline_stats['right_knee_valgus']['mean']:.2f}° ± {baseline_stats['right_knee_valgus']['std']:.2f}°")
             logger.info(f"Simmetria Knee Valgus: μ={baseline_stats['knee_valgus_symmetry']['mean']:.2f}% ± {baseline_stats['knee_valgus_symmetry']['std']:.2f}%")
             logger.info(f"Caduta Pelvica: μ={baseline_stats['pelvic_drop']['mean']:.2f}° ± {baseline_stats['pelvic_drop']['std']:.2f}°")
             logger.info(f"Cadenza: μ={baseline_stats['cadence']['mean']:.1f} ± {baseline_stats['cadence']['std']:.1f} spm")
-        
         else:  # lateral
-            # Converti in numpy array per Min/Max
-            all_overstriding = np.array(all_overstriding)
-            all_knee_flexion_ic = np.array(all_knee_flexion_ic)
-            all_trunk_lean = np.array(all_trunk_lean)
-            all_gct = np.array(all_gct)
-            
-            # Converti medie dei video in numpy array per StdDev
-            video_overstriding_means = np.array(video_overstriding_means)
-            video_knee_flexion_ic_means = np.array(video_knee_flexion_ic_means)
-            video_trunk_lean_means = np.array(video_trunk_lean_means)
-            video_gct_means = np.array(video_gct_means)
-            
-            # Calcola Mean e StdDev usando le medie dei video (più robusto)
-            # Min e Max rimangono su tutti i frame aggregati (per i grafici)
-            baseline_stats = {
-                'view_type': 'lateral',
-                'overstriding': {
-                    'mean': float(np.mean(all_overstriding)),  # Media aggregata (per grafici)
-                    'std': float(max(np.std(video_overstriding_means), MIN_STD_THRESHOLDS['overstriding'])),  # StdDev tra video + minimo
-                    'min': float(np.min(all_overstriding)),
-                    'max': float(np.max(all_overstriding))
-                },
-                'knee_flexion_ic': {
-                    'mean': float(np.mean(all_knee_flexion_ic)),
-                    'std': float(max(np.std(video_knee_flexion_ic_means), MIN_STD_THRESHOLDS['knee_flexion_ic'])),
-                    'min': float(np.min(all_knee_flexion_ic)),
-                    'max': float(np.max(all_knee_flexion_ic))
-                },
-                'trunk_lean': {
-                    'mean': float(np.mean(all_trunk_lean)),
-                    'std': float(max(np.std(video_trunk_lean_means), MIN_STD_THRESHOLDS['trunk_lean'])),
-                    'min': float(np.min(all_trunk_lean)),
-                    'max': float(np.max(all_trunk_lean))
-                },
-                'ground_contact_time': {
-                    'mean': float(np.mean(all_gct)),  # Media delle medie (già calcolata)
-                    'std': float(max(np.std(video_gct_means), MIN_STD_THRESHOLDS['ground_contact_time'])),  # StdDev tra video + minimo
-                    'min': float(np.min(all_gct)),
-                    'max': float(np.max(all_gct))
-                },
-                'n_videos': len(videos_data),
-                'total_frames': total_frames
-            }
-            
             logger.info("=== Statistiche Baseline (Vista Laterale) ===")
             logger.info(f"Overstriding: μ={baseline_stats['overstriding']['mean']:.4f} ± {baseline_stats['overstriding']['std']:.4f}")
             logger.info(f"Flessione Ginocchio @ IC: μ={baseline_stats['knee_flexion_ic']['mean']:.2f}° ± {baseline_stats['knee_flexion_ic']['std']:.2f}°")
@@ -1460,6 +1715,64 @@ class PoseEngine:
         
         return baseline_stats
     
+    def metric_values(self, video_data: Dict, view_type: str, estimator: str = 'mean',
+                      trim_fraction: float = DEFAULT_TRIM_FRACTION) -> Dict[str, float]:
+        """
+        Valore riassuntivo di ogni metrica di un video (quello confrontato con la baseline)
+        
+        Args:
+            video_data: Dati del video (da process_video o dalla cache)
+            view_type: 'posterior' o 'lateral'
+            estimator: Centro delle serie dei frame, lo stesso della baseline
+                ('mean', 'median' o 'trimmed')
+            trim_fraction: Frazione tolta per lato con 'trimmed'
+            
+        Returns:
+            Dizionario metrica -> valore
+        """
+        def center(series):
+            return robust_center(series, estimator, trim_fraction)
+        
+        if view_type == 'posterior':
+            # Calcola valori medi dal video
+            left_valgus_mean = center(video_data['left_knee_valgus'])
+            right_valgus_mean = center(video_data['right_knee_valgus'])
+            
+            # Per la cadenza, usa la media della serie temporale
+            cadence_series = video_data.get('cadence')
+            cadence_series = np.asarray(cadence_series if cadence_series is not None else [], dtype=np.float64)
+            cadence_series = cadence_series[cadence_series > 0]
+            if len(cadence_series) > 0:
+                cadence_value = center(cadence_series)
+                logger.debug(f"  Cadenza: usando media serie temporale = {cadence_value:.1f} spm")
+            else:
+                cadence_value = float(video_data.get('avg_cadence', 0.0))
+                logger.debug(f"  Cadenza: serie temporale non disponibile, usando avg_cadence = {cadence_value:.1f} spm")
+            
+            # Per la simmetria, usa la media della serie temporale se disponibile, altrimenti calcola
+            symmetry_value = video_data.get('avg_knee_valgus_symmetry', None)
+            symmetry_series = video_data.get('knee_valgus_symmetry')
+            if estimator != 'mean' and symmetry_series is not None and len(symmetry_series) > 0:
+                symmetry_value = center(symmetry_series)
+            if symmetry_value is None:
+                symmetry_value = self._calculate_symmetry(left_valgus_mean, right_valgus_mean)
+                logger.debug(f"  Simmetria: calcolata dalla media = {symmetry_value:.2f}%")
+            
+            return {
+                'left_knee_valgus': left_valgus_mean,
+                'right_knee_valgus': right_valgus_mean,
+                'pelvic_drop': center(video_data['pelvic_drop']),
+                'cadence': cadence_value,
+                'knee_valgus_symmetry': float(symmetry_value)
+            }
+        
+        return {
+            'overstriding': center(video_data['overstriding']),
+            'knee_flexion_ic': center(video_data['knee_flexion_ic']),
+            'trunk_lean': center(video_data['trunk_lean']),
+            'ground_contact_time': float(video_data.get('avg_gct', 0.0))
+        }
+    
     def calculate_z_scores(self, video_data: Dict, baseline_stats: Dict) -> Dict:
         """
         Calcola Z-Score per ogni metrica confrontando con baseline
@@ -1511,34 +1824,16 @@ class PoseEngine:
             else:
                 return 'Critico', '#ef4444'  # Rosso
         
+        # Con una baseline robusta il video è riassunto con lo stesso stimatore
+        values = self.metric_values(video_data, view_type, baseline_stats.get('estimator', 'mean'),
+                                    baseline_stats.get('trim_fraction', DEFAULT_TRIM_FRACTION))
+        
         if view_type == 'posterior':
-            # Calcola valori medi dal video
-            left_valgus_mean = np.mean(video_data['left_knee_valgus'])
-            right_valgus_mean = np.mean(video_data['right_knee_valgus'])
-            pelvic_drop_mean = np.mean(video_data['pelvic_drop'])
-            
-            # Per la cadenza, usa la media della serie temporale
-            cadence_series = video_data.get('cadence', [])
-            if cadence_series and len(cadence_series) > 0:
-                cadence_series_filtered = [c for c in cadence_series if c > 0]
-                if len(cadence_series_filtered) > 0:
-                    cadence_value = np.mean(cadence_series_filtered)
-                    logger.info(f"  Cadenza: usando media serie temporale = {cadence_value:.1f} spm")
-                else:
-                    cadence_value = video_data.get('avg_cadence', 0.0)
-                    logger.warning(f"  Cadenza: serie temporale vuota, usando avg_cadence = {cadence_value:.1f} spm")
-            else:
-                cadence_value = video_data.get('avg_cadence', 0.0)
-                logger.warning(f"  Cadenza: serie temporale non disponibile, usando avg_cadence = {cadence_value:.1f} spm")
-            
-            # Per la simmetria, usa la media della serie temporale se disponibile, altrimenti calcola
-            symmetry_value = video_data.get('avg_knee_valgus_symmetry', None)
-            if symmetry_value is None:
-                # Calcola simmetria dalla media se non disponibile
-                symmetry_value = self._calculate_symmetry(left_valgus_mean, right_valgus_mean)
-                logger.info(f"  Simmetria: calcolata dalla media = {symmetry_value:.2f}%")
-            else:
-                logger.info(f"  Simmetria: usando avg_knee_valgus_symmetry = {symmetry_value:.2f}%")
+            left_valgus_mean = values['left_knee_valgus']
+            right_valgus_mean = values['right_knee_valgus']
+            pelvic_drop_mean = values['pelvic_drop']
+            cadence_value = values['cadence']
+            symmetry_value = values['knee_valgus_symmetry']
             
             # Calcola Z-scores
             z_left_valgus = (left_valgus_mean - baseline_stats['left_knee_valgus']['mean']) / \
@@ -1627,11 +1922,10 @@ class PoseEngine:
             }
         
         else:  # lateral
-            # Calcola valori medi dal video
-            overstriding_mean = np.mean(video_data['overstriding'])
-            knee_flexion_ic_mean = np.mean(video_data['knee_flexion_ic'])
-            trunk_lean_mean = np.mean(video_data['trunk_lean'])
-            gct_value = video_data.get('avg_gct', 0.0)
+            overstriding_mean = values['overstriding']
+            knee_flexion_ic_mean = values['knee_flexion_ic']
+            trunk_lean_mean = values['trunk_lean']
+            gct_value = values['ground_contact_time']
             
             # Calcola Z-scores
             z_overstriding = (overstriding_mean - baseline_stats['overstriding']['mean']) / \
@@ -0,0 +1,325 @@
+"""
+Pre-riscaldamento della cache PoseEngine per archivi di video
+
+Scorre una cartella (ricorsivamente), elabora ogni video supportato per le viste
+e gli FPS richiesti su un pool di processi limitato e salva i risultati in
+cache/pose_engine. Un manifest JSON permette di riprendere un'esecuzione interrotta.
+
+Uso:
+    python prewarm_cache.py /percorso/archivio --views posterior lateral --fps 30 60 --workers 4
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from config import Config
+from pose_engine import PoseEngine
+
+logger = logging.getLogger('PREWARM')
+
+MANIFEST_VERSION = '1.0'
+DEFAULT_MANIFEST_PATH = os.path.join(PoseEngine.CACHE_DIR, 'prewarm_manifest.json')
+
+
+def is_supported_video(filename: str) -> bool:
+    """Controlla se il file ha un'estensione video permessa (Config.ALLOWED_EXTENSIONS)"""
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
+
+
+def find_videos(root_dir: str) -> List[str]:
+    """
+    Trova ricorsivamente tutti i video supportati in una cartella
+
+    Args:
+        root_dir: Cartella radice dell'archivio
+
+    Returns:
+        Lista ordinata di percorsi assoluti
+    """
+    videos = []
+    for dirpath, _, filenames in os.walk(root_dir):
+        for filename in filenames:
+            if is_supported_video(filename):
+                videos.append(os.path.abspath(os.path.join(dirpath, filename)))
+    return sorted(videos)
+
+
+def _entry_key(video_path: str, view_type: str, fps: float) -> str:
+    """Chiave del manifest per una combinazione video/vista/fps"""
+    return f"{video_path}|{view_type}|{fps}"
+
+
+def _file_signature(video_path: str) -> Tuple[int, float]:
+    """Dimensione e mtime del file, per capire se una voce del manifest è ancora valida"""
+    stat = os.stat(video_path)
+    return stat.st_size, stat.st_mtime
+
+
+def _new_engine() -> PoseEngine:
+    """Crea un PoseEngine con gli stessi parametri usati dall'API (stessa chiave cache)"""
+    return PoseEngine(
+        model_complexity=Config.MEDIAPIPE_MODEL_COMPLEXITY,
+        min_detection_confidence=Config.MEDIAPIPE_MIN_DETECTION_CONFIDENCE,
+        min_tracking_confidence=Config.MEDIAPIPE_MIN_TRACKING_CONFIDENCE,
+        use_cache=True,
+        generate_skeleton_video=False,
+        enable_segmentation=False
+    )
+
+
+def load_manifest(manifest_path: str) -> Dict:
+    """
+    Carica il manifest di un'esecuzione precedente (o ne crea uno vuoto)
+
+    Args:
+        manifest_path: Percorso del file manifest JSON
+
+    Returns:
+        Dizionario del manifest
+    """
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+            if manifest.get('version') == MANIFEST_VERSION:
+                return manifest
+            logger.warning(f"⚠ Versione manifest non compatibile, ricreazione: {manifest_path}")
+        except Exception as e:
+            logger.warning(f"⚠ Errore nel caricare il manifest, ricreazione: {e}")
+    return {
+        'version': MANIFEST_VERSION,
+        'created_at': datetime.now().isoformat(),
+        'entries': {}
+    }
+
+
+def save_manifest(manifest: Dict, manifest_path: str):
+    """Salva il manifest in modo atomico (un'interruzione non lo corrompe)"""
+    os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+    manifest['updated_at'] = datetime.now().isoformat()
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def _prewarm_worker(video_path: str, view_type: str, fps: float) -> Dict:
+    """
+    Elabora un singolo video in un processo del pool
+
+    MediaPipe non è thread-safe: ogni processo crea il proprio PoseEngine.
+
+    Returns:
+        Dizionario con frame elaborati e tempo impiegato
+    """
+    start = time.perf_counter()
+    engine = _new_engine()
+    result = engine.process_video(video_path, fps=fps, view_type=view_type)
+    return {
+        'n_frames': int(result.get('n_frames', 0)),
+        'elapsed': time.perf_counter() - start
+    }
+
+
+def prewarm(root_dir: str, view_types: List[str], fps_values: List[float],
+            workers: int = 1, manifest_path: str = DEFAULT_MANIFEST_PATH,
+            retry_failed: bool = True) -> Dict:
+    """
+    Riempie la cache PoseEngine per tutti i video di un archivio
+
+    Args:
+        root_dir: Cartella radice dell'archivio
+        view_types: Viste da elaborare ('posterior' e/o 'lateral')
+        fps_values: FPS da usare (devono coincidere con quelli inviati all'API)
+        workers: Numero massimo di processi paralleli
+        manifest_path: Percorso del manifest per riprendere l'esecuzione
+        retry_failed: Se True, ritenta le voci fallite in esecuzioni precedenti
+
+    Returns:
+        Dizionario con le statistiche dell'esecuzione
+    """
+    videos = find_videos(root_dir)
+    manifest = load_manifest(manifest_path)
+    entries = manifest['entries']
+
+    logger.info(f"📁 Archivio: {root_dir} ({len(videos)} video supportati)")
+    logger.info(f"📊 Viste: {view_types}, FPS: {fps_values}, Processi: {workers}")
+
+    stats = {
+        'videos_found': len(videos),
+        'tasks_total': 0,
+        'processed': 0,
+        'skipped_cached': 0,
+        'skipped_manifest': 0,
+        'skipped_failed': 0,
+        'failed': 0,
+        'frames_processed': 0,
+        'processing_seconds': 0.0,
+        'wall_seconds': 0.0
+    }
+
+    # Costruisci la lista dei task saltando quelli già in cache o completati
+    engine = _new_engine()
+    tasks = []
+    for video_path in videos:
+        try:
+            size, mtime = _file_signature(video_path)
+        except OSError as e:
+            logger.warning(f"⚠ Video non leggibile, saltato: {video_path} ({e})")
+            continue
+
+        for view_type in view_types:
+            for fps in fps_values:
+                stats['tasks_total'] += 1
+                key = _entry_key(video_path, view_type, fps)
+                entry = entries.get(key)
+                same_file = entry is not None and entry.get('size') == size and entry.get('mtime') == mtime
+
+                if same_file and entry.get('status') in ('done', 'cached'):
+                    stats['skipped_manifest'] += 1
+                    continue
+                if same_file and entry.get('status') == 'failed' and not retry_failed:
+                    stats['skipped_failed'] += 1
+                    continue
+                if engine.is_cached(video_path, fps, view_type):
+                    entries[key] = {'status': 'cached', 'size': size, 'mtime': mtime}
+                    stats['skipped_cached'] += 1
+                    continue
+
+                tasks.append((video_path, view_type, fps, size, mtime))
+
+    save_manifest(manifest, manifest_path)
+    logger.info(f"🔄 Task da elaborare: {len(tasks)}/{stats['tasks_total']}")
+
+    wall_start = time.perf_counter()
+    pending = {}
+    task_iter = iter(tasks)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        def submit_next() -> bool:
+            task = next(task_iter, None)
+            if task is None:
+                return False
+            future = executor.submit(_prewarm_worker, task[0], task[1], task[2])
+            pending[future] = task
+            return True
+
+        # Mantieni al massimo 2 task in coda per processo (memoria limitata)
+        for _ in range(workers * 2):
+            if not submit_next():
+                break
+
+        while pending:
+            done, _ = wait(list(pending.keys()), return_when=FIRST_COMPLETED)
+            for future in done:
+                video_path, view_type, fps, size, mtime = pending.pop(future)
+                key = _entry_key(video_path, view_type, fps)
+                try:
+                    outcome = future.result()
+                    entries[key] = {
+                        'status': 'done',
+                        'size': size,
+                        'mtime': mtime,
+                        'n_frames': outcome['n_frames'],
+                        'elapsed': round(outcome['elapsed'], 3)
+                    }
+                    stats['processed'] += 1
+                    stats['frames_processed'] += outcome['n_frames']
+                    stats['processing_seconds'] += outcome['elapsed']
+                    logger.info(f"✓ {os.path.basename(video_path)} [{view_type}, {fps} fps]: "
+                                f"{outcome['n_frames']} frame in {outcome['elapsed']:.1f}s")
+                except Exception as e:
+                    entries[key] = {
+                        'status': 'failed',
+                        'size': size,
+                        'mtime': mtime,
+                        'error': f"{type(e).__name__}: {e}"
+                    }
+                    stats['failed'] += 1
+                    logger.error(f"❌ {os.path.basename(video_path)} [{view_type}, {fps} fps]: {e}")
+
+                save_manifest(manifest, manifest_path)
+                submit_next()
+
+    stats['wall_seconds'] = time.perf_counter() - wall_start
+    return stats
+
+
+def print_stats(stats: Dict):
+    """Stampa le statistiche di throughput dell'esecuzione"""
+    wall = stats['wall_seconds']
+    print("=" * 60)
+    print("Pre-riscaldamento cache PoseEngine")
+    print("=" * 60)
+    print(f"Video trovati:            {stats['videos_found']}")
+    print(f"Task totali:              {stats['tasks_total']}")
+    print(f"Elaborati:                {stats['processed']}")
+    print(f"Già in cache:             {stats['skipped_cached']}")
+    print(f"Già completati (manifest): {stats['skipped_manifest']}")
+    if stats['skipped_failed']:
+        print(f"Falliti in precedenza:    {stats['skipped_failed']}")
+    print(f"Falliti:                  {stats['failed']}")
+    print(f"Frame elaborati:          {stats['frames_processed']}")
+    print(f"Tempo totale:             {wall:.1f}s")
+    if wall > 0 and stats['processed'] > 0:
+        print(f"Throughput:               {stats['processed'] / wall * 60:.2f} video/min, "
+              f"{stats['frames_processed'] / wall:.1f} frame/s")
+        print(f"Tempo medio per video:    {stats['processing_seconds'] / stats['processed']:.1f}s "
+              f"(parallelismo effettivo {stats['processing_seconds'] / wall:.2f}x)")
+    print("=" * 60)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Elabora in anticipo un archivio di video per riempire la cache PoseEngine'
+    )
+    parser.add_argument('root_dir', help='Cartella radice dell\'archivio video')
+    parser.add_argument('--views', nargs='+', default=['posterior'],
+                        choices=['posterior', 'lateral'], help='Viste da elaborare')
+    parser.add_argument('--fps', nargs='+', type=float, required=True,
+                        help='FPS da usare (gli stessi inviati all\'API, es. 30 60)')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='Numero massimo di processi paralleli')
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST_PATH,
+                        help='Percorso del manifest per riprendere un\'esecuzione interrotta')
+    parser.add_argument('--skip-failed', action='store_true',
+                        help='Non ritentare i video falliti in esecuzioni precedenti')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(asctime)s] [%(name)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    # I log dettagliati del PoseEngine coprirebbero il progresso del pre-riscaldamento
+    logging.getLogger('POSE_ENGINE').setLevel(logging.WARNING)
+
+    if not os.path.isdir(args.root_dir):
+        print(f"❌ Cartella non trovata: {args.root_dir}")
+        return 1
+    if args.workers < 1:
+        print("❌ --workers deve essere almeno 1")
+        return 1
+
+    stats = prewarm(
+        args.root_dir,
+        view_types=args.views,
+        fps_values=args.fps,
+        workers=args.workers,
+        manifest_path=args.manifest,
+        retry_failed=not args.skip_failed
+    )
+    print_stats(stats)
+    return 0 if stats['failed'] == 0 else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
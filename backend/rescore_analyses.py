@@ -0,0 +1,236 @@
+"""
+Rivalutazione in blocco delle analisi rispetto a una baseline
+
+Carica le analisi salvate (saved_analyses/) e i risultati di elaborazione in
+cache (cache/pose_engine) della stessa vista della baseline e li valuta tutti
+insieme (scoring.score_records), senza ricaricare i video.
+
+Uso:
+    python rescore_analyses.py --baseline current --sources saved cache --csv rescoring.csv
+"""
+import argparse
+import csv
+import glob
+import io
+import json
+import logging
+import os
+import pickle
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from baseline_manager import BaselineHistory
+from cache_stats import view_type_from_cache_path
+from config import Config
+from pose_engine import PoseEngine
+from running_stats import DEFAULT_TRIM_FRACTION
+from scoring import score_records
+
+logger = logging.getLogger('RESCORING')
+
+SOURCES = ('saved', 'cache')
+
+
+def load_baseline(name: str, allow_paths: bool = True) -> Dict:
+    """
+    Statistiche della baseline da usare per la rivalutazione
+
+    Args:
+        name: 'current' (baseline.json), 'incremental' (baseline incrementale),
+            oppure nome o percorso di una baseline salvata con /api/save_baseline
+        allow_paths: False per accettare solo nomi di file in Config.SAVED_ANALYSES_FOLDER
+            (richieste dei client: un percorso non deve poter leggere altri file)
+
+    Returns:
+        Statistiche baseline
+
+    Raises:
+        ValueError: Se la baseline non esiste
+    """
+    if name == 'current':
+        path = os.path.join(Config.MODEL_FOLDER, 'baseline.json')
+        if not os.path.exists(path):
+            raise ValueError('Nessuna baseline corrente: crearne una con /api/create_baseline')
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    if name == 'incremental':
+        history = BaselineHistory(os.path.join(Config.MODEL_FOLDER, 'baseline_history.json'),
+                                  Config.GHOST_FRAMES_FOLDER)
+        baseline_stats = history.get_current_baseline()
+        if baseline_stats is None:
+            raise ValueError('Baseline incrementale vuota')
+        return baseline_stats
+
+    saved_path = os.path.join(Config.SAVED_ANALYSES_FOLDER, os.path.basename(name))
+    candidates = [name, saved_path] if allow_paths else [saved_path]
+    candidates += [f"{path}.json" for path in candidates]
+    path = next((p for p in candidates if os.path.isfile(p)), None)
+    if path is None:
+        raise ValueError(f'Baseline non trovata: {name}')
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    # Le baseline salvate contengono le statistiche originali in 'raw_baseline_stats'
+    baseline_stats = data.get('raw_baseline_stats', data)
+    if 'view_type' not in baseline_stats:
+        raise ValueError(f'File senza statistiche baseline: {os.path.basename(path)}')
+    return baseline_stats
+
+
+def saved_analysis_records(folder: str, view_type: str) -> Tuple[List[Dict], int]:
+    """
+    Valori delle metriche delle analisi salvate con /api/save_analysis
+
+    Returns:
+        Tupla (record, file saltati: altra vista, baseline o non leggibili)
+    """
+    records, skipped = [], 0
+    for path in sorted(glob.glob(os.path.join(folder, '*.json'))):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠ Analisi non leggibile, saltata: {os.path.basename(path)} ({e})")
+            skipped += 1
+            continue
+        metrics = data.get('metrics')
+        if data.get('type') == 'baseline' or not isinstance(metrics, dict) or \
+                data.get('viewType', data.get('view_type', 'posterior')) != view_type:
+            skipped += 1
+            continue
+        values = {key: metric['value'] for key, metric in metrics.items()
+                  if isinstance(metric, dict) and metric.get('value') is not None}
+        records.append({'source': 'saved', 'name': os.path.basename(path), 'values': values})
+    return records, skipped
+
+
+def cache_records(cache_dir: str, view_type: str, engine: PoseEngine, estimator: str = 'mean',
+                  trim_fraction: float = DEFAULT_TRIM_FRACTION) -> Tuple[List[Dict], int]:
+    """
+    Valori delle metriche dei risultati in cache (solo voci con le metriche della versione corrente)
+
+    Le serie dei frame sono riassunte con lo stimatore della baseline (vedi PoseEngine.metric_values).
+
+    Returns:
+        Tupla (record, voci saltate: obsolete o non leggibili)
+    """
+    records, skipped = [], 0
+    # La vista è nel nome del file: le voci dell'altra vista non vengono aperte
+    for path in sorted(glob.glob(os.path.join(cache_dir, f'{view_type}_*.pkl'))):
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+            meta = result.get('cache_meta') or {}
+            if meta.get('metrics_version') != PoseEngine.METRICS_VERSION:
+                skipped += 1
+                continue
+            values = engine.metric_values(result, view_type_from_cache_path(path), estimator, trim_fraction)
+        except Exception as e:
+            logger.warning(f"⚠ Voce cache non valutabile, saltata: {os.path.basename(path)} ({type(e).__name__}: {e})")
+            skipped += 1
+            continue
+        name = os.path.basename(meta.get('source_video_path') or path)
+        records.append({'source': 'cache', 'name': name, 'values': values})
+    return records, skipped
+
+
+def rescore(baseline_stats: Dict, sources: Iterable[str] = SOURCES,
+            saved_folder: str = Config.SAVED_ANALYSES_FOLDER,
+            cache_dir: str = PoseEngine.CACHE_DIR,
+            engine: Optional[PoseEngine] = None) -> Dict:
+    """
+    Valuta tutte le analisi delle sorgenti indicate rispetto alla baseline
+
+    Args:
+        baseline_stats: Statistiche baseline (vedi load_baseline)
+        sources: 'saved' (analisi salvate) e/o 'cache' (risultati PoseEngine in cache)
+        saved_folder: Cartella delle analisi salvate
+        cache_dir: Cartella della cache PoseEngine
+        engine: PoseEngine per i valori delle voci in cache (creato se None)
+
+    Returns:
+        Tabella di scoring.score_records con 'skipped' (per sorgente) e 'elapsed_seconds'
+    """
+    start = time.perf_counter()
+    view_type = baseline_stats.get('view_type', 'posterior')
+    records, skipped = [], {}
+    if 'saved' in sources:
+        found, skipped['saved'] = saved_analysis_records(saved_folder, view_type)
+        records += found
+    if 'cache' in sources:
+        found, skipped['cache'] = cache_records(cache_dir, view_type, engine or PoseEngine(use_cache=False),
+                                                baseline_stats.get('estimator', 'mean'),
+                                                baseline_stats.get('trim_fraction', DEFAULT_TRIM_FRACTION))
+        records += found
+
+    table = score_records(records, baseline_stats)
+    table['skipped'] = skipped
+    table['elapsed_seconds'] = round(time.perf_counter() - start, 3)
+    logger.info(f"📊 Rivalutate {len(records)} analisi [{view_type}] in {table['elapsed_seconds']:.2f}s: "
+                f"{table['by_level']}")
+    return table
+
+
+def table_to_csv(table: Dict) -> str:
+    """Tabella in formato CSV"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(table['columns'])
+    writer.writerows(table['rows'])
+    return buffer.getvalue()
+
+
+def print_table(table: Dict, limit: int):
+    """Stampa le analisi con |Z| massimo più alto"""
+    columns = table['columns']
+    name_col, max_col, status_col = columns.index('name'), columns.index('max_z_score'), columns.index('overall_status')
+    print("=" * 72)
+    print(f"{'Sorgente':<10}{'Analisi':<40}{'|Z| max':>10}  {'Stato'}")
+    print("-" * 72)
+    for row in table['rows'][:limit]:
+        max_z = f"{row[max_col]:.2f}" if row[max_col] is not None else '-'
+        print(f"{row[0]:<10}{row[name_col][:38]:<40}{max_z:>10}  {row[status_col]}")
+    if len(table['rows']) > limit:
+        print(f"... altre {len(table['rows']) - limit} analisi (usa --csv per la tabella completa)")
+    print("-" * 72)
+    print(f"Totale: {len(table['rows'])} analisi in {table['elapsed_seconds']:.2f}s  {table['by_level']}")
+    print(f"Saltate: {table['skipped']}")
+    print("=" * 72)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Rivaluta le analisi salvate e in cache rispetto a una baseline')
+    parser.add_argument('--baseline', default='current',
+                        help="'current', 'incremental' o nome/percorso di una baseline salvata")
+    parser.add_argument('--sources', nargs='+', default=list(SOURCES), choices=SOURCES,
+                        help='Analisi da rivalutare')
+    parser.add_argument('--csv', help='Scrive la tabella completa in questo file CSV')
+    parser.add_argument('--limit', type=int, default=20, help='Righe da stampare')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(asctime)s] [%(name)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        handlers=[logging.StreamHandler(sys.stdout)]
+    )
+    logging.getLogger('POSE_ENGINE').setLevel(logging.WARNING)
+
+    try:
+        baseline_stats = load_baseline(args.baseline)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    table = rescore(baseline_stats, sources=args.sources)
+    print_table(table, args.limit)
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            f.write(table_to_csv(table))
+        print(f"💾 Tabella salvata: {args.csv}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
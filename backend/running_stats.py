@@ -0,0 +1,538 @@
+"""
+Statistiche incrementali della baseline
+
+La baseline si costruisce aggiungendo un video alla volta: di ogni video si
+tengono solo accumulatori numericamente stabili (Welford: conteggio, media,
+M2, min, max), non le serie dei frame. La memoria non cresce con il numero di
+video e le statistiche sono disponibili anche a metà elaborazione.
+
+Con pochi video un solo video anomalo sposta media e StdDev: la baseline può
+usare stimatori robusti (mediana/MAD o media troncata), calcolati con
+selezione O(n) (np.partition). La distribuzione dei valori dei frame è
+riassunta in uno sketch dei quantili di dimensione fissa (QuantileSketch),
+usato per i livelli di anomalia basati sui percentili.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Soglie minime per StdDev (per evitare StdDev troppo piccole)
+MIN_STD_THRESHOLDS = {
+    'left_knee_valgus': 0.5,      # 0.5° minimo
+    'right_knee_valgus': 0.5,     # 0.5° minimo
+    'pelvic_drop': 0.3,           # 0.3° minimo
+    'cadence': 2.0,               # 2 spm minimo
+    'knee_valgus_symmetry': 1.0,  # 1% minimo
+    'overstriding': 0.005,        # 0.005 m minimo
+    'knee_flexion_ic': 1.0,       # 1.0° minimo
+    'trunk_lean': 0.5,            # 0.5° minimo
+    'ground_contact_time': 0.01   # 0.01s (10ms) minimo
+}
+
+# Metriche della baseline per vista, nell'ordine del JSON
+BASELINE_METRICS = {
+    'posterior': ['left_knee_valgus', 'right_knee_valgus', 'pelvic_drop', 'cadence', 'knee_valgus_symmetry'],
+    'lateral': ['overstriding', 'knee_flexion_ic', 'trunk_lean', 'ground_contact_time']
+}
+
+# Metriche usate per scegliere il video più vicino alla media (Ghost Vision)
+REPRESENTATIVE_METRICS = {
+    'posterior': ['left_knee_valgus', 'right_knee_valgus', 'pelvic_drop'],
+    'lateral': ['overstriding', 'knee_flexion_ic', 'trunk_lean']
+}
+
+# Stimatori di centro e dispersione della baseline
+#   'mean':    media e StdDev
+#   'median':  mediana e MAD (scalata a StdDev per dati normali)
+#   'trimmed': media troncata e StdDev winsorizzata (trim_fraction per lato)
+ESTIMATORS = ('mean', 'median', 'trimmed')
+DEFAULT_TRIM_FRACTION = 0.2
+MAD_TO_STD = 1.4826
+IQR_TO_STD = 1.349
+
+# Punti dello sketch dei quantili e percentili riportati nella baseline
+SKETCH_SIZE = 128
+BASELINE_PERCENTILES = (1.0, 2.5, 5.0, 25.0, 50.0, 75.0, 95.0, 97.5, 99.0)
+# Differenza relativa sotto la quale due punti dello sketch sono lo stesso valore
+TIE_TOLERANCE = 1e-9
+
+
+def _series(video_data: Dict, key: str):
+    """Serie temporale opzionale di un video (lista vuota se assente)"""
+    series = video_data.get(key)
+    return series if series is not None else []
+
+
+def select_median(values) -> float:
+    """Mediana con selezione O(n) (np.partition), NaN se non ci sono valori"""
+    values = np.asarray(values, dtype=np.float64).ravel()
+    n = len(values)
+    if n == 0:
+        return float('nan')
+    kth = [(n - 1) // 2, n // 2]
+    part = np.partition(values, kth)
+    return float(0.5 * (part[kth[0]] + part[kth[1]]))
+
+
+def median_abs_deviation(values, center: Optional[float] = None) -> float:
+    """MAD: mediana delle distanze assolute dal centro (default la mediana)"""
+    values = np.asarray(values, dtype=np.float64).ravel()
+    if len(values) == 0:
+        return float('nan')
+    if center is None:
+        center = select_median(values)
+    return select_median(np.abs(values - center))
+
+
+def _trimmed_bounds(n: int, trim_fraction: float) -> Tuple[int, int]:
+    """Primo e ultimo rango tenuti dopo aver tolto trim_fraction dei valori per lato"""
+    k = int(trim_fraction * n)
+    k = min(k, (n - 1) // 2)
+    return k, n - k - 1
+
+
+def trimmed_mean(values, trim_fraction: float = DEFAULT_TRIM_FRACTION) -> float:
+    """Media senza la frazione trim_fraction di valori più bassi e più alti (selezione O(n))"""
+    values = np.asarray(values, dtype=np.float64).ravel()
+    if len(values) == 0:
+        return float('nan')
+    lo, hi = _trimmed_bounds(len(values), trim_fraction)
+    part = np.partition(values, [lo, hi])
+    return float(part[lo:hi + 1].mean())
+
+
+def winsorized_std(values, trim_fraction: float = DEFAULT_TRIM_FRACTION) -> float:
+    """StdDev con i valori oltre i ranghi tenuti da trimmed_mean riportati al limite"""
+    values = np.asarray(values, dtype=np.float64).ravel()
+    if len(values) < 2:
+        return 0.0
+    lo, hi = _trimmed_bounds(len(values), trim_fraction)
+    part = np.partition(values, [lo, hi])
+    return float(np.clip(values, part[lo], part[hi]).std())
+
+
+def robust_center(values, estimator: str = 'mean', trim_fraction: float = DEFAULT_TRIM_FRACTION) -> float:
+    """Centro dei valori secondo lo stimatore ('mean', 'median' o 'trimmed')"""
+    if estimator == 'median':
+        return select_median(values)
+    if estimator == 'trimmed':
+        return trimmed_mean(values, trim_fraction)
+    values = np.asarray(values, dtype=np.float64)
+    return float(values.mean()) if values.size else float('nan')
+
+
+def robust_spread(values, estimator: str = 'mean', trim_fraction: float = DEFAULT_TRIM_FRACTION) -> float:
+    """Dispersione dei valori secondo lo stimatore, in scala StdDev"""
+    if estimator == 'median':
+        return MAD_TO_STD * median_abs_deviation(values)
+    if estimator == 'trimmed':
+        return winsorized_std(values, trim_fraction)
+    values = np.asarray(values, dtype=np.float64)
+    return float(values.std()) if values.size else 0.0
+
+
+class RunningStats:
+    """Media, varianza (Welford), min e max di una sequenza di valori aggiunti a blocchi"""
+
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def push(self, value: float):
+        """Aggiunge un valore"""
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def push_many(self, values):
+        """Aggiunge un blocco di valori (combinazione di Chan et al. con le statistiche del blocco)"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values) == 0:
+            return
+        block_mean = float(values.mean())
+        block_m2 = float(np.square(values - block_mean).sum())
+        self._combine(len(values), block_mean, block_m2, float(values.min()), float(values.max()))
+
+    def merge(self, other: 'RunningStats'):
+        """Aggiunge i valori accumulati da un altro RunningStats"""
+        if other.count:
+            self._combine(other.count, other.mean, other.m2, other.min, other.max)
+
+    def _combine(self, count: int, mean: float, m2: float, min_value: float, max_value: float):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, min_value)
+        self.max = max(self.max, max_value)
+
+    @property
+    def variance(self) -> float:
+        """Varianza della popolazione (come np.var), 0 con meno di due valori"""
+        return self.m2 / self.count if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.variance))
+
+    def to_dict(self) -> Dict:
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2, 'min': self.min, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'RunningStats':
+        stats = cls()
+        stats.count = int(data['count'])
+        stats.mean = float(data['mean'])
+        stats.m2 = float(data['m2'])
+        stats.min = float(data['min'])
+        stats.max = float(data['max'])
+        return stats
+
+
+class ExponentialStats:
+    """
+    Media e varianza a pesi esponenziali (i valori recenti contano di più)
+
+    Aggiornamento incrementale di West: con peso alpha la media segue le
+    variazioni lente del corridore, la varianza è quella attorno alla media mobile.
+    """
+
+    __slots__ = ('alpha', 'mean', 'var', 'count')
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+
+    def push(self, value: float):
+        """Aggiunge un valore (il primo inizializza la media)"""
+        value = float(value)
+        self.count += 1
+        if self.count == 1:
+            self.mean = value
+            self.var = 0.0
+            return
+        delta = value - self.mean
+        increment = self.alpha * delta
+        self.mean += increment
+        self.var = (1.0 - self.alpha) * (self.var + delta * increment)
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.var))
+
+    def to_dict(self) -> Dict:
+        return {'alpha': self.alpha, 'mean': self.mean, 'var': self.var, 'std': self.std, 'count': self.count}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ExponentialStats':
+        stats = cls(float(data['alpha']))
+        stats.mean = float(data['mean'])
+        stats.var = float(data['var'])
+        stats.count = int(data['count'])
+        return stats
+
+
+class QuantileSketch:
+    """
+    Riassunto dei quantili di una sequenza di valori in memoria fissa
+
+    Tiene al massimo size punti (valore, peso) ordinati. Ogni blocco aggiunto
+    viene ridotto ai suoi size quantili con una selezione O(n) (np.partition);
+    quando i punti superano size, quelli vicini per rango vengono fusi (media
+    pesata). L'errore sul rango è dell'ordine di 1/size e lo sketch si
+    combina con quello di altri video (merge).
+    """
+
+    __slots__ = ('size', 'values', 'weights')
+
+    def __init__(self, size: int = SKETCH_SIZE):
+        self.size = size
+        self.values = np.zeros(0, dtype=np.float64)
+        self.weights = np.zeros(0, dtype=np.float64)
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def push_many(self, values):
+        """Aggiunge un blocco di valori (i NaN sono ignorati)"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        n = len(values)
+        if n == 0:
+            return
+        if n > self.size:
+            kth = ((np.arange(self.size) + 0.5) * n / self.size).astype(np.int64)
+            summary = np.partition(values, kth)[kth]
+            weights = np.full(self.size, n / self.size)
+        else:
+            summary, weights = values, np.ones(n)
+        self._add(summary, weights)
+
+    def merge(self, other: 'QuantileSketch'):
+        """Aggiunge i valori riassunti da un altro sketch"""
+        if len(other.values):
+            self._add(other.values, other.weights)
+
+    def _add(self, values: np.ndarray, weights: np.ndarray):
+        values = np.concatenate([self.values, values])
+        weights = np.concatenate([self.weights, weights])
+        order = np.argsort(values, kind='stable')
+        values, weights = values[order], weights[order]
+        if len(values) > self.size:
+            # Punti raggruppati per rango in size intervalli di peso uguale
+            cum = np.cumsum(weights)
+            bins = np.minimum(((cum - 0.5 * weights) / cum[-1] * self.size).astype(np.int64), self.size - 1)
+            merged_weights = np.bincount(bins, weights, minlength=self.size)
+            keep = merged_weights > 0
+            merged_values = np.bincount(bins, weights * values, minlength=self.size)[keep] / merged_weights[keep]
+            values, weights = merged_values, merged_weights[keep]
+        self.values, self.weights = values, weights
+
+    def _ranks(self) -> np.ndarray:
+        """Rango (0-1) di ogni punto: centro del suo peso cumulato"""
+        cum = np.cumsum(self.weights)
+        return (cum - 0.5 * self.weights) / cum[-1]
+
+    def quantile(self, q) -> np.ndarray:
+        """Quantili q (0-1, scalare o array); NaN se lo sketch è vuoto"""
+        q = np.asarray(q, dtype=np.float64)
+        if len(self.values) == 0:
+            return np.full(q.shape, np.nan)
+        return np.interp(q, self._ranks(), self.values)
+
+    def _distinct(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Punti con valori uguali (a meno dell'arrotondamento delle fusioni) riuniti in uno con la somma dei pesi"""
+        values = self.values
+        tolerance = TIE_TOLERANCE * np.maximum(1.0, np.abs(values[1:]))
+        first = np.r_[True, np.diff(values) > tolerance]
+        groups = np.cumsum(first) - 1
+        return values[first], np.bincount(groups, self.weights)
+
+    def cdf(self, x) -> np.ndarray:
+        """
+        Rango medio stimato di x (0-1, scalare o array, NaN resta NaN)
+
+        Per un valore presente nello sketch il rango è il centro del peso dei
+        valori uguali (frazione < x più metà di quella = x): con metriche a
+        gradini (GCT, cadenza) o costanti un valore tipico ha rango centrale,
+        non quello più alto dei valori uguali.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        if len(self.values) == 0:
+            return np.full(x.shape, np.nan)
+        values, weights = self._distinct()
+        cum = np.cumsum(weights)
+        ranks = (cum - 0.5 * weights) / cum[-1]
+        # Un valore a meno dell'arrotondamento da un punto ha il rango del punto
+        right = np.minimum(np.searchsorted(values, x), len(values) - 1)
+        for i in (right, np.maximum(right - 1, 0)):
+            x = np.where(np.abs(x - values[i]) <= TIE_TOLERANCE * np.maximum(1.0, np.abs(x)), values[i], x)
+        result = np.interp(x, values, ranks, left=0.0, right=1.0)
+        return np.where(np.isnan(x), np.nan, result)
+
+    def to_dict(self) -> Dict:
+        return {'size': self.size, 'values': self.values.tolist(), 'weights': self.weights.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'QuantileSketch':
+        sketch = cls(int(data.get('size', SKETCH_SIZE)))
+        sketch.values = np.asarray(data['values'], dtype=np.float64)
+        sketch.weights = np.asarray(data['weights'], dtype=np.float64)
+        return sketch
+
+    @classmethod
+    def interpolate(cls, a: 'QuantileSketch', b: 'QuantileSketch', weight: float) -> 'QuantileSketch':
+        """Distribuzione intermedia: quantili di a e b interpolati (weight = 0 -> a, 1 -> b)"""
+        size = max(a.size, b.size)
+        q = (np.arange(size) + 0.5) / size
+        sketch = cls(size)
+        sketch.values = (1.0 - weight) * a.quantile(q) + weight * b.quantile(q)
+        sketch.weights = np.full(size, min(a.count, b.count) / size)
+        return sketch
+
+
+def percentile_summary(sketch: QuantileSketch) -> Dict[str, float]:
+    """Percentili BASELINE_PERCENTILES di uno sketch ({'p2.5': valore, ...})"""
+    values = sketch.quantile(np.asarray(BASELINE_PERCENTILES) / 100.0)
+    return {f"p{p:g}": float(v) for p, v in zip(BASELINE_PERCENTILES, values)}
+
+
+class BaselineAccumulator:
+    """
+    Statistiche della baseline aggiornate un video alla volta
+
+    Per ogni metrica tiene due accumulatori: i valori di tutti i frame (media
+    aggregata, min e max per i grafici) e le medie dei singoli video (StdDev tra
+    video per lo Z-Score, più robusta e meno sensibile a piccole variazioni).
+    Cadenza e GCT hanno un solo valore per video.
+
+    Con uno stimatore robusto ogni video è riassunto dal suo centro robusto
+    (mediana o media troncata dei frame) e centro e dispersione della baseline
+    sono calcolati sui centri dei video (pochi valori, uno per video). Per ogni
+    metrica uno sketch dei quantili riassume i valori dei frame di tutti i video.
+    """
+
+    def __init__(self, view_type: str, symmetry_fn: Callable[[float, float], float],
+                 estimator: str = 'mean', trim_fraction: float = DEFAULT_TRIM_FRACTION):
+        """
+        Args:
+            view_type: 'posterior' o 'lateral'
+            symmetry_fn: Indice di simmetria tra sinistra e destra (PoseEngine._calculate_symmetry),
+                usato quando un video non ha la serie della simmetria
+            estimator: Stimatore di centro e dispersione (vedi ESTIMATORS)
+            trim_fraction: Frazione di valori tolta per lato con lo stimatore 'trimmed'
+        """
+        if estimator not in ESTIMATORS:
+            raise ValueError(f"Stimatore non valido: {estimator!r} (ammessi: {', '.join(ESTIMATORS)})")
+        self.view_type = view_type
+        self.metrics = BASELINE_METRICS[view_type]
+        self.estimator = estimator
+        self.trim_fraction = trim_fraction
+        self._symmetry_fn = symmetry_fn
+        self._frames = {metric: RunningStats() for metric in self.metrics}
+        self._videos = {metric: RunningStats() for metric in self.metrics}
+        # Centro di ogni video (stimatori robusti) e quantili dei valori dei frame
+        self._video_centers: Dict[str, List[float]] = {metric: [] for metric in self.metrics}
+        self._sketches = {metric: QuantileSketch() for metric in self.metrics}
+        # Medie per video delle metriche rappresentative (per scegliere il video migliore)
+        self.video_means: Dict[int, Dict[str, float]] = {}
+        self.total_frames = 0
+
+    @property
+    def n_videos(self) -> int:
+        return len(self.video_means)
+
+    def _video_values(self, video_data: Dict) -> Dict[str, np.ndarray]:
+        """Valori di ogni metrica di un video (serie dei frame o valore unico)"""
+        if self.view_type == 'posterior':
+            values = {metric: np.asarray(video_data[metric], dtype=np.float64)
+                      for metric in ('left_knee_valgus', 'right_knee_valgus', 'pelvic_drop')}
+
+            # Per la cadenza, usa la media della serie temporale (valori > 0)
+            cadence_series = np.asarray(_series(video_data, 'cadence'), dtype=np.float64)
+            cadence_series = cadence_series[cadence_series > 0]
+            cadence = cadence_series.mean() if len(cadence_series) else video_data.get('avg_cadence', 0.0)
+            values['cadence'] = np.array([cadence], dtype=np.float64)
+
+            # Per la simmetria, usa la serie temporale se disponibile, altrimenti calcola dalla media
+            symmetry_series = _series(video_data, 'knee_valgus_symmetry')
+            if len(symmetry_series) > 0:
+                values['knee_valgus_symmetry'] = np.asarray(symmetry_series, dtype=np.float64)
+            else:
+                symmetry = self._symmetry_fn(values['left_knee_valgus'].mean(), values['right_knee_valgus'].mean())
+                values['knee_valgus_symmetry'] = np.array([symmetry], dtype=np.float64)
+        else:  # lateral
+            values = {metric: np.asarray(video_data[metric], dtype=np.float64)
+                      for metric in ('overstriding', 'knee_flexion_ic', 'trunk_lean')}
+            # Per GCT, usa la media (già calcolata)
+            values['ground_contact_time'] = np.array([video_data.get('avg_gct', 0.0)], dtype=np.float64)
+        return values
+
+    def add_video(self, video_data: Dict, video_index: Optional[int] = None):
+        """
+        Aggiunge un video (risultato di PoseEngine.process_video)
+
+        Dopo la chiamata il video non serve più: l'accumulatore non tiene riferimenti alle serie.
+
+        Args:
+            video_data: Dati del video
+            video_index: Posizione del video tra quelli della baseline (default: ordine di arrivo)
+        """
+        from scoring import frame_values  # scoring importa questo modulo
+
+        if video_index is None:
+            video_index = self.n_videos
+        values = self._video_values(video_data)
+        for metric in self.metrics:
+            self._frames[metric].push_many(values[metric])
+            self._videos[metric].push(values[metric].mean())
+            if self.estimator != 'mean':
+                self._video_centers[metric].append(
+                    robust_center(values[metric], self.estimator, self.trim_fraction))
+        # Sketch con gli stessi valori per frame della timeline delle anomalie
+        frames = frame_values(video_data, self.view_type)
+        for j, metric in enumerate(self.metrics):
+            self._sketches[metric].push_many(frames[:, j])
+        self.video_means[video_index] = {metric: float(values[metric].mean())
+                                         for metric in REPRESENTATIVE_METRICS[self.view_type]}
+        self.total_frames += video_data['n_frames']
+
+    def stats(self) -> Dict:
+        """
+        Statistiche correnti nel formato di PoseEngine.create_baseline_stats
+
+        Media, Min e Max su tutti i frame aggregati (per i grafici); StdDev tra
+        le medie dei video, con una soglia minima per metrica. 'frame_std' è la
+        StdDev dei singoli frame (Z-Score per frame della timeline delle anomalie).
+
+        Con uno stimatore robusto 'mean' e 'std' sono centro e dispersione
+        robusti tra i centri dei video, 'frame_std' viene dall'intervallo
+        interquartile dello sketch; media e StdDev classiche restano in 'classic'.
+        Ogni metrica riporta i percentili dei frame e lo sketch ('sketch').
+        """
+        baseline_stats = {'view_type': self.view_type, 'estimator': self.estimator}
+        if self.estimator == 'trimmed':
+            baseline_stats['trim_fraction'] = self.trim_fraction
+        for metric in self.metrics:
+            frames = self._frames[metric]
+            sketch = self._sketches[metric]
+            metric_stats = {
+                'mean': float(frames.mean),
+                'std': float(max(self._videos[metric].std, MIN_STD_THRESHOLDS[metric])),
+                'frame_std': float(max(frames.std, MIN_STD_THRESHOLDS[metric])),
+                'min': float(frames.min),
+                'max': float(frames.max)
+            }
+            if self.estimator != 'mean':
+                centers = self._video_centers[metric]
+                q25, q75 = sketch.quantile([0.25, 0.75]) if sketch.count else (np.nan, np.nan)
+                frame_spread = (q75 - q25) / IQR_TO_STD if sketch.count else frames.std
+                metric_stats.update({
+                    'mean': robust_center(centers, self.estimator, self.trim_fraction),
+                    'std': float(max(robust_spread(centers, self.estimator, self.trim_fraction),
+                                     MIN_STD_THRESHOLDS[metric])),
+                    'frame_std': float(max(frame_spread, MIN_STD_THRESHOLDS[metric])),
+                    'classic': {'mean': metric_stats['mean'], 'std': metric_stats['std']}
+                })
+            if sketch.count:
+                metric_stats['percentiles'] = percentile_summary(sketch)
+                metric_stats['sketch'] = sketch.to_dict()
+            baseline_stats[metric] = metric_stats
+        baseline_stats['n_videos'] = self.n_videos
+        baseline_stats['total_frames'] = self.total_frames
+        return baseline_stats
+
+    def closest_video(self, baseline_stats: Optional[Dict] = None) -> Tuple[int, float]:
+        """
+        Video con medie più vicine a quelle della baseline (per Ghost Vision)
+
+        Returns:
+            Tupla (indice del video, deviazione: somma delle differenze assolute)
+        """
+        baseline_stats = baseline_stats or self.stats()
+        best: Tuple[int, float] = (0, float('inf'))
+        for video_index in sorted(self.video_means):
+            means = self.video_means[video_index]
+            deviation = sum(abs(means[metric] - baseline_stats[metric]['mean']) for metric in means)
+            if deviation < best[1]:
+                best = (video_index, deviation)
+        return best
+
+
+def summarize_stats(baseline_stats: Dict, metrics: List[str]) -> str:
+    """Riga di log con media ± StdDev delle metriche"""
+    return ', '.join(f"{metric} μ={baseline_stats[metric]['mean']:.3f} ± {baseline_stats[metric]['std']:.3f}"
+                     for metric in metrics)
@@ -0,0 +1,287 @@
+"""
+Z-Score vettoriali rispetto alla baseline
+
+Le stesse regole di PoseEngine.calculate_z_scores (Z = (valore - media) /
+(StdDev + 1e-6), simmetria con segno invertito, livelli a |Z| 1 e 2) applicate
+in un'unica operazione numpy a una matrice di valori: una riga per analisi o
+per frame, una colonna per metrica.
+
+Per i frame c'è anche lo Z equivalente dai percentili: il rango del valore
+nella distribuzione dei frame della baseline (sketch dei quantili) convertito
+nello Z della normale con lo stesso rango, così le soglie 1 e 2 valgono anche
+per metriche con distribuzione asimmetrica.
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+from scipy.ndimage import maximum_filter1d, uniform_filter1d
+from scipy.special import ndtri
+
+from running_stats import BASELINE_METRICS, QuantileSketch
+
+# Livelli di anomalia per |Z| (soglie 1 e 2)
+LEVEL_THRESHOLDS = (1.0, 2.0)
+LEVELS = ('Ottimale', 'Attenzione', 'Critico')
+LEVEL_COLORS = ('#10b981', '#f59e0b', '#ef4444')
+
+# Metriche in cui un valore più alto della baseline è meglio: lo Z-Score cambia segno
+INVERTED_METRICS = frozenset({'knee_valgus_symmetry'})
+
+STD_EPSILON = 1e-6
+
+# Metodi per lo Z-Score dei frame: StdDev tra frame o rango nello sketch dei quantili
+TIMELINE_METHODS = ('zscore', 'percentile')
+
+# Rango minimo/massimo usato per lo Z equivalente (|Z| massimo ~3.7)
+PERCENTILE_CLIP = 1e-4
+
+
+def baseline_vectors(baseline_stats: Dict, metrics: List[str],
+                     std_key: str = 'std') -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Media, StdDev e segno di ogni metrica della baseline
+
+    Le metriche assenti dalla baseline hanno media NaN: z_scores le riporta a 0.
+
+    Args:
+        std_key: Campo della StdDev ('std' tra video, 'frame_std' tra frame; se
+            manca si usa 'std', come nelle baseline precedenti)
+
+    Returns:
+        Tupla di array (n_metriche,): media, StdDev (+ epsilon), segno (+1 / -1)
+    """
+    mean = np.array([baseline_stats[m]['mean'] if m in baseline_stats else np.nan for m in metrics],
+                    dtype=np.float64)
+    std = np.array([baseline_stats[m].get(std_key, baseline_stats[m]['std']) if m in baseline_stats else 1.0
+                    for m in metrics], dtype=np.float64) + STD_EPSILON
+    sign = np.array([-1.0 if m in INVERTED_METRICS else 1.0 for m in metrics], dtype=np.float64)
+    return mean, std, sign
+
+
+def z_scores(values: np.ndarray, baseline_stats: Dict, metrics: List[str], std_key: str = 'std') -> np.ndarray:
+    """
+    Z-Score di una matrice di valori
+
+    Args:
+        values: Array (..., n_metriche) nell'ordine di metrics (NaN = valore mancante)
+        baseline_stats: Statistiche baseline (mean/std per metrica)
+        metrics: Metriche delle colonne
+        std_key: Campo della StdDev (vedi baseline_vectors)
+
+    Returns:
+        Array della stessa forma: NaN dove manca il valore, 0 dove manca la metrica nella baseline
+    """
+    mean, std, sign = baseline_vectors(baseline_stats, metrics, std_key)
+    z = (np.asarray(values, dtype=np.float64) - mean) / std * sign
+    z[..., np.isnan(mean)] = 0.0
+    return z
+
+
+def percentile_z_scores(values: np.ndarray, baseline_stats: Dict, metrics: List[str]) -> np.ndarray:
+    """
+    Z equivalente dal rango di ogni valore nella distribuzione dei frame della baseline
+
+    Le metriche senza sketch nella baseline (baseline precedenti) usano lo
+    Z-Score con la StdDev tra frame.
+
+    Args:
+        values: Array (n, n_metriche) nell'ordine di metrics (NaN = valore mancante)
+
+    Returns:
+        Array della stessa forma (segno invertito per INVERTED_METRICS)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    z = z_scores(values, baseline_stats, metrics, std_key='frame_std')
+    for j, metric in enumerate(metrics):
+        sketch_data = baseline_stats.get(metric, {}).get('sketch')
+        if not sketch_data or not sketch_data.get('values'):
+            continue
+        ranks = QuantileSketch.from_dict(sketch_data).cdf(values[..., j])
+        sign = -1.0 if metric in INVERTED_METRICS else 1.0
+        z[..., j] = sign * ndtri(np.clip(ranks, PERCENTILE_CLIP, 1.0 - PERCENTILE_CLIP))
+    return z
+
+
+def level_indices(abs_z: np.ndarray) -> np.ndarray:
+    """Indice in LEVELS per ogni |Z| (NaN = 'Ottimale')"""
+    abs_z = np.asarray(abs_z, dtype=np.float64)
+    return np.where(np.isnan(abs_z), 0, np.digitize(abs_z, LEVEL_THRESHOLDS)).astype(np.int8)
+
+
+def max_abs_z(z: np.ndarray) -> np.ndarray:
+    """|Z| massimo sulle metriche (ultimo asse), ignorando i valori mancanti (NaN se mancano tutti)"""
+    abs_z = np.abs(z)
+    all_missing = np.isnan(abs_z).all(axis=-1)
+    result = np.max(np.where(np.isnan(abs_z), -np.inf, abs_z), axis=-1)
+    return np.where(all_missing, np.nan, result)
+
+
+def score_records(records: List[Dict], baseline_stats: Dict) -> Dict:
+    """
+    Valuta molte analisi rispetto alla baseline in un'unica operazione
+
+    Args:
+        records: Dizionari con 'source', 'name' e 'values' (metrica -> valore);
+            devono avere la stessa vista della baseline
+        baseline_stats: Statistiche baseline
+
+    Returns:
+        Tabella {'columns': [...], 'rows': [[...], ...]} con valore e Z-Score per
+        metrica, |Z| massimo e stato generale, ordinata per |Z| massimo decrescente
+    """
+    view_type = baseline_stats.get('view_type', 'posterior')
+    metrics = BASELINE_METRICS[view_type]
+    values = np.array([[record['values'].get(m, np.nan) for m in metrics] for record in records],
+                      dtype=np.float64).reshape(len(records), len(metrics))
+
+    z = z_scores(values, baseline_stats, metrics)
+    max_z = max_abs_z(z)
+    overall = level_indices(max_z)
+    order = np.argsort(np.where(np.isnan(max_z), -np.inf, max_z), kind='stable')[::-1]
+
+    columns = ['source', 'name']
+    for metric in metrics:
+        columns += [f'{metric}_value', f'{metric}_z']
+    columns += ['max_z_score', 'overall_status']
+
+    def cell(x):
+        return None if np.isnan(x) else round(float(x), 4)
+
+    rows = []
+    for i in order:
+        row = [records[i]['source'], records[i]['name']]
+        for j in range(len(metrics)):
+            row += [cell(values[i, j]), cell(z[i, j])]
+        row += [cell(max_z[i]), LEVELS[overall[i]]]
+        rows.append(row)
+
+    counts = np.bincount(overall, minlength=len(LEVELS)) if len(records) else np.zeros(len(LEVELS), dtype=int)
+    return {
+        'view_type': view_type,
+        'columns': columns,
+        'rows': rows,
+        'by_level': {level: int(n) for level, n in zip(LEVELS, counts)}
+    }
+
+
+def _contact_values(gct_series: np.ndarray) -> np.ndarray:
+    """
+    GCT di ogni frame come durata dell'ultimo contatto
+
+    Nella serie di PoseEngine i frame di contatto hanno la durata del contatto
+    (valore ripetuto), quelli tra un contatto e l'altro un decadimento verso 0
+    solo per il grafico: qui la durata del contatto resta valida fino al
+    successivo (NaN prima del primo).
+    """
+    same_prev = np.r_[False, gct_series[1:] == gct_series[:-1]]
+    same_next = np.r_[gct_series[:-1] == gct_series[1:], False]
+    contact = (gct_series > 0) & (same_prev | same_next)
+    last = np.maximum.accumulate(np.where(contact, np.arange(len(gct_series)), -1))
+    return np.where(last >= 0, gct_series[np.maximum(last, 0)], np.nan)
+
+
+def frame_values(video_data: Dict, view_type: str) -> np.ndarray:
+    """
+    Valori di ogni metrica per frame
+
+    Args:
+        video_data: Risultato di PoseEngine.process_video
+        view_type: 'posterior' o 'lateral'
+
+    Returns:
+        Array (n_frame, n_metriche) nell'ordine di BASELINE_METRICS; NaN dove il
+        valore non è disponibile (cadenza non ancora calcolata, GCT prima del
+        primo contatto, serie assente)
+    """
+    metrics = BASELINE_METRICS[view_type]
+    n_frames = int(video_data['n_frames'])
+    values = np.full((n_frames, len(metrics)), np.nan, dtype=np.float64)
+    for j, metric in enumerate(metrics):
+        series = video_data.get(metric)
+        if series is None or len(series) == 0:
+            continue
+        series = np.asarray(series, dtype=np.float64)[:n_frames]
+        if metric == 'cadence':
+            series = np.where(series > 0, series, np.nan)
+        elif metric == 'ground_contact_time':
+            series = _contact_values(series)
+        values[:len(series), j] = series
+    return values
+
+
+def rolling_mean(z: np.ndarray, window: int) -> np.ndarray:
+    """Media mobile centrata lungo il primo asse, ignorando i NaN (NaN se la finestra è tutta mancante)"""
+    missing = np.isnan(z)
+    total = uniform_filter1d(np.where(missing, 0.0, z), size=window, axis=0, mode='nearest')
+    count = uniform_filter1d((~missing).astype(np.float64), size=window, axis=0, mode='nearest')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 1e-9, total / np.maximum(count, 1e-9), np.nan)
+
+
+def frame_timeline(video_data: Dict, baseline_stats: Dict, window_frames: int,
+                   method: str = 'zscore') -> Dict:
+    """
+    Z-Score per frame di tutte le metriche e livello di anomalia nel tempo
+
+    Il livello di un frame viene dalla media mobile degli Z-Score di ogni
+    metrica: l'oscillazione dentro la falcata e il rumore dei singoli frame si
+    compensano, resta un'anomalia che dura almeno una parte della finestra.
+
+    Args:
+        video_data: Risultato di PoseEngine.process_video (stessa vista della baseline)
+        baseline_stats: Statistiche baseline
+        window_frames: Ampiezza (in frame, centrata) della finestra mobile
+        method: 'zscore' (StdDev tra frame) o 'percentile' (Z equivalente dal
+            rango nello sketch dei quantili, vedi percentile_z_scores)
+
+    Returns:
+        Dizionario compatto: 'metrics' (ordine delle righe), 'z' (n_metriche x n_frame,
+        2 decimali, None = valore mancante), 'max_z' (|Z| massimo per frame),
+        'rolling_max_z' (massimo mobile di 'max_z', i picchi), 'window_z' (|Z| massimo
+        delle medie mobili), 'levels' (indice in 'level_names' di 'window_z')
+        e 'segments' (tratti consecutivi con livello 'Attenzione' o 'Critico')
+    """
+    view_type = baseline_stats.get('view_type', 'posterior')
+    metrics = BASELINE_METRICS[view_type]
+    values = frame_values(video_data, view_type)
+    if method == 'percentile':
+        z = percentile_z_scores(values, baseline_stats, metrics)
+    else:
+        # I singoli frame variano più delle medie dei video: StdDev tra frame se la baseline la riporta
+        z = z_scores(values, baseline_stats, metrics, std_key='frame_std')
+    max_z = max_abs_z(z)
+
+    window = max(1, int(window_frames))
+    if len(max_z):
+        rolling_max = maximum_filter1d(np.where(np.isnan(max_z), -np.inf, max_z), size=window, mode='nearest')
+        rolling_max = np.where(np.isinf(rolling_max), np.nan, rolling_max)
+        window_z = max_abs_z(rolling_mean(z, window))
+    else:
+        rolling_max = window_z = max_z
+    levels = level_indices(window_z)
+
+    # Tratti consecutivi con lo stesso livello (solo sopra 'Ottimale')
+    changes = np.flatnonzero(np.diff(levels)) + 1
+    starts = np.r_[0, changes] if len(levels) else np.zeros(0, dtype=int)
+    ends = np.r_[changes, len(levels)] if len(levels) else np.zeros(0, dtype=int)
+    segments = [{'start': int(a), 'end': int(b), 'level': LEVELS[levels[a]],
+                 'max_z': round(float(np.max(window_z[a:b])), 2)}
+                for a, b in zip(starts, ends) if levels[a] > 0]
+
+    def compact(x):
+        x = np.round(x, 2)
+        return np.where(np.isnan(x), None, x).tolist()
+
+    return {
+        'metrics': metrics,
+        'method': method,
+        'z': compact(z.T),
+        'max_z': compact(max_z),
+        'rolling_max_z': compact(rolling_max),
+        'window_z': compact(window_z),
+        'window_frames': window,
+        'levels': levels.tolist(),
+        'level_names': list(LEVELS),
+        'level_colors': list(LEVEL_COLORS),
+        'segments': segments
+    }
@@ -0,0 +1,124 @@
+"""
+Estrazione della silhouette Ghost Vision dalla segmentation mask di MediaPipe
+
+La pulizia morfologica e la ricerca del contorno lavorano su una copia ridotta
+della mask (Config.GHOST_SILHOUETTE_SCALE): solo il contorno finale viene
+riportato alla risoluzione del video. Kernel e buffer sono allocati una volta
+(i buffer per thread, perché l'estrattore è condiviso dai worker di codifica).
+"""
+import threading
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class SilhouetteExtractor:
+    """Contorno e immagine della silhouette da una segmentation mask"""
+
+    def __init__(self, scale: float = 0.5, morphology: bool = True, kernel_size: int = 5,
+                 threshold: float = 0.5):
+        """
+        Inizializza l'estrattore
+
+        Args:
+            scale: Scala della mask su cui lavorare (1.0 = risoluzione originale)
+            morphology: Se False salta apertura/chiusura (mask già pulita)
+            kernel_size: Dimensione del kernel morfologico a scala 1.0
+            threshold: Soglia della mask (0-1) per considerare un pixel parte del corpo
+        """
+        self.scale = scale
+        self.morphology = morphology
+        self.threshold = threshold
+        # Il kernel si riduce con la mask, così la pulizia copre la stessa area
+        size = max(3, int(round(kernel_size * scale)) | 1)
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
+        self._local = threading.local()
+
+    def _buffer(self, name: str, shape: Tuple[int, ...]) -> np.ndarray:
+        """Buffer uint8 riutilizzato dal thread corrente"""
+        buffer = getattr(self._local, name, None)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.uint8)
+            setattr(self._local, name, buffer)
+        return buffer
+
+    def binary_mask(self, segmentation_mask: np.ndarray) -> np.ndarray:
+        """
+        Mask binaria (0/255) ridotta e pulita
+
+        Il buffer restituito viene riutilizzato dalla chiamata successiva dello stesso thread.
+        """
+        h, w = segmentation_mask.shape[:2]
+        if self.scale != 1.0:
+            small_size = (max(1, int(round(w * self.scale))), max(1, int(round(h * self.scale))))
+            small = cv2.resize(segmentation_mask, small_size, interpolation=cv2.INTER_AREA)
+        else:
+            small = segmentation_mask
+
+        binary = self._buffer('binary', small.shape[:2])
+        cv2.compare(small, self.threshold, cv2.CMP_GT, dst=binary)
+        if self.morphology:
+            cv2.morphologyEx(binary, cv2.MORPH_CLOSE, self._kernel, dst=binary)
+            cv2.morphologyEx(binary, cv2.MORPH_OPEN, self._kernel, dst=binary)
+        return binary
+
+    def contour(self, segmentation_mask: np.ndarray, epsilon: float = 0.0) -> Optional[np.ndarray]:
+        """
+        Contorno più grande della silhouette in pixel del video
+
+        Args:
+            segmentation_mask: Mask di segmentazione da MediaPipe (valori 0-1)
+            epsilon: Se > 0, semplifica il contorno (cv2.approxPolyDP) con questa
+                tolleranza in pixel del video, prima di riportarlo a piena risoluzione
+
+        Returns:
+            Contorno (k, 1, 2) int32 nel formato OpenCV, o None se nessuna silhouette
+        """
+        h, w = segmentation_mask.shape[:2]
+        binary = self.binary_mask(segmentation_mask)
+        contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if len(contours) == 0:
+            return None
+
+        # Il contorno più grande è presumibilmente il corpo
+        largest = max(contours, key=cv2.contourArea)
+        if epsilon > 0:
+            largest = cv2.approxPolyDP(largest, epsilon * binary.shape[1] / w, True)
+        if binary.shape == (h, w):
+            return largest
+
+        # Centri dei pixel ridotti riportati sulla griglia originale
+        sx = w / binary.shape[1]
+        sy = h / binary.shape[0]
+        points = (largest.astype(np.float32) + 0.5) * np.array([sx, sy], dtype=np.float32) - 0.5
+        np.clip(points[..., 0], 0, w - 1, out=points[..., 0])
+        np.clip(points[..., 1], 0, h - 1, out=points[..., 1])
+        return np.rint(points).astype(np.int32)
+
+    def render(self, contour: Optional[np.ndarray], width: int, height: int,
+               color: Tuple[int, int, int]) -> np.ndarray:
+        """
+        Immagine BGRA della silhouette: contorno pieno e bordo colorati, opaca solo all'interno
+
+        Args:
+            contour: Contorno da contour() (None = immagine trasparente)
+            width, height: Dimensioni del frame
+            color: Colore BGR della silhouette
+
+        Returns:
+            Nuova immagine (height, width, 4)
+        """
+        ghost_img = np.zeros((height, width, 4), dtype=np.uint8)
+        if contour is None or len(contour) < 3:
+            return ghost_img
+
+        bgr = self._buffer('bgr', (height, width, 3))
+        bgr.fill(0)
+        cv2.drawContours(bgr, [contour], -1, color, -1)
+        cv2.drawContours(bgr, [contour], -1, color, 3)
+        alpha = self._buffer('alpha', (height, width))
+        alpha.fill(0)
+        cv2.drawContours(alpha, [contour], -1, 255, -1)
+        cv2.merge((bgr, alpha), dst=ghost_img)
+        return ghost_img
@@ -0,0 +1,159 @@
+"""
+Rendering dello scheletro MediaPipe sui frame video
+
+Disegna direttamente sul frame (o su un buffer riutilizzato quando si renderizza
+a risoluzione ridotta), converte i landmark in pixel con un'unica operazione
+vettoriale e usa due sole chiamate cv2.polylines per frame: una per le ossa
+e una per i giunti.
+"""
+from typing import Callable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+class SkeletonRenderer:
+    """Renderer riutilizzabile dello scheletro (una istanza per video)"""
+
+    def __init__(self,
+                 connections: List[Tuple[int, int]],
+                 scale: float = 1.0,
+                 visibility_threshold: float = 0.5,
+                 skeleton_color: Tuple[int, int, int] = (0, 255, 0),
+                 landmark_color: Tuple[int, int, int] = (0, 0, 255),
+                 landmark_radius: int = 4,
+                 connection_thickness: int = 2):
+        """
+        Inizializza il renderer
+
+        Args:
+            connections: Coppie di indici dei landmark da collegare (ossa)
+            scale: Fattore di scala dell'output (1.0 = risoluzione originale)
+            visibility_threshold: Visibilità minima per disegnare un landmark
+            skeleton_color: Colore BGR delle ossa
+            landmark_color: Colore BGR dei giunti
+            landmark_radius: Raggio dei giunti (a scala 1.0)
+            connection_thickness: Spessore delle ossa (a scala 1.0)
+        """
+        self.scale = scale
+        self.visibility_threshold = visibility_threshold
+        self.skeleton_color = skeleton_color
+        self.landmark_color = landmark_color
+
+        # Indici delle connessioni precalcolati (evita di iterare le tuple per ogni frame)
+        connections_arr = np.asarray(connections, dtype=np.intp).reshape(-1, 2)
+        self._conn_start = connections_arr[:, 0]
+        self._conn_end = connections_arr[:, 1]
+        self._n_landmarks = int(connections_arr.max()) + 1 if len(connections_arr) else 0
+
+        # Un giunto è un segmento di lunghezza zero: con spessore 2*r OpenCV disegna
+        # un cerchio pieno di raggio r, così tutti i giunti vanno in una sola chiamata
+        self._joint_thickness = max(1, int(round(2 * landmark_radius * scale)))
+        self._connection_thickness = max(1, int(round(connection_thickness * scale)))
+
+        # Buffer riutilizzato per il rendering a risoluzione ridotta
+        self._buffer: Optional[np.ndarray] = None
+
+    @staticmethod
+    def landmarks_to_array(landmarks) -> np.ndarray:
+        """
+        Converte i pose_landmarks MediaPipe in un array (n, 3): x, y, visibility normalizzati
+
+        Args:
+            landmarks: Landmark MediaPipe (pose_landmarks)
+
+        Returns:
+            Array float32 (n, 3)
+        """
+        return np.array([(lm.x, lm.y, lm.visibility) for lm in landmarks.landmark], dtype=np.float32)
+
+    def output_size(self, width: int, height: int) -> Tuple[int, int]:
+        """Dimensione (larghezza, altezza) dei frame prodotti da render()"""
+        if self.scale == 1.0:
+            return width, height
+        return max(1, int(round(width * self.scale))), max(1, int(round(height * self.scale)))
+
+    def render(self, frame: np.ndarray, points: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Disegna lo scheletro sul frame
+
+        A scala 1.0 il frame viene modificato sul posto e restituito; a scala ridotta
+        il risultato è scritto in un buffer interno riutilizzato tra le chiamate
+        (va consumato, es. scritto sul VideoWriter, prima della chiamata successiva).
+
+        Args:
+            frame: Frame BGR
+            points: Array (n, 3) da landmarks_to_array, o None se la pose non è rilevata
+
+        Returns:
+            Frame con lo scheletro disegnato
+        """
+        if self.scale != 1.0:
+            h, w = frame.shape[:2]
+            out_w, out_h = self.output_size(w, h)
+            if self._buffer is None or self._buffer.shape[:2] != (out_h, out_w):
+                self._buffer = np.empty((out_h, out_w, 3), dtype=np.uint8)
+            cv2.resize(frame, (out_w, out_h), dst=self._buffer, interpolation=cv2.INTER_AREA)
+            canvas = self._buffer
+        else:
+            canvas = frame
+
+        if points is None or len(points) < self._n_landmarks:
+            return canvas
+
+        h, w = canvas.shape[:2]
+        # Coordinate pixel di tutti i landmark in un solo passaggio (troncamento come int())
+        pixels = (points[:, :2] * np.array([w, h], dtype=np.float32)).astype(np.int32)
+        visible = points[:, 2] > self.visibility_threshold
+
+        # Ossa: solo connessioni con entrambi gli estremi visibili
+        conn_mask = visible[self._conn_start] & visible[self._conn_end]
+        if conn_mask.any():
+            segments = np.stack((pixels[self._conn_start[conn_mask]],
+                                 pixels[self._conn_end[conn_mask]]), axis=1)
+            cv2.polylines(canvas, segments, False, self.skeleton_color, self._connection_thickness)
+
+        # Giunti visibili
+        if visible.any():
+            joints = pixels[visible]
+            cv2.polylines(canvas, np.stack((joints, joints), axis=1), False,
+                          self.landmark_color, self._joint_thickness)
+
+        return canvas
+
+    def render_video(self, source_path: str, writer, points_series: np.ndarray,
+                     progress: Optional[Callable[[int], None]] = None) -> int:
+        """
+        Disegna lo scheletro su tutti i frame di un video e li passa al writer
+
+        Args:
+            source_path: Video sorgente
+            writer: Writer aperto (interfaccia di cv2.VideoWriter)
+            points_series: Array (n_frame, n, 3) di landmarks_to_array, con NaN
+                per i frame senza pose rilevata
+            progress: Callback chiamata ogni 30 frame con il numero di frame scritti
+
+        Returns:
+            Numero di frame scritti
+        """
+        cap = cv2.VideoCapture(source_path)
+        if not cap.isOpened():
+            raise ValueError(f"Impossibile aprire il video: {source_path}")
+
+        n_points = len(points_series)
+        frame_count = 0
+        try:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                points = points_series[frame_count] if frame_count < n_points else None
+                if points is not None and np.isnan(points[0, 0]):
+                    points = None
+                writer.write(self.render(frame, points))
+                frame_count += 1
+                if progress is not None and frame_count % 30 == 0:
+                    progress(frame_count)
+        finally:
+            cap.release()
+        return frame_count
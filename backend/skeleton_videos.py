@@ -0,0 +1,321 @@
+"""
+Video con scheletro renderizzati su richiesta
+
+In modalità 'lazy' (Config.SKELETON_VIDEO_MODE) l'analisi salva solo i landmark:
+il video sorgente viene conservato e il video con scheletro viene disegnato in
+un job in background la prima volta che viene richiesto, poi servito come un
+normale file di processed_videos. I landmark 2D sono salvati accanto ai video
+(landmarks/<nome>.npz) e possono essere scaricati direttamente dai client che
+disegnano l'overlay da soli.
+
+I sorgenti dei video mai richiesti vengono rimossi dopo max_source_age_hours o,
+oltre max_sources_mb, a partire dai più vecchi (prune_sources): i landmark
+restano, il video con scheletro non è più renderizzabile.
+"""
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from jobs import JobManager
+from pose_engine import PoseEngine
+from skeleton_renderer import SkeletonRenderer
+from video_encoder import release_writer
+
+logger = logging.getLogger('SKELETON_VIDEOS')
+
+
+class SkeletonVideoStore:
+    """Video con scheletro di PROCESSED_VIDEOS_FOLDER, con rendering differito"""
+
+    LANDMARKS_DIR = 'landmarks'
+    SOURCES_DIR = 'sources'
+
+    def __init__(self, folder: str, jobs: JobManager, scale: float = 1.0,
+                 max_source_age_hours: float = 0, max_sources_mb: float = 0):
+        """
+        Inizializza lo store
+
+        Args:
+            folder: Cartella dei video con scheletro (Config.PROCESSED_VIDEOS_FOLDER)
+            jobs: Coda su cui eseguire i rendering
+            scale: Scala della risoluzione dei video renderizzati
+            max_source_age_hours: Età massima dei sorgenti non renderizzati (0 = illimitata)
+            max_sources_mb: Spazio massimo dei sorgenti (0 = illimitato)
+        """
+        self.folder = folder
+        self.jobs = jobs
+        self.scale = scale
+        self.max_source_age_hours = max_source_age_hours
+        self.max_sources_mb = max_sources_mb
+        self._render_jobs: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def video_path(self, filename: str) -> str:
+        return os.path.join(self.folder, os.path.basename(filename))
+
+    def landmarks_path(self, filename: str) -> str:
+        stem = os.path.splitext(os.path.basename(filename))[0]
+        return os.path.join(self.folder, self.LANDMARKS_DIR, f"{stem}.npz")
+
+    def save_landmarks(self, filename: str, image_landmarks: np.ndarray, fps: float,
+                       source_name: Optional[str] = None):
+        """
+        Salva i landmark 2D di un video (scrittura atomica)
+
+        Args:
+            filename: Nome del video con scheletro
+            image_landmarks: Array (n_frame, 33, 3) con x, y normalizzati e visibility (NaN = pose assente)
+            fps: FPS del video
+            source_name: Nome del video sorgente conservato in sources/ (solo modalità lazy)
+        """
+        path = self.landmarks_path(filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f,
+                     landmarks=np.asarray(image_landmarks, dtype=np.float32),
+                     fps=np.float64(fps),
+                     source_name=np.str_(source_name or ''))
+        os.replace(tmp_path, path)
+
+    def load_landmarks(self, filename: str) -> Optional[Dict]:
+        """
+        Carica i landmark 2D di un video
+
+        Returns:
+            Dizionario con 'landmarks', 'fps' e 'source_name', o None se non disponibili
+        """
+        path = self.landmarks_path(filename)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return {
+                'landmarks': data['landmarks'],
+                'fps': float(data['fps']),
+                'source_name': str(data['source_name']) or None
+            }
+
+    def _source_path(self, source_name: Optional[str]) -> Optional[str]:
+        if not source_name:
+            return None
+        path = os.path.join(self.folder, self.SOURCES_DIR, os.path.basename(source_name))
+        return path if os.path.exists(path) else None
+
+    def publish(self, video_data: Dict, source_path: str, lazy: bool, keep_source: bool = False) -> Optional[str]:
+        """
+        Rende disponibile il video con scheletro di un'analisi
+
+        In modalità eager il video è già stato scritto da process_video; in modalità
+        lazy il video sorgente viene spostato in sources/ (invece di essere cancellato)
+        per poterlo renderizzare alla prima richiesta.
+
+        Args:
+            video_data: Risultato di PoseEngine.process_video
+            source_path: Percorso del video caricato
+            lazy: True per il rendering differito
+            keep_source: True se il video caricato serve ancora al chiamante
+                (viene collegato o copiato in sources/ invece di essere spostato)
+
+        Returns:
+            Nome del video con scheletro, o None se non disponibile
+        """
+        image_landmarks = video_data.get('image_landmarks')
+
+        if not lazy:
+            skeleton_path = video_data.get('skeleton_video_path')
+            if not skeleton_path or not os.path.exists(skeleton_path):
+                return None
+            filename = os.path.basename(skeleton_path)
+            if image_landmarks is not None:
+                self.save_landmarks(filename, image_landmarks, video_data['fps'])
+            return filename
+
+        if image_landmarks is None or not os.path.exists(source_path):
+            return None
+
+        filename = PoseEngine.skeleton_video_filename(source_path)
+        source_name = f"{os.path.splitext(filename)[0]}{os.path.splitext(source_path)[1]}"
+        sources_dir = os.path.join(self.folder, self.SOURCES_DIR)
+        os.makedirs(sources_dir, exist_ok=True)
+        stored_path = os.path.join(sources_dir, source_name)
+        if keep_source:
+            if os.path.exists(stored_path):
+                os.remove(stored_path)
+            try:
+                os.link(source_path, stored_path)
+            except OSError:
+                shutil.copy2(source_path, stored_path)
+        else:
+            shutil.move(source_path, stored_path)
+        # L'età del sorgente (prune_sources) parte dalla registrazione
+        os.utime(stored_path)
+
+        # Un video con lo stesso nome appartiene a un caricamento precedente
+        old_video = self.video_path(filename)
+        if os.path.exists(old_video):
+            os.remove(old_video)
+
+        self.save_landmarks(filename, image_landmarks, video_data['fps'], source_name)
+        video_data['skeleton_video_path'] = old_video
+        logger.info(f"📹 Video con scheletro registrato per rendering su richiesta: {filename}")
+        self.prune_sources()
+        return filename
+
+    def prune_sources(self) -> int:
+        """
+        Rimuove i sorgenti più vecchi di max_source_age_hours e poi, dal più
+        vecchio, quelli oltre max_sources_mb (esclusi quelli in rendering)
+
+        Returns:
+            Numero di sorgenti rimossi
+        """
+        if self.max_source_age_hours <= 0 and self.max_sources_mb <= 0:
+            return 0
+        sources_dir = os.path.join(self.folder, self.SOURCES_DIR)
+        with self._lock:
+            rendering = {os.path.splitext(filename)[0] for filename, job_id in self._render_jobs.items()
+                         if (self.jobs.get(job_id) or {}).get('status') in ('queued', 'running')}
+        entries = []
+        try:
+            names = os.listdir(sources_dir)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            if os.path.splitext(name)[0] in rendering:
+                continue
+            try:
+                stat = os.stat(os.path.join(sources_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort()
+
+        now = time.time()
+        max_age = self.max_source_age_hours * 3600
+        max_bytes = int(self.max_sources_mb * 1024 * 1024)
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, name in entries:
+            expired = max_age > 0 and now - mtime > max_age
+            over_size = max_bytes > 0 and total > max_bytes
+            if not expired and not over_size:
+                break
+            try:
+                os.remove(os.path.join(sources_dir, name))
+            except OSError as e:
+                logger.warning(f"⚠ Impossibile rimuovere il video sorgente {name}: {e}")
+                continue
+            total -= size
+            removed += 1
+            logger.info(f"🧹 Video sorgente non renderizzato rimosso ({'scaduto' if expired else 'limite spazio'}): {name}")
+        return removed
+
+    def is_ready(self, filename: str) -> bool:
+        return os.path.exists(self.video_path(filename))
+
+    def can_render(self, filename: str) -> bool:
+        """True se il video non esiste ancora ma può essere renderizzato"""
+        landmarks = self.load_landmarks(filename)
+        return landmarks is not None and self._source_path(landmarks['source_name']) is not None
+
+    def request_render(self, filename: str) -> str:
+        """
+        Avvia il rendering di un video (o restituisce il job già in corso)
+
+        Returns:
+            ID del job di rendering (quello fallito, se l'ultimo rendering è terminato con errore)
+        """
+        filename = os.path.basename(filename)
+        with self._lock:
+            job_id = self._render_jobs.get(filename)
+            job = self.jobs.get(job_id) if job_id else None
+            if job is not None and job['status'] in ('queued', 'running'):
+                return job_id
+            if job is not None and job['status'] == 'error':
+                # L'errore viene riportato una volta: la richiesta successiva riprova il rendering
+                del self._render_jobs[filename]
+                return job_id
+            job_id = self.jobs.submit('skeleton_render', self._render, filename)
+            self._render_jobs[filename] = job_id
+            return job_id
+
+    @staticmethod
+    def _write_video(output_path: str, source_path: str, fps: float, frame_size: Tuple[int, int],
+                     renderer: SkeletonRenderer, points_series: np.ndarray, progress,
+                     encoder: Optional[str] = None) -> Optional[int]:
+        """
+        Scrive il video con scheletro con l'encoder indicato (default: quello di Config)
+
+        Returns:
+            Numero di frame scritti, o None se la codifica è fallita (il file viene rimosso)
+        """
+        writer = PoseEngine.open_skeleton_writer(output_path, fps, frame_size, encoder=encoder)
+        if writer is None:
+            raise RuntimeError("Nessun codec video disponibile")
+        try:
+            frame_count = renderer.render_video(source_path, writer, points_series, progress)
+        except Exception:
+            writer.release()
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+        if release_writer(writer):
+            return frame_count
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return None
+
+    def _render(self, job, filename: str) -> Dict:
+        """Disegna lo scheletro sul video sorgente (eseguito nel job)"""
+        landmarks = self.load_landmarks(filename)
+        if landmarks is None:
+            raise FileNotFoundError(f"Landmark non trovati per {filename}")
+        source_path = self._source_path(landmarks['source_name'])
+        if source_path is None:
+            raise FileNotFoundError(f"Video sorgente non trovato per {filename}")
+
+        points_series = landmarks['landmarks']
+        fps = landmarks['fps']
+        cap = cv2.VideoCapture(source_path)
+        if not cap.isOpened():
+            raise ValueError(f"Impossibile aprire il video: {source_path}")
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+
+        renderer = SkeletonRenderer(PoseEngine.POSE_CONNECTIONS, scale=self.scale)
+        frame_size = renderer.output_size(width, height)
+        n_points = len(points_series)
+
+        def progress(frame_count: int):
+            if n_points:
+                job.update(progress=frame_count / n_points, message=f"{frame_count}/{n_points} frame")
+
+        # Scrive su un file temporaneo: il video compare solo quando è completo
+        final_path = self.video_path(filename)
+        tmp_path = os.path.join(self.folder, f".rendering_{filename}")
+        frame_count = self._write_video(tmp_path, source_path, fps, frame_size, renderer,
+                                        points_series, progress)
+        if frame_count is None:
+            logger.warning(f"⚠ Codifica ffmpeg fallita, nuovo rendering con cv2.VideoWriter: {filename}")
+            frame_count = self._write_video(tmp_path, source_path, fps, frame_size, renderer,
+                                            points_series, progress, encoder='opencv')
+        if frame_count is None:
+            raise RuntimeError(f"Codifica del video con scheletro fallita: {filename}")
+
+        os.replace(tmp_path, final_path)
+        # Il video renderizzato resta in cache: il sorgente non serve più
+        try:
+            os.remove(source_path)
+        except OSError as e:
+            logger.warning(f"⚠ Impossibile rimuovere il video sorgente {os.path.basename(source_path)}: {e}")
+
+        size_mb = os.path.getsize(final_path) / (1024 * 1024)
+        logger.info(f"✓ Video con scheletro renderizzato: {filename} ({frame_count} frame, {size_mb:.2f} MB)")
+        return {'filename': filename, 'frames': frame_count}
@@ -0,0 +1,382 @@
+"""
+Scrittura dei video con scheletro
+
+Se è disponibile un eseguibile ffmpeg, i frame grezzi vengono passati via pipe
+a un processo ffmpeg che codifica in H.264 (libx264, yuv420p, faststart): la
+codifica gira in un processo separato e la scrittura sulla pipe in un thread
+dedicato, così il thread di elaborazione non attende l'encoder. Altrimenti si
+usa cv2.VideoWriter provando i codec disponibili.
+
+Entrambi i writer espongono la stessa interfaccia di cv2.VideoWriter
+(write, release, isOpened). FFmpegVideoWriter.release() indica anche se la
+codifica è riuscita: release_writer() lo riporta per entrambi i writer, così
+il chiamante può ripiegare su cv2.VideoWriter se ffmpeg fallisce.
+
+Gli encoder disponibili vengono verificati una sola volta per processo
+(probe_encoders, su file temporanei) e i writer si aprono direttamente
+dal risultato in cache.
+"""
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger('VIDEO_ENCODER')
+
+# Preset velocità/qualità: (preset x264, CRF)
+ENCODER_PRESETS = {
+    'fast': ('veryfast', 28),
+    'balanced': ('faster', 23),
+    'quality': ('medium', 20),
+}
+
+# Codec di cv2.VideoWriter in ordine di preferenza
+# H.264 è il più compatibile per i browser
+OPENCV_CODECS = [
+    ('avc1', 'H.264/AVC'),  # H.264 - migliore compatibilità browser
+    ('mp4v', 'MPEG-4'),      # MPEG-4 - fallback
+    ('XVID', 'Xvid'),        # Xvid - altro fallback
+]
+
+
+# Risultati di probe_encoders per eseguibile ffmpeg (condivisi dal processo)
+_capabilities: Dict[str, Dict] = {}
+_capabilities_lock = threading.Lock()
+
+
+def find_ffmpeg(binary: str = 'ffmpeg') -> Optional[str]:
+    """Percorso dell'eseguibile ffmpeg, o None se non installato"""
+    return shutil.which(binary)
+
+
+def _probe_ffmpeg_h264(ffmpeg_path: str, tmp_dir: str) -> bool:
+    """Verifica che ffmpeg sappia codificare H.264 (libx264) con un clip di prova"""
+    output_path = os.path.join(tmp_dir, 'probe_ffmpeg.mp4')
+    command = [
+        ffmpeg_path, '-y', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', 'color=c=black:s=64x64:r=10:d=0.2',
+        '-c:v', 'libx264', '-pix_fmt', 'yuv420p',
+        output_path
+    ]
+    try:
+        completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=15)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.debug(f"⚠ Probe ffmpeg fallito: {e}")
+        return False
+    return completed.returncode == 0 and os.path.exists(output_path) and os.path.getsize(output_path) > 0
+
+
+def _mp4_codec_tag(path: str) -> Optional[str]:
+    """
+    Codec tag scritto nel file MP4 (prima voce del box 'stsd'), o None
+
+    Il fourcc letto da cv2.VideoCapture è quello del decoder (es. FMP4), non il
+    tag del container: per sapere cosa ha scritto il muxer va letto il file.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    index = data.find(b'stsd')
+    # 'stsd' + versione/flag (4) + numero voci (4) + dimensione della voce (4) -> formato (4)
+    start = index + 16
+    if index < 0 or len(data) < start + 4:
+        return None
+    return data[start:start + 4].decode('ascii', errors='replace')
+
+
+def _probe_opencv_codec(fourcc_str: str, tmp_dir: str) -> bool:
+    """
+    Verifica che cv2.VideoWriter sappia scrivere un frame .mp4 con il codec indicato
+
+    Se il container non supporta il tag richiesto, OpenCV ripiega su un altro
+    codec (es. XVID -> mp4v): in quel caso il codec non è considerato disponibile.
+    """
+    output_path = os.path.join(tmp_dir, f'probe_{fourcc_str}.mp4')
+    try:
+        writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*fourcc_str), 10, (64, 64))
+        if not writer.isOpened():
+            writer.release()
+            return False
+        writer.write(np.zeros((64, 64, 3), dtype=np.uint8))
+        writer.release()
+    except Exception as e:
+        logger.debug(f"⚠ Codec {fourcc_str} non disponibile: {e}")
+        return False
+    if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+        return False
+    written_tag = _mp4_codec_tag(output_path)
+    if written_tag != fourcc_str:
+        logger.debug(f"⚠ Codec {fourcc_str} non disponibile in .mp4 (scritto: {written_tag})")
+        return False
+    return True
+
+
+def probe_encoders(ffmpeg_binary: str = 'ffmpeg', force: bool = False) -> Dict:
+    """
+    Verifica gli encoder disponibili (una volta per processo)
+
+    Args:
+        ffmpeg_binary: Nome o percorso dell'eseguibile ffmpeg
+        force: Se True, ripete la verifica anche se già in cache
+
+    Returns:
+        Dizionario con 'ffmpeg_path', 'ffmpeg_h264', 'opencv_codecs' (fourcc
+        funzionanti in ordine di preferenza), 'opencv_codec' (il preferito),
+        'probed_at' e 'probe_seconds'
+    """
+    with _capabilities_lock:
+        if not force and ffmpeg_binary in _capabilities:
+            return _capabilities[ffmpeg_binary]
+
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory(prefix='codec_probe_') as tmp_dir:
+            ffmpeg_path = find_ffmpeg(ffmpeg_binary)
+            ffmpeg_h264 = bool(ffmpeg_path) and _probe_ffmpeg_h264(ffmpeg_path, tmp_dir)
+            opencv_codecs = [fourcc for fourcc, _ in OPENCV_CODECS if _probe_opencv_codec(fourcc, tmp_dir)]
+
+        capabilities = {
+            'ffmpeg_path': ffmpeg_path,
+            'ffmpeg_h264': ffmpeg_h264,
+            'opencv_codecs': opencv_codecs,
+            'opencv_codec': opencv_codecs[0] if opencv_codecs else None,
+            'probed_at': datetime.now().isoformat(),
+            'probe_seconds': round(time.perf_counter() - start, 3)
+        }
+        _capabilities[ffmpeg_binary] = capabilities
+
+    logger.info(f"🎞 Encoder video: ffmpeg H.264={'sì' if ffmpeg_h264 else 'no'}, "
+                f"OpenCV={opencv_codecs or 'nessuno'} ({capabilities['probe_seconds']:.2f}s)")
+    return capabilities
+
+
+class FFmpegVideoWriter:
+    """
+    Writer che codifica con un processo ffmpeg esterno
+
+    write() copia il frame in una coda limitata e ritorna subito; un thread
+    scrive i frame sulla stdin di ffmpeg. Se la coda è piena write() attende,
+    così la memoria resta limitata anche con un encoder più lento della lettura.
+    """
+
+    def __init__(self, output_path: str, fps: float, frame_size: Tuple[int, int],
+                 ffmpeg_path: str, preset: str = 'balanced', queue_size: int = 32,
+                 segment_seconds: Optional[float] = None):
+        """
+        Avvia il processo ffmpeg
+
+        Args:
+            output_path: Percorso del file .mp4 di output (o della playlist .m3u8 per HLS)
+            fps: FPS del video
+            frame_size: (larghezza, altezza) dei frame
+            ffmpeg_path: Percorso dell'eseguibile ffmpeg
+            preset: Chiave di ENCODER_PRESETS
+            queue_size: Numero massimo di frame in attesa di codifica
+            segment_seconds: Se indicato, scrive uno stream HLS con segmenti di
+                questa durata (leggibile mentre la codifica è in corso)
+        """
+        self.output_path = output_path
+        self.frame_size = frame_size
+        x264_preset, crf = ENCODER_PRESETS.get(preset, ENCODER_PRESETS['balanced'])
+        width, height = frame_size
+
+        command = [
+            ffmpeg_path, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+            '-s', f'{width}x{height}', '-r', f'{fps:.6g}',
+            '-i', '-',
+            '-an',
+            '-c:v', 'libx264', '-preset', x264_preset, '-crf', str(crf),
+            # yuv420p richiede dimensioni pari
+            '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+            '-pix_fmt', 'yuv420p',
+        ]
+        if segment_seconds:
+            # Un keyframe all'inizio di ogni segmento; la playlist viene aggiornata
+            # solo a segmento completo (temp_file) e resta valida durante la codifica
+            segment_pattern = os.path.join(os.path.dirname(output_path), 'segment_%05d.ts')
+            command += [
+                '-force_key_frames', f'expr:gte(t,n_forced*{segment_seconds})',
+                '-f', 'hls',
+                '-hls_time', f'{segment_seconds}',
+                '-hls_list_size', '0',
+                '-hls_playlist_type', 'event',
+                '-hls_flags', 'independent_segments+temp_file',
+                '-hls_segment_filename', segment_pattern,
+                output_path
+            ]
+        else:
+            command += ['-movflags', '+faststart', output_path]
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._error: Optional[str] = None
+        self._succeeded: Optional[bool] = None
+        self._segmented = bool(segment_seconds)
+        self._thread = threading.Thread(target=self._feed, name='ffmpeg-writer', daemon=True)
+        self._thread.start()
+
+    def _feed(self):
+        """Scrive sulla pipe i frame in coda (thread dedicato)"""
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            if self._error is not None:
+                continue
+            try:
+                self._process.stdin.write(data)
+            except (BrokenPipeError, OSError) as e:
+                self._error = f"{type(e).__name__}: {e}"
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+
+    def isOpened(self) -> bool:
+        return self._process.poll() is None and self._error is None
+
+    def write(self, frame: np.ndarray):
+        """Accoda un frame BGR (il frame può essere riutilizzato subito dal chiamante)"""
+        if self._error is None:
+            self._queue.put(np.ascontiguousarray(frame).tobytes())
+
+    def release(self) -> bool:
+        """
+        Attende la fine della codifica e chiude il processo ffmpeg
+
+        Returns:
+            True se ffmpeg ha terminato correttamente, False se il processo è uscito
+            con errore o la scrittura sulla pipe è fallita (il file .mp4 incompleto
+            viene rimosso; gli stream HLS restano a chi li gestisce)
+        """
+        if self._thread is None:
+            return bool(self._succeeded)
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        stderr = self._process.stderr.read()
+        self._process.wait()
+        self._succeeded = self._process.returncode == 0 and self._error is None
+        if not self._succeeded:
+            message = (stderr or b'').decode(errors='replace').strip() or self._error
+            logger.error(f"❌ Codifica ffmpeg fallita ({self._process.returncode}): {message}")
+            if not self._segmented and os.path.exists(self.output_path):
+                os.remove(self.output_path)
+        return self._succeeded
+
+
+def release_writer(writer) -> bool:
+    """
+    Chiude un writer aperto da open_video_writer e indica se il video è stato scritto
+
+    cv2.VideoWriter.release() non riporta errori: in quel caso il risultato è True.
+
+    Returns:
+        False solo se la codifica ffmpeg è fallita
+    """
+    return writer.release() is not False
+
+
+def open_opencv_writer(output_path: str, fps: float, frame_size: Tuple[int, int],
+                       fourcc_str: str) -> Optional[cv2.VideoWriter]:
+    """
+    Apre un cv2.VideoWriter con il codec indicato
+
+    Returns:
+        VideoWriter aperto, o None se l'apertura fallisce
+    """
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*fourcc_str), fps, frame_size)
+    if writer.isOpened():
+        return writer
+    writer.release()
+    return None
+
+
+def open_video_writer(output_path: str, fps: float, frame_size: Tuple[int, int],
+                      encoder: str = 'auto', preset: str = 'balanced',
+                      ffmpeg_binary: str = 'ffmpeg'):
+    """
+    Apre il writer migliore disponibile secondo gli encoder verificati da probe_encoders
+
+    Args:
+        output_path: Percorso del file di output
+        fps: FPS del video
+        frame_size: (larghezza, altezza) dei frame
+        encoder: 'auto' (ffmpeg se disponibile), 'ffmpeg' o 'opencv'
+        preset: Preset velocità/qualità per ffmpeg (vedi ENCODER_PRESETS)
+        ffmpeg_binary: Nome o percorso dell'eseguibile ffmpeg
+
+    Returns:
+        Writer aperto (FFmpegVideoWriter o cv2.VideoWriter), o None
+    """
+    capabilities = probe_encoders(ffmpeg_binary)
+
+    if encoder in ('auto', 'ffmpeg'):
+        if capabilities['ffmpeg_h264']:
+            try:
+                writer = FFmpegVideoWriter(output_path, fps, frame_size,
+                                           capabilities['ffmpeg_path'], preset=preset)
+                if writer.isOpened():
+                    logger.info(f"📹 Encoder: ffmpeg H.264 (preset {preset})")
+                    return writer
+                writer.release()
+            except OSError as e:
+                logger.warning(f"⚠ Impossibile avviare ffmpeg: {e}")
+        elif encoder == 'ffmpeg':
+            logger.warning(f"⚠ ffmpeg H.264 non disponibile ({ffmpeg_binary}), uso cv2.VideoWriter")
+
+    fourcc_str = capabilities['opencv_codec']
+    if fourcc_str is None:
+        return None
+    writer = open_opencv_writer(output_path, fps, frame_size, fourcc_str)
+    if writer is not None:
+        logger.info(f"📹 Codec selezionato: {dict(OPENCV_CODECS)[fourcc_str]} ({fourcc_str})")
+    return writer
+
+
+def open_hls_writer(output_dir: str, fps: float, frame_size: Tuple[int, int],
+                    segment_seconds: float = 2.0, preset: str = 'fast',
+                    ffmpeg_binary: str = 'ffmpeg') -> Optional[FFmpegVideoWriter]:
+    """
+    Apre un writer che produce uno stream HLS progressivo (index.m3u8 + segmenti .ts)
+
+    Richiede ffmpeg con H.264: cv2.VideoWriter non sa scrivere segmenti.
+
+    Args:
+        output_dir: Cartella dello stream (creata se non esiste)
+        fps: FPS del video
+        frame_size: (larghezza, altezza) dei frame
+        segment_seconds: Durata dei segmenti
+        preset: Preset velocità/qualità (vedi ENCODER_PRESETS)
+        ffmpeg_binary: Nome o percorso dell'eseguibile ffmpeg
+
+    Returns:
+        Writer aperto, o None se ffmpeg H.264 non è disponibile
+    """
+    capabilities = probe_encoders(ffmpeg_binary)
+    if not capabilities['ffmpeg_h264']:
+        return None
+    os.makedirs(output_dir, exist_ok=True)
+    try:
+        writer = FFmpegVideoWriter(os.path.join(output_dir, 'index.m3u8'), fps, frame_size,
+                                   capabilities['ffmpeg_path'], preset=preset,
+                                   segment_seconds=segment_seconds)
+    except OSError as e:
+        logger.warning(f"⚠ Impossibile avviare ffmpeg per lo stream HLS: {e}")
+        return None
+    if not writer.isOpened():
+        writer.release()
+        return None
+    logger.info(f"📡 Stream HLS progressivo: {output_dir} (segmenti da {segment_seconds}s)")
+    return writer
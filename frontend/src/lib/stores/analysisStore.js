@@ -20,13 +20,16 @@ const initialState = {
   // Video/Recording
   videoFile: null,
   videoUrl: null,
-  baselineVideos: [], // Array di 5 video per baseline
+  baselineVideos: [], // Array di video per baseline (da baselineVideoLimits.min a .max)
   baselineVideoUrls: [], // URLs per preview
   recordedBlob: null,
   isRecording: false,
   selectedCamera: null,
   availableCameras: [],
   
+  // Numero di video accettati per la baseline (Config.BASELINE_MIN/MAX_VIDEOS, aggiornato da /api/health)
+  baselineVideoLimits: { min: 2, max: 20 },
+  
   // Calibrazione
   speed: null, // km/h - obbligatorio
   fps: null, // obbligatorio
@@ -55,6 +58,7 @@ const initialState = {
 
 function createAnalysisStore() {
   const { subscribe, set, update } = writable(initialState);
+  let ghostStatusTimer = null; // Polling della generazione Ghost Vision in background
   
   // Carica dati salvati da localStorage
   if (typeof window !== 'undefined') {
@@ -81,7 +85,9 @@ function createAnalysisStore() {
     // Reset completo - pulisce tutti gli stati e gli URL
     reset: () => {
       // Pulisci gli URL dei video prima di resettare
+      let currentLimits = initialState.baselineVideoLimits;
       update(state => {
+        currentLimits = state.baselineVideoLimits;
         // Revoca URL video singolo
         if (state.videoUrl) {
           URL.revokeObjectURL(state.videoUrl);
@@ -100,7 +106,8 @@ function createAnalysisStore() {
         ...initialState,
         // Mantieni baselineRanges e baselineThresholds da localStorage se esistono
         baselineRanges: initialState.baselineRanges,
-        baselineThresholds: initialState.baselineThresholds
+        baselineThresholds: initialState.baselineThresholds,
+        baselineVideoLimits: currentLimits
       };
       
       set(cleanState);
@@ -145,7 +152,21 @@ function createAnalysisStore() {
       };
     }),
     
-    // Upload multiplo baseline (5 video)
+    // Carica dal backend il numero di video accettati per la baseline
+    loadBaselineVideoLimits: async () => {
+      try {
+        const response = await fetch('http://localhost:5000/api/health');
+        const data = await response.json();
+        const limits = data.baseline_videos;
+        if (limits && limits.min > 0 && limits.max >= limits.min) {
+          update(state => ({ ...state, baselineVideoLimits: { min: limits.min, max: limits.max } }));
+        }
+      } catch (error) {
+        console.warn('⚠️ Limiti video baseline non disponibili, uso i valori predefiniti:', error);
+      }
+    },
+    
+    // Upload multiplo baseline
     setBaselineVideos: (files) => update(state => {
       state.baselineVideoUrls.forEach(url => URL.revokeObjectURL(url));
       const urls = files.map(file => URL.createObjectURL(file));
@@ -158,7 +179,7 @@ function createAnalysisStore() {
     
     // Aggiungi singolo video alla baseline
     addBaselineVideo: (file) => update(state => {
-      if (state.baselineVideos.length >= 5) return state;
+      if (state.baselineVideos.length >= state.baselineVideoLimits.max) return state;
       const newVideos = [...state.baselineVideos, file];
       const newUrl = URL.createObjectURL(file);
       const newUrls = [...state.baselineVideoUrls, newUrl];
@@ -235,6 +256,38 @@ function createAnalysisStore() {
     
     // Ghost Vision
     setGhostVision: (enabled) => update(state => ({ ...state, ghostVisionEnabled: enabled })),
+    // Interroga /api/ghost_status finché la Ghost Vision non è pronta (o in errore).
+    // Vive nello store: il componente che crea la baseline viene smontato prima della fine del job
+    watchGhostVisionStatus: (intervalMs = 2000) => {
+      if (ghostStatusTimer) clearInterval(ghostStatusTimer);
+      ghostStatusTimer = setInterval(async () => {
+        try {
+          const response = await fetch('http://localhost:5000/api/ghost_status');
+          const data = await response.json();
+          if (data.status !== 'success') return;
+          update(state => ({
+            ...state,
+            results: state.results ? {
+              ...state.results,
+              ghost_vision_status: data.ghost_vision_status,
+              ghost_vision_available: data.ghost_vision_available || false,
+              ghost_frames_count: data.ghost_frames_count || 0
+            } : state.results
+          }));
+          if (data.ghost_vision_status !== 'pending') {
+            clearInterval(ghostStatusTimer);
+            ghostStatusTimer = null;
+            if (data.ghost_vision_available) {
+              console.log('👻 Ghost Vision pronta:', data.ghost_frames_count, 'frame');
+            } else {
+              console.warn('⚠️ Ghost Vision non disponibile:', data.message);
+            }
+          }
+        } catch (error) {
+          console.warn('⚠️ Errore nel controllo stato Ghost Vision:', error);
+        }
+      }, intervalMs);
+    },
     
     // UI feedback
     setLoading: (loading) => update(state => ({ ...state, loading })),
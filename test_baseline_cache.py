@@ -0,0 +1,105 @@
+"""
+Test della cache in memoria dei file JSON delle baseline (baseline_cache)
+"""
+import sys
+import os
+
+# Aggiungi backend al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import json
+
+from baseline_cache import CachedJsonFile, file_signature, write_json_atomic
+
+
+def _rewrite_in_place(path, old, new, mtime_ns):
+    """Riscrive il file senza os.replace (stesso inode) con un mtime scelto"""
+    with open(path) as f:
+        text = f.read()
+    with open(path, 'w') as f:
+        f.write(text.replace(old, new))
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_cached_until_file_changes(tmp_path):
+    """Finché la firma non cambia get restituisce lo stesso oggetto senza rileggere il file"""
+    path = str(tmp_path / 'baseline.json')
+    cache = CachedJsonFile(path)
+    assert cache.get() is None
+
+    cache.write({'view_type': 'posterior', 'n_videos': 5})
+    first = cache.get()
+    assert first == {'view_type': 'posterior', 'n_videos': 5}
+    assert cache.get() is first
+
+    # Un'altra cache sullo stesso file (altro worker) legge il file una volta sola
+    other = CachedJsonFile(path)
+    assert other.get() == first and other.get() is other.get()
+
+
+def test_invalidated_by_external_writes(tmp_path):
+    """Scritture di altri processi: sostituzione atomica, riscrittura sul posto e rimozione"""
+    path = str(tmp_path / 'baseline.json')
+    cache = CachedJsonFile(path)
+    cache.write({'n_videos': 5})
+    assert cache.get()['n_videos'] == 5
+
+    write_json_atomic(path, {'n_videos': 7})
+    assert cache.get()['n_videos'] == 7
+
+    # Stessa dimensione e stesso inode: cambia solo il mtime
+    mtime_ns = os.stat(path).st_mtime_ns
+    size = os.path.getsize(path)
+    _rewrite_in_place(path, '7', '8', mtime_ns + 1_000_000)
+    assert os.path.getsize(path) == size
+    assert cache.get()['n_videos'] == 8
+
+    os.remove(path)
+    assert cache.get() is None
+    assert file_signature(path) is None
+
+
+def test_update_reads_latest_version(tmp_path):
+    """update parte dal contenuto corrente del file, anche se scritto da un altro processo"""
+    path = str(tmp_path / 'baseline.json')
+    cache = CachedJsonFile(path)
+    cache.write({'n_videos': 5, 'ghost_frames': 0})
+    write_json_atomic(path, {'n_videos': 6, 'ghost_frames': 0})
+
+    written = cache.update(lambda current: dict(current, ghost_frames=120))
+    assert written == {'n_videos': 6, 'ghost_frames': 120}
+    with open(path) as f:
+        assert json.load(f) == written
+    assert cache.get() is written
+
+    # fn che restituisce None lascia il file invariato
+    signature = file_signature(path)
+    assert cache.update(lambda current: None) is None
+    assert file_signature(path) == signature
+
+
+def test_write_does_not_alias_caller_dict(tmp_path):
+    """Il contenuto in cache è una copia: modificare il dizionario passato a write non lo cambia"""
+    cache = CachedJsonFile(str(tmp_path / 'baseline.json'))
+    data = {'n_videos': 5}
+    cache.write(data)
+    data['n_videos'] = 99
+    assert cache.get()['n_videos'] == 5
+
+
+def test_invalidate_and_invalid_json(tmp_path):
+    path = str(tmp_path / 'baseline.json')
+    cache = CachedJsonFile(path)
+    cache.write({'n_videos': 5})
+    first = cache.get()
+    cache.invalidate()
+    second = cache.get()
+    assert second == first and second is not first
+
+    with open(path, 'w') as f:
+        f.write('{non valido')
+    try:
+        cache.get()
+        assert False, "JSON non valido accettato"
+    except ValueError:
+        pass
@@ -0,0 +1,112 @@
+"""
+Test del registro delle baseline per atleta, vista e velocità (baseline_registry)
+"""
+import sys
+import os
+
+# Aggiungi backend al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import numpy as np
+
+from baseline_registry import BaselineRegistry
+from running_stats import BASELINE_METRICS, QuantileSketch
+
+TOLERANCE_KMH = 0.5
+MAX_GAP_KMH = 3.0
+
+
+def _baseline(speed_kmh, pelvic_mean, view_type='posterior', fps=60.0):
+    baseline_stats = {'view_type': view_type, 'speed_kmh': speed_kmh, 'fps': fps, 'n_videos': 5,
+                      'created_at': f'2026-01-{int(speed_kmh):02d}T10:00:00'}
+    for metric in BASELINE_METRICS[view_type]:
+        baseline_stats[metric] = {'mean': 10.0, 'std': 1.0, 'frame_std': 2.0, 'min': 5.0, 'max': 15.0}
+    if view_type == 'posterior':
+        sketch = QuantileSketch()
+        sketch.push_many(np.linspace(pelvic_mean - 1.0, pelvic_mean + 1.0, 500))
+        baseline_stats['pelvic_drop'] = {'mean': pelvic_mean, 'std': 0.4, 'frame_std': 0.6,
+                                         'min': pelvic_mean - 1.0, 'max': pelvic_mean + 1.0,
+                                         'sketch': sketch.to_dict()}
+    return baseline_stats
+
+
+def _registry(tmp_path):
+    registry = BaselineRegistry(str(tmp_path / 'baselines'))
+    registry.register(_baseline(10.0, 2.0), 'anna')
+    registry.register(_baseline(12.0, 3.0), 'anna')
+    registry.register(_baseline(16.0, 4.0), 'anna')
+    registry.register(_baseline(10.0, 2.5), 'luca')
+    return registry
+
+
+def test_select_exact_and_nearest(tmp_path):
+    """Stessa velocità ('exact') o la più vicina entro la tolleranza ('nearest')"""
+    registry = _registry(tmp_path)
+
+    baseline_stats, mode = registry.select('anna', 'posterior', 12.0, TOLERANCE_KMH, MAX_GAP_KMH)
+    assert mode == 'exact' and baseline_stats['pelvic_drop']['mean'] == 3.0
+
+    # Entro la tolleranza vince la più vicina, anche se si potrebbe interpolare
+    baseline_stats, mode = registry.select('anna', 'posterior', 11.7, TOLERANCE_KMH, MAX_GAP_KMH)
+    assert mode == 'nearest' and baseline_stats['speed_kmh'] == 12.0
+    baseline_stats, mode = registry.select('anna', 'posterior', 9.6, TOLERANCE_KMH, MAX_GAP_KMH)
+    assert mode == 'nearest' and baseline_stats['speed_kmh'] == 10.0
+    # Le baseline sono per atleta
+    baseline_stats, mode = registry.select('luca', 'posterior', 10.2, TOLERANCE_KMH, MAX_GAP_KMH)
+    assert mode == 'nearest' and baseline_stats['pelvic_drop']['mean'] == 2.5
+
+
+def test_select_interpolated(tmp_path):
+    """Tra due velocità vicine si interpolano statistiche e quantili dei frame"""
+    registry = _registry(tmp_path)
+    baseline_stats, mode = registry.select('anna', 'posterior', 11.0, TOLERANCE_KMH, MAX_GAP_KMH)
+    assert mode == 'interpolated'
+    assert baseline_stats['interpolated_from'] == [10.0, 12.0]
+    assert baseline_stats['speed_kmh'] == 11.0
+    pelvic = baseline_stats['pelvic_drop']
+    assert np.isclose(pelvic['mean'], 2.5) and np.isclose(pelvic['frame_std'], 0.6)
+    assert np.isclose(pelvic['min'], 1.5) and np.isclose(pelvic['max'], 3.5)
+    # Quantili dei frame interpolati: la mediana si sposta con la media
+    assert abs(QuantileSketch.from_dict(pelvic['sketch']).quantile(0.5) - 2.5) < 0.02
+    assert baseline_stats['athlete_id'] == 'anna' and baseline_stats['fps'] == 60.0
+
+
+def test_select_none(tmp_path):
+    """Nessuna baseline utilizzabile: velocità troppo lontane, vista o atleta senza baseline"""
+    registry = _registry(tmp_path)
+    # Tra 12 e 16 km/h la distanza supera max_interpolation_gap_kmh
+    assert registry.select('anna', 'posterior', 14.0, TOLERANCE_KMH, MAX_GAP_KMH) == (None, 'none')
+    # Fuori dall'intervallo delle velocità e oltre la tolleranza
+    assert registry.select('anna', 'posterior', 18.0, TOLERANCE_KMH, MAX_GAP_KMH) == (None, 'none')
+    assert registry.select('anna', 'lateral', 12.0, TOLERANCE_KMH, MAX_GAP_KMH) == (None, 'none')
+    assert registry.select('marco', 'posterior', 12.0, TOLERANCE_KMH, MAX_GAP_KMH) == (None, 'none')
+    assert registry.select('../anna', 'posterior', 12.0, TOLERANCE_KMH, MAX_GAP_KMH) == (None, 'none')
+
+
+def test_register_rejects_invalid_athlete_id(tmp_path):
+    """L'ID atleta diventa un nome di cartella: niente percorsi"""
+    registry = BaselineRegistry(str(tmp_path / 'baselines'))
+    for athlete_id in ('../other', '', 'a/b'):
+        try:
+            registry.register(_baseline(10.0, 2.0), athlete_id)
+            assert False, f"athlete_id accettato: {athlete_id!r}"
+        except ValueError:
+            pass
+    assert len(registry) == 0
+
+
+def test_registry_sees_other_workers(tmp_path):
+    """Due istanze sulla stessa cartella (worker diversi) vedono le baseline registrate o rimosse dall'altra"""
+    worker_a = BaselineRegistry(str(tmp_path / 'baselines'))
+    worker_b = BaselineRegistry(str(tmp_path / 'baselines'))
+
+    path = worker_a.register(_baseline(10.0, 2.0), 'anna')
+    assert worker_b.speeds('anna', 'posterior') == [10.0]
+    assert worker_b.athletes() == ['anna']
+
+    worker_a.register(_baseline(10.0, 2.4), 'anna')
+    assert worker_b.get('anna', 'posterior', 10.0)['pelvic_drop']['mean'] == 2.4
+
+    os.remove(path)
+    assert worker_b.speeds('anna', 'posterior') == []
+    assert worker_b.select('anna', 'posterior', 10.0, TOLERANCE_KMH, MAX_GAP_KMH) == (None, 'none')
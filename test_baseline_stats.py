@@ -0,0 +1,279 @@
+"""
+Test delle statistiche incrementali della baseline (running_stats)
+Confronta gli accumulatori con il calcolo originale su tutte le serie dei frame
+"""
+import sys
+import os
+
+# Aggiungi backend al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import numpy as np
+
+from scipy import stats as scipy_stats
+from scipy.special import ndtri
+
+from running_stats import (BASELINE_METRICS, MAD_TO_STD, MIN_STD_THRESHOLDS, BaselineAccumulator,
+                           QuantileSketch, RunningStats, median_abs_deviation, select_median,
+                           trimmed_mean, winsorized_std)
+
+
+def _symmetry(left, right):
+    """Indice di simmetria come PoseEngine._calculate_symmetry"""
+    mean_value = (abs(left) + abs(right)) / 2.0
+    if mean_value < 1e-6:
+        return 100.0
+    return max(0.0, 100.0 - abs(left - right) / mean_value * 100.0)
+
+
+def _posterior_video(rng, n_frames, with_symmetry=True):
+    left = rng.normal(8.0, 1.5, n_frames)
+    right = rng.normal(7.5, 1.2, n_frames)
+    cadence = np.concatenate([np.zeros(10), rng.normal(176.0, 3.0, n_frames - 10)])
+    video = {
+        'view_type': 'posterior',
+        'n_frames': n_frames,
+        'left_knee_valgus': left.tolist(),
+        'right_knee_valgus': right.tolist(),
+        'pelvic_drop': rng.normal(2.5, 0.6, n_frames).tolist(),
+        'cadence': cadence.tolist(),
+        'avg_cadence': float(cadence[cadence > 0].mean())
+    }
+    if with_symmetry:
+        video['knee_valgus_symmetry'] = rng.normal(94.0, 2.0, n_frames).tolist()
+    return video
+
+
+def _lateral_video(rng, n_frames):
+    return {
+        'view_type': 'lateral',
+        'n_frames': n_frames,
+        'overstriding': rng.normal(0.08, 0.01, n_frames).tolist(),
+        'knee_flexion_ic': rng.normal(18.0, 2.0, n_frames).tolist(),
+        'trunk_lean': rng.normal(6.0, 1.0, n_frames).tolist(),
+        'avg_gct': float(rng.normal(0.24, 0.02))
+    }
+
+
+def _legacy_baseline_stats(videos_data):
+    """
+    Riferimento: create_baseline_stats prima degli accumulatori
+
+    Media, Min e Max su tutti i frame concatenati, StdDev tra le medie dei video
+    con la soglia minima per metrica.
+    """
+    view_type = videos_data[0]['view_type']
+    metrics = BASELINE_METRICS[view_type]
+    all_values = {metric: [] for metric in metrics}
+    video_means = {metric: [] for metric in metrics}
+    for video in videos_data:
+        if view_type == 'posterior':
+            series_metrics = ('left_knee_valgus', 'right_knee_valgus', 'pelvic_drop')
+            cadence = [c for c in video.get('cadence', []) if c > 0]
+            single = {'cadence': np.mean(cadence) if cadence else video.get('avg_cadence', 0.0)}
+            if video.get('knee_valgus_symmetry'):
+                all_values['knee_valgus_symmetry'].extend(video['knee_valgus_symmetry'])
+                video_means['knee_valgus_symmetry'].append(np.mean(video['knee_valgus_symmetry']))
+            else:
+                single['knee_valgus_symmetry'] = _symmetry(np.mean(video['left_knee_valgus']),
+                                                           np.mean(video['right_knee_valgus']))
+        else:
+            series_metrics = ('overstriding', 'knee_flexion_ic', 'trunk_lean')
+            single = {'ground_contact_time': video.get('avg_gct', 0.0)}
+        for metric in series_metrics:
+            all_values[metric].extend(video[metric])
+            video_means[metric].append(np.mean(video[metric]))
+        for metric, value in single.items():
+            all_values[metric].append(value)
+            video_means[metric].append(value)
+
+    baseline_stats = {'view_type': view_type}
+    for metric in metrics:
+        values = np.array(all_values[metric])
+        baseline_stats[metric] = {
+            'mean': float(np.mean(values)),
+            'std': float(max(np.std(video_means[metric]), MIN_STD_THRESHOLDS[metric])),
+            'min': float(np.min(values)),
+            'max': float(np.max(values))
+        }
+    baseline_stats['n_videos'] = len(videos_data)
+    baseline_stats['total_frames'] = sum(video['n_frames'] for video in videos_data)
+    return baseline_stats
+
+
+def _assert_same_stats(stats, expected):
+    assert stats['view_type'] == expected['view_type']
+    assert stats['n_videos'] == expected['n_videos']
+    assert stats['total_frames'] == expected['total_frames']
+    for metric in BASELINE_METRICS[expected['view_type']]:
+        for key in ('mean', 'std', 'min', 'max'):
+            assert np.isclose(stats[metric][key], expected[metric][key], rtol=1e-10, atol=1e-12), \
+                f"{metric}.{key}: {stats[metric][key]} != {expected[metric][key]}"
+
+
+def test_running_stats_matches_numpy():
+    """push, push_many e merge danno media, varianza, min e max di np su tutti i valori"""
+    rng = np.random.default_rng(0)
+    blocks = [rng.normal(1e4, 3.0, n) for n in (1, 7, 250, 40)]
+    single, blocked, merged = RunningStats(), RunningStats(), RunningStats()
+    for block in blocks:
+        for value in block:
+            single.push(value)
+        blocked.push_many(block)
+        part = RunningStats()
+        part.push_many(block)
+        merged.merge(part)
+    values = np.concatenate(blocks)
+    for stats in (single, blocked, merged, RunningStats.from_dict(merged.to_dict())):
+        assert stats.count == len(values)
+        assert np.isclose(stats.mean, values.mean(), rtol=1e-12)
+        assert np.isclose(stats.variance, values.var(), rtol=1e-9)
+        assert stats.min == values.min() and stats.max == values.max()
+
+
+def test_accumulator_parity_posterior():
+    """Con lo stimatore 'mean' l'accumulatore riproduce create_baseline_stats (vista posteriore)"""
+    rng = np.random.default_rng(1)
+    videos = [_posterior_video(rng, n, with_symmetry=(i != 2)) for i, n in enumerate((120, 95, 150, 80, 110))]
+    accumulator = BaselineAccumulator('posterior', symmetry_fn=_symmetry)
+    for video in videos:
+        accumulator.add_video(video)
+    stats = accumulator.stats()
+    assert stats['estimator'] == 'mean'
+    _assert_same_stats(stats, _legacy_baseline_stats(videos))
+
+
+def test_accumulator_parity_lateral():
+    """Con lo stimatore 'mean' l'accumulatore riproduce create_baseline_stats (vista laterale)"""
+    rng = np.random.default_rng(2)
+    videos = [_lateral_video(rng, n) for n in (60, 200, 90)]
+    accumulator = BaselineAccumulator('lateral', symmetry_fn=_symmetry)
+    for video in videos:
+        accumulator.add_video(video)
+    _assert_same_stats(accumulator.stats(), _legacy_baseline_stats(videos))
+
+
+def test_accumulator_parity_any_video_count():
+    """La parità vale da 2 a 20 video (BASELINE_MIN_VIDEOS..BASELINE_MAX_VIDEOS)"""
+    rng = np.random.default_rng(3)
+    for n_videos in (2, 7, 20):
+        videos = [_posterior_video(rng, int(rng.integers(40, 120))) for _ in range(n_videos)]
+        accumulator = BaselineAccumulator('posterior', symmetry_fn=_symmetry)
+        for video in videos:
+            accumulator.add_video(video)
+        _assert_same_stats(accumulator.stats(), _legacy_baseline_stats(videos))
+
+
+def _mid_rank(values, x):
+    """Rango medio empirico: frazione < x più metà della frazione = x"""
+    values = np.asarray(values)
+    return np.mean(values < x) + 0.5 * np.mean(values == x)
+
+
+def _video_sketches(blocks):
+    """Uno sketch per video, uniti come nella baseline"""
+    sketch = QuantileSketch()
+    for block in blocks:
+        video_sketch = QuantileSketch()
+        video_sketch.push_many(block)
+        sketch.merge(video_sketch)
+    return sketch
+
+
+def test_quantile_sketch_accuracy():
+    """Quantili e cdf dello sketch entro l'errore di rango atteso (~1/size) su dati continui"""
+    rng = np.random.default_rng(4)
+    blocks = [rng.normal(rng.normal(8.0, 0.5), 1.5, int(rng.integers(50, 2000))) for _ in range(12)]
+    values = np.sort(np.concatenate(blocks))
+    sketch = _video_sketches(blocks)
+    assert len(sketch.values) <= sketch.size
+    assert np.isclose(sketch.count, len(values))
+
+    q = np.linspace(0.01, 0.99, 99)
+    # Rango empirico dei quantili stimati
+    ranks = np.searchsorted(values, sketch.quantile(q)) / len(values)
+    assert np.max(np.abs(ranks - q)) < 0.02
+
+    x = np.quantile(values, q)
+    assert np.max(np.abs(sketch.cdf(x) - q)) < 0.02
+    assert sketch.cdf(values[0] - 10.0) == 0.0 and sketch.cdf(values[-1] + 10.0) == 1.0
+    assert np.isnan(sketch.cdf(np.nan))
+
+    restored = QuantileSketch.from_dict(sketch.to_dict())
+    assert np.array_equal(restored.quantile(q), sketch.quantile(q))
+
+
+def test_quantile_sketch_ties():
+    """Metriche a gradini: un valore presente nella baseline ha il suo rango medio, non il più alto"""
+    rng = np.random.default_rng(5)
+    levels = np.array([0.20, 0.22, 0.24, 0.26, 0.28])
+    probabilities = np.array([0.1, 0.2, 0.4, 0.2, 0.1])
+    blocks = [rng.choice(levels, size=int(rng.integers(300, 900)), p=probabilities) for _ in range(8)]
+    values = np.concatenate(blocks)
+    sketch = _video_sketches(blocks)
+
+    for level in levels:
+        assert abs(sketch.cdf(level) - _mid_rank(values, level)) < 0.02
+        # Lo stesso valore arrotondato diversamente (fusioni dello sketch) ha lo stesso rango
+        assert np.isclose(sketch.cdf(level * (1 + 1e-15)), sketch.cdf(level))
+    # Il valore più frequente è al centro: Z equivalente ~0, non Critico
+    assert abs(ndtri(sketch.cdf(0.24))) < 0.1
+
+
+def test_quantile_sketch_constant_metric():
+    """Metrica costante: il valore della baseline ha rango 0.5, valori diversi vanno agli estremi"""
+    sketch = _video_sketches([np.full(400, 176.0), np.full(250, 176.0)])
+    assert sketch.cdf(176.0) == 0.5
+    assert sketch.cdf(170.0) == 0.0 and sketch.cdf(180.0) == 1.0
+
+
+def test_robust_estimators_match_reference():
+    """Mediana, MAD, media troncata e StdDev winsorizzata con selezione O(n) come le versioni con sort"""
+    rng = np.random.default_rng(6)
+    for n in (1, 2, 5, 6, 101, 1000):
+        values = rng.standard_t(3, n) * 2.0 + 10.0
+        assert np.isclose(select_median(values), np.median(values))
+        assert np.isclose(median_abs_deviation(values), np.median(np.abs(values - np.median(values))))
+        if n >= 5:
+            assert np.isclose(trimmed_mean(values, 0.2), scipy_stats.trim_mean(values, 0.2))
+            k = int(0.2 * n)
+            ordered = np.sort(values)
+            winsorized = np.clip(values, ordered[k], ordered[n - k - 1])
+            assert np.isclose(winsorized_std(values, 0.2), winsorized.std())
+    assert np.isnan(select_median([]))
+    assert winsorized_std([3.0]) == 0.0
+
+
+def test_accumulator_robust_estimators():
+    """Con 'median' e 'trimmed' un video anomalo non sposta il centro della baseline"""
+    rng = np.random.default_rng(7)
+    videos = [_posterior_video(rng, 100) for _ in range(6)]
+    videos[3]['pelvic_drop'] = (np.asarray(videos[3]['pelvic_drop']) + 15.0).tolist()
+
+    results = {}
+    for estimator in ('mean', 'median', 'trimmed'):
+        accumulator = BaselineAccumulator('posterior', symmetry_fn=_symmetry, estimator=estimator)
+        for video in videos:
+            accumulator.add_video(video)
+        results[estimator] = accumulator.stats()
+
+    # Con lo stimatore 'median' ogni video è riassunto dalla mediana dei suoi frame
+    centers = [np.median(video['pelvic_drop']) for video in videos]
+    median = results['median']['pelvic_drop']
+    assert np.isclose(median['mean'], np.median(centers))
+    assert np.isclose(median['std'], max(MAD_TO_STD * median_abs_deviation(centers),
+                                         MIN_STD_THRESHOLDS['pelvic_drop']))
+    assert np.isclose(median['classic']['mean'], results['mean']['pelvic_drop']['mean'])
+    assert results['trimmed']['trim_fraction'] == 0.2
+
+    clean_center = np.mean([c for i, c in enumerate(centers) if i != 3])
+    assert results['mean']['pelvic_drop']['mean'] > clean_center + 2.0
+    for estimator in ('median', 'trimmed'):
+        assert abs(results[estimator]['pelvic_drop']['mean'] - clean_center) < 0.5
+        assert results[estimator]['pelvic_drop']['std'] < results['mean']['pelvic_drop']['std']
+
+    try:
+        BaselineAccumulator('posterior', symmetry_fn=_symmetry, estimator='mode')
+        assert False, "Stimatore non valido accettato"
+    except ValueError:
+        pass
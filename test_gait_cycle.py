@@ -0,0 +1,131 @@
+"""
+Test del rilevamento e dell'allineamento del ciclo del passo (gait_cycle)
+"""
+import sys
+import os
+
+# Aggiungi backend al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import numpy as np
+
+from gait_cycle import LEFT_ANKLE, align_to_cycle, raw_ankle_height, select_gait_cycles, stride_peaks
+
+
+def _height(phase):
+    """Altezza della caviglia per fase del passo (massimo a fase 0, forma asimmetrica)"""
+    phase = 2 * np.pi * np.asarray(phase, dtype=np.float64)
+    return 0.5 + 0.1 * np.cos(phase) + 0.04 * np.sin(phase) ** 3
+
+
+def _landmarks(height, missing=()):
+    """Landmark (n, 33, 3) con la caviglia sinistra all'altezza data, NaN nei frame senza pose"""
+    image_landmarks = np.full((len(height), 33, 3), 0.5)
+    image_landmarks[:, LEFT_ANKLE, 1] = 1.0 - height
+    image_landmarks[list(missing)] = np.nan
+    return image_landmarks
+
+
+def test_cycle_bounds_on_stride_peaks():
+    """Inizio e fine del ciclo cadono su picchi; si evitano falcate anomale e frame senza pose"""
+    fps, stride = 60.0, 45
+    durations = [45, 45, 60, 45, 44, 46, 45, 45]
+    phase = np.concatenate([np.arange(d) / d + i for i, d in enumerate(durations)] + [[len(durations)]])
+    height = _height(phase)
+    image_landmarks = _landmarks(height, missing=range(300, 320))
+
+    peaks = stride_peaks(height, fps)
+    assert np.array_equal(peaks, np.r_[0, np.cumsum(durations)][1:-1])
+
+    for n_cycles in (1, 2):
+        cycle = select_gait_cycles(image_landmarks, fps, n_cycles=n_cycles)
+        assert cycle['start'] in peaks and cycle['end'] in peaks
+        assert cycle['length'] == cycle['end'] - cycle['start']
+        assert abs(cycle['length'] - n_cycles * stride) <= n_cycles
+        assert cycle['n_cycles'] == n_cycles and cycle['stride_frames'] == stride
+        assert len(cycle['ankle_height']) == cycle['length']
+        # Né la falcata lunga (frame 90-150) né quella con pose mancanti (frame 285-329)
+        assert cycle['end'] <= 90 or cycle['start'] >= 150
+        assert cycle['end'] <= 285 or cycle['start'] >= 330
+
+
+def test_raw_signal_input():
+    """Il segnale (n,) di raw_ankle_height dà lo stesso ciclo dei landmark completi"""
+    fps = 30.0
+    height = _height(np.arange(200) / 24.0 + 0.3)
+    image_landmarks = _landmarks(height, missing=(5, 6, 90))
+    raw = raw_ankle_height(image_landmarks)
+    assert raw.shape == (200,) and np.isnan(raw[90])
+
+    expected = select_gait_cycles(image_landmarks, fps, n_cycles=2)
+    assert select_gait_cycles(raw, fps, n_cycles=2) == expected
+    assert expected['start'] % 24 == 17 and expected['length'] == 48
+
+
+def test_not_enough_strides():
+    """Servono almeno n_cycles + 1 picchi"""
+    fps = 60.0
+    height = _height(np.arange(100) / 45.0 + 0.5)   # picchi ai frame 22 e 67
+    assert len(stride_peaks(height, fps)) == 2
+    assert select_gait_cycles(_landmarks(height), fps, n_cycles=1) is not None
+    assert select_gait_cycles(_landmarks(height), fps, n_cycles=2) is None
+    assert select_gait_cycles(_landmarks(height[:60]), fps) is None
+    # Video senza pose o fermo
+    assert select_gait_cycles(_landmarks(np.full(300, 0.5)), fps) is None
+    assert select_gait_cycles(np.full(300, np.nan), fps) is None
+
+
+GHOST_FPS = 60.0
+GHOST_STRIDE = 45
+GHOST_HEIGHT = _height(np.arange(600) / GHOST_STRIDE)
+
+
+def _ghost_cycle(start):
+    """Ciclo ghost di una falcata che inizia al frame start (anche fuori da un picco)"""
+    return {'start': start, 'end': start + GHOST_STRIDE, 'length': GHOST_STRIDE, 'n_cycles': 1,
+            'stride_frames': float(GHOST_STRIDE),
+            'ankle_height': GHOST_HEIGHT[start:start + GHOST_STRIDE].tolist()}
+
+
+def _check_alignment(user_height, user_fps, cycle, min_r=0.99):
+    frame_map = align_to_cycle(user_height, user_fps, cycle, GHOST_FPS)
+    assert frame_map.dtype == np.int32 and len(frame_map) == len(user_height)
+    assert frame_map.min() >= cycle['start'] and frame_map.max() < cycle['end']
+    # La caviglia del ghost segue quella dell'utente
+    r = np.corrcoef(GHOST_HEIGHT[frame_map], user_height)[0, 1]
+    assert r > min_r, f"r = {r:.3f}"
+    return frame_map
+
+
+def test_align_other_cadence_and_phase():
+    """Cadenza, FPS e fase iniziale diverse dal ciclo ghost; ciclo che non parte da un picco"""
+    user_fps = 30.0
+    user_height = _height(np.arange(200) / 26.0 + 0.3)
+    peaks = stride_peaks(user_height, user_fps)
+    assert len(peaks) >= 2 and peaks[0] > 0
+
+    for start in (0, 10, 30):
+        frame_map = _check_alignment(user_height, user_fps, _ghost_cycle(start))
+        # Ai picchi dell'utente il ghost è al suo picco (frame multiplo della falcata)
+        assert all(min(m % GHOST_STRIDE, GHOST_STRIDE - m % GHOST_STRIDE) <= 1 for m in frame_map[peaks])
+        # Anche prima della prima falcata la fase continua all'indietro
+        r = np.corrcoef(GHOST_HEIGHT[frame_map[:peaks[0]]], user_height[:peaks[0]])[0, 1]
+        assert r > 0.95, f"r prima del primo picco = {r:.3f}"
+
+    # Ciclo scelto da select_gait_cycles sul video baseline
+    cycle = select_gait_cycles(_landmarks(GHOST_HEIGHT), GHOST_FPS)
+    _check_alignment(user_height, user_fps, cycle)
+
+
+def test_align_single_stride_fallback():
+    """Con meno di due picchi il ciclo è riprodotto alla sua durata, con lo sfasamento migliore"""
+    user_fps = 30.0
+    user_height = _height(np.arange(35) / 22.5 + 0.3)
+    assert len(stride_peaks(user_height, user_fps)) == 1
+    for start in (0, 10, 30):
+        _check_alignment(user_height, user_fps, _ghost_cycle(start))
+
+    # Segnale piatto (nessuna pose): il ciclo parte dall'inizio, 2 frame ghost per frame utente
+    frame_map = align_to_cycle(np.zeros(50), user_fps, _ghost_cycle(10), GHOST_FPS)
+    assert np.abs(frame_map[:22] - (10 + 2 * np.arange(22))).max() <= 1
+    assert frame_map[23] == 10
@@ -0,0 +1,176 @@
+"""
+Test dell'archivio dei frame Ghost Vision (ghost_store)
+"""
+import sys
+import os
+
+# Aggiungi backend al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import json
+import struct
+
+import cv2
+import numpy as np
+
+from ghost_store import (GhostFrameStore, GhostPack, GhostPackWriter, PACK_FILENAME, PACK_MAGIC,
+                         decode_contour, encode_contour, legacy_frame_filename, pack_frames)
+
+
+def _payload(frame_number):
+    """Payload di lunghezza variabile riconoscibile dal numero di frame"""
+    return struct.pack('<I', frame_number) * (1 + frame_number % 5)
+
+
+def _write_pack(folder, frame_numbers, meta=None):
+    writer = GhostPackWriter(os.path.join(folder, PACK_FILENAME))
+    for frame_number in frame_numbers:
+        writer.add(frame_number, _payload(frame_number))
+    return writer.close(meta)
+
+
+def test_pack_round_trip(tmp_path):
+    """Ogni frame scritto si rilegge uguale, con meta e intervallo di byte nel file"""
+    frame_numbers = [0, 1, 2, 5, 6, 9, 40]
+    pack_path = _write_pack(str(tmp_path), frame_numbers, {'fps': 60.0, 'format': 'png'})
+    assert not os.path.exists(f"{pack_path}.tmp")
+
+    pack = GhostPack(pack_path)
+    assert len(pack) == len(frame_numbers)
+    assert pack.meta == {'fps': 60.0, 'format': 'png', 'version': 1}
+    assert pack.format == 'png'
+    with open(pack_path, 'rb') as f:
+        data = f.read()
+    assert data.startswith(PACK_MAGIC) and data.endswith(PACK_MAGIC)
+    for frame_number in frame_numbers:
+        assert pack.has(frame_number)
+        assert pack.read(frame_number) == _payload(frame_number)
+        offset, length = pack.byte_range(frame_number)
+        assert data[offset:offset + length] == _payload(frame_number)
+    assert pack.read(3) is None and pack.byte_range(3) is None and not pack.has(3)
+
+
+def test_read_many_and_pack_frames(tmp_path):
+    """Letture a blocchi di frame contigui e archivio in memoria con lo stesso formato del file"""
+    frame_numbers = [0, 1, 2, 5, 6, 9, 40]
+    pack_path = _write_pack(str(tmp_path), frame_numbers, {'fps': 60.0})
+    pack = GhostPack(pack_path)
+
+    frames = pack.read_many([40, 1, 0, 2, 3, 6, 5, 1])
+    assert frames == [(n, _payload(n)) for n in (0, 1, 2, 5, 6, 40)]
+    assert pack.read_many([3, 4]) == []
+
+    in_memory = pack_frames([(n, _payload(n)) for n in frame_numbers], {'fps': 60.0})
+    with open(pack_path, 'rb') as f:
+        assert in_memory == f.read()
+
+
+def test_writer_abort_and_invalid_pack(tmp_path):
+    """Un archivio interrotto non viene pubblicato; un file senza footer è rifiutato"""
+    pack_path = str(tmp_path / PACK_FILENAME)
+    writer = GhostPackWriter(pack_path)
+    writer.add(0, _payload(0))
+    writer.abort()
+    assert os.listdir(tmp_path) == []
+
+    with open(pack_path, 'wb') as f:
+        f.write(PACK_MAGIC + b'\x00' * 64)
+    try:
+        GhostPack(pack_path)
+        assert False, "Archivio non valido accettato"
+    except ValueError:
+        pass
+
+
+def test_store_legacy_then_pack(tmp_path):
+    """Cartelle con i vecchi PNG singoli restano leggibili; l'archivio ha la precedenza e clear rimuove tutto"""
+    folder = str(tmp_path)
+    for frame_number in (3, 4, 7):
+        with open(os.path.join(folder, legacy_frame_filename(frame_number)), 'wb') as f:
+            f.write(_payload(frame_number))
+
+    store = GhostFrameStore(folder)
+    assert store.open_pack() is None
+    assert store.frame_count() == 3
+    assert store.has_frame(4) and not store.has_frame(5)
+    assert store.resolve_frame(7) == 7 and store.resolve_frame(8) is None
+
+    _write_pack(folder, range(10), {'format': 'png'})
+    assert store.frame_count() == 10 and store.has_frame(5)
+    assert store.frame_png(store.open_pack(), 5) == _payload(5)
+
+    assert store.remove_legacy_frames() == 3
+    assert store.frame_count() == 10
+    assert store.clear() == 10
+    assert store.frame_count() == 0 and os.listdir(folder) == []
+
+
+def test_store_sees_regenerated_pack(tmp_path):
+    """Un'altra istanza (altro worker) vede subito l'archivio rigenerato"""
+    folder = str(tmp_path)
+    _write_pack(folder, range(10))
+    store = GhostFrameStore(folder)
+    assert store.frame_count() == 10
+
+    other = GhostFrameStore(folder)
+    _write_pack(folder, range(4))
+    assert other.frame_count() == 4 and store.frame_count() == 4
+    assert not store.has_frame(6)
+
+
+def test_contour_round_trip(tmp_path):
+    """Nel formato 'contour' il poligono si rilegge uguale e il PNG è disegnato su richiesta"""
+    square = np.array([[10, 10], [50, 10], [50, 40], [10, 40]])
+    assert np.array_equal(decode_contour(encode_contour(square)), square)
+    assert decode_contour(encode_contour(np.empty((0, 2)))).shape == (0, 2)
+
+    folder = str(tmp_path)
+    writer = GhostPackWriter(os.path.join(folder, PACK_FILENAME))
+    writer.add(0, encode_contour(square))
+    writer.add(1, encode_contour(np.empty((0, 2))))
+    writer.close({'format': 'contour', 'video_width': 64, 'video_height': 48, 'color': [0, 255, 255]})
+
+    store = GhostFrameStore(folder)
+    pack = store.open_pack()
+    assert pack.format == 'contour'
+    assert np.array_equal(pack.read_contour(0), square)
+
+    png = store.frame_png(pack, 0)
+    ghost_img = cv2.imdecode(np.frombuffer(png, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    assert ghost_img.shape == (48, 64, 4)
+    # Opaco dentro la silhouette, trasparente fuori
+    assert ghost_img[25, 30, 3] == 255 and tuple(ghost_img[25, 30, :3]) == (0, 255, 255)
+    assert ghost_img[2, 2, 3] == 0
+    # Il secondo accesso usa la cache dei PNG
+    assert store.frame_png(pack, 0) is png
+
+    # Nessuna silhouette: frame presente ma vuoto
+    empty = cv2.imdecode(np.frombuffer(store.frame_png(pack, 1), dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    assert empty.shape == (48, 64, 4) and not empty[:, :, 3].any()
+    assert store.frame_png(pack, 2) is None
+
+
+def test_pack_replaced_while_opening(tmp_path, monkeypatch):
+    """Se l'archivio viene rigenerato durante l'apertura, indice, etag e dati restano della stessa versione"""
+    folder = str(tmp_path)
+    pack_path = _write_pack(folder, range(10))
+    real_loads = json.loads
+    swapped = []
+
+    def loads_then_swap(*args, **kwargs):
+        # Sostituzione dopo la lettura di indice e meta
+        result = real_loads(*args, **kwargs)
+        if not swapped:
+            swapped.append(True)
+            writer = GhostPackWriter(pack_path)
+            writer.add(0, b'xyzz')
+            writer.close()
+        return result
+
+    monkeypatch.setattr(json, 'loads', loads_then_swap)
+    pack = GhostPack(pack_path)
+    monkeypatch.undo()
+
+    assert swapped and len(pack) == 10
+    assert pack.read(0) == _payload(0) and pack.read(9) == _payload(9)
+    assert pack.etag != GhostPack(pack_path).etag
@@ -10,6 +10,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
 
 from baseline_manager import BaselineHistory
 import json
+import numpy as np
 import tempfile
 import shutil
 
@@ -225,6 +226,72 @@ def test_baseline_history():
             pass
 
 
+def _posterior_run(value):
+    """Analisi posteriore con tutte le metriche al valore indicato"""
+    keys = ['left_knee_valgus', 'right_knee_valgus', 'pelvic_drop', 'cadence', 'knee_valgus_symmetry']
+    return {
+        'viewType': 'posterior',
+        'anomaly_level': 'Ottimale',
+        'metrics': {key: {'value': value, 'z_score': 0.0, 'level': 'Ottimale'} for key in keys}
+    }
+
+
+def test_welford_stats_persist_across_reload(tmp_path):
+    """Media/StdDev esatte (Welford) ed EWMA restano corrette ricaricando lo storico a ogni corsa"""
+    from running_stats import ExponentialStats
+
+    history_file = str(tmp_path / 'baseline_history.json')
+    values = [8.5, 8.3, 9.5, 7.9, 8.8, 10.2, 8.1]
+    ewma = ExponentialStats(0.3)
+    for i, value in enumerate(values):
+        # Nuova istanza a ogni corsa: le statistiche devono venire solo dal file
+        bh = BaselineHistory(history_file, str(tmp_path / 'ghost_frames'), ewma_alpha=0.3)
+        assert bh.update(_posterior_run(value), f'run_{i:03d}')['status'] == 'success'
+        ewma.push(value)
+
+    stats = BaselineHistory(history_file, str(tmp_path / 'ghost_frames')).load()['global_stats']['pelvic_drop']
+    assert stats['count'] == len(values)
+    assert abs(stats['mean'] - np.mean(values)) < 1e-12
+    assert abs(stats['std'] - np.std(values)) < 1e-12
+    assert stats['min'] == min(values) and stats['max'] == max(values)
+    assert abs(stats['ewma']['mean'] - ewma.mean) < 1e-12
+    assert abs(stats['ewma']['std'] - ewma.std) < 1e-12
+
+
+def test_old_global_stats_migration(tmp_path):
+    """Uno storico salvato con sole media/StdDev viene ripreso con count = corse e M2 dalla StdDev"""
+    history_file = str(tmp_path / 'baseline_history.json')
+    old_values = [8.0, 9.0, 10.0]
+    old_stats = {
+        'mean': float(np.mean(old_values)),
+        'std': float(np.std(old_values)),
+        'min': min(old_values),
+        'max': max(old_values)
+    }
+    keys = ['left_knee_valgus', 'right_knee_valgus', 'pelvic_drop', 'cadence', 'knee_valgus_symmetry']
+    with open(history_file, 'w') as f:
+        json.dump({
+            'version': '1.0',
+            'run_count': len(old_values),
+            'best_run_id': 'run_000',
+            'best_run_error': 0.1,
+            'view_type': 'posterior',
+            'global_stats': {key: dict(old_stats) for key in keys},
+            'runs_history': []
+        }, f)
+
+    bh = BaselineHistory(history_file, str(tmp_path / 'ghost_frames'))
+    result = bh.update(_posterior_run(12.0), 'run_003')
+    assert result['status'] == 'success'
+
+    stats = bh.load()['global_stats']['pelvic_drop']
+    all_values = old_values + [12.0]
+    assert stats['count'] == len(all_values)
+    assert abs(stats['mean'] - np.mean(all_values)) < 1e-12
+    assert abs(stats['std'] - np.std(all_values)) < 1e-12
+    assert stats['max'] == 12.0
+
+
 if __name__ == '__main__':
     success = test_baseline_history()
     sys.exit(0 if success else 1)
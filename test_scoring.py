@@ -0,0 +1,217 @@
+"""
+Test della valutazione vettoriale rispetto alla baseline (scoring)
+Timeline delle anomalie per frame e valutazione di più analisi insieme
+"""
+import sys
+import os
+
+# Aggiungi backend al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import numpy as np
+
+from running_stats import BASELINE_METRICS, BaselineAccumulator
+from scoring import frame_timeline, score_records
+
+POSTERIOR_BASELINE = {
+    'view_type': 'posterior',
+    'left_knee_valgus': {'mean': 8.0, 'std': 0.8, 'frame_std': 2.0, 'min': 2.0, 'max': 14.0},
+    'right_knee_valgus': {'mean': 7.5, 'std': 0.8, 'frame_std': 2.0, 'min': 2.0, 'max': 13.0},
+    'pelvic_drop': {'mean': 2.5, 'std': 0.3, 'frame_std': 0.5, 'min': 0.5, 'max': 4.5},
+    'cadence': {'mean': 176.0, 'std': 2.0, 'frame_std': 4.0, 'min': 165.0, 'max': 188.0},
+    'knee_valgus_symmetry': {'mean': 94.0, 'std': 1.0, 'frame_std': 2.0, 'min': 85.0, 'max': 100.0}
+}
+
+
+def _constant_video(n_frames, baseline=POSTERIOR_BASELINE):
+    """Video con tutte le metriche posteriori alla media della baseline"""
+    video = {'view_type': 'posterior', 'n_frames': n_frames}
+    for metric in BASELINE_METRICS['posterior']:
+        video[metric] = np.full(n_frames, baseline[metric]['mean'])
+    return video
+
+
+def _symmetry(left, right):
+    mean_value = (abs(left) + abs(right)) / 2.0
+    return 100.0 if mean_value < 1e-6 else 100.0 - abs(left - right) / mean_value * 100.0
+
+
+def _random_video(rng, n_frames, pelvic_shift=0.0):
+    """Video posteriore con rumore per frame attorno ai valori tipici"""
+    return {
+        'view_type': 'posterior',
+        'n_frames': n_frames,
+        'left_knee_valgus': rng.normal(8.0, 2.0, n_frames),
+        'right_knee_valgus': rng.normal(7.5, 2.0, n_frames),
+        'pelvic_drop': rng.normal(2.5 + pelvic_shift, 0.5, n_frames),
+        'cadence': np.round(rng.normal(176.0, 1.0, n_frames)),
+        'knee_valgus_symmetry': rng.normal(94.0, 2.0, n_frames)
+    }
+
+
+def test_timeline_z_scores_per_frame():
+    """Z per frame con la StdDev tra frame, segno invertito per la simmetria, None dove manca il valore"""
+    video = _constant_video(50)
+    video['pelvic_drop'] = np.linspace(1.0, 4.0, 50)
+    video['knee_valgus_symmetry'] = np.full(50, 90.0)
+    video['cadence'] = np.r_[np.zeros(10), np.full(40, 176.0)]
+
+    timeline = frame_timeline(video, POSTERIOR_BASELINE, window_frames=1)
+    metrics = timeline['metrics']
+    assert metrics == BASELINE_METRICS['posterior']
+
+    z_pelvic = timeline['z'][metrics.index('pelvic_drop')]
+    expected = np.round((video['pelvic_drop'] - 2.5) / (0.5 + 1e-6), 2)
+    assert np.allclose(z_pelvic, expected)
+    # Simmetria sotto la media = peggio: Z positivo
+    assert timeline['z'][metrics.index('knee_valgus_symmetry')][0] == 2.0
+    # Cadenza non ancora calcolata (0) = valore mancante
+    z_cadence = timeline['z'][metrics.index('cadence')]
+    assert z_cadence[:10] == [None] * 10 and z_cadence[10] == 0.0
+    assert len(timeline['levels']) == 50
+
+
+def test_timeline_levels_and_segments():
+    """Tratti 'Attenzione' e 'Critico' con inizio, fine (esclusa) e |Z| massimo"""
+    video = _constant_video(300)
+    video['pelvic_drop'][100:150] = 2.5 + 1.5 * 0.5   # Z = 1.5 -> Attenzione
+    video['pelvic_drop'][200:230] = 2.5 + 3.0 * 0.5   # Z = 3.0 -> Critico
+
+    timeline = frame_timeline(video, POSTERIOR_BASELINE, window_frames=1)
+    levels = np.array(timeline['levels'])
+    assert (levels[:100] == 0).all() and (levels[100:150] == 1).all()
+    assert (levels[150:200] == 0).all() and (levels[200:230] == 2).all() and (levels[230:] == 0).all()
+    assert timeline['segments'] == [
+        {'start': 100, 'end': 150, 'level': 'Attenzione', 'max_z': 1.5},
+        {'start': 200, 'end': 230, 'level': 'Critico', 'max_z': 3.0}
+    ]
+    assert timeline['level_names'][2] == 'Critico'
+
+
+def test_timeline_window_filters_short_spikes():
+    """La media mobile ignora un picco di pochi frame, che resta visibile in 'rolling_max_z'"""
+    video = _constant_video(200)
+    video['left_knee_valgus'][100:102] = 8.0 + 5.0 * 2.0   # Z = 5 per due frame
+
+    timeline = frame_timeline(video, POSTERIOR_BASELINE, window_frames=31)
+    assert timeline['segments'] == []
+    assert max(timeline['rolling_max_z']) == 5.0
+    assert timeline['rolling_max_z'][85] == 5.0 and timeline['rolling_max_z'][50] == 0.0
+
+    # Un'anomalia lunga resta, con bordi spostati al più di metà finestra
+    video['left_knee_valgus'][100:160] = 8.0 + 5.0 * 2.0
+    segments = [s for s in frame_timeline(video, POSTERIOR_BASELINE, window_frames=31)['segments']
+                if s['level'] == 'Critico']
+    assert len(segments) == 1
+    assert abs(segments[0]['start'] - 100) <= 15 and abs(segments[0]['end'] - 160) <= 15
+
+
+def test_timeline_empty_video():
+    timeline = frame_timeline(_constant_video(0), POSTERIOR_BASELINE, window_frames=15)
+    assert timeline['levels'] == [] and timeline['segments'] == [] and timeline['max_z'] == []
+
+
+def test_percentile_timeline_in_distribution():
+    """Con il metodo 'percentile' un video simile alla baseline non ha tratti critici; uno spostato sì"""
+    rng = np.random.default_rng(8)
+    accumulator = BaselineAccumulator('posterior', symmetry_fn=_symmetry)
+    for _ in range(5):
+        accumulator.add_video(_random_video(rng, 600))
+    baseline = accumulator.stats()
+
+    timeline = frame_timeline(_random_video(rng, 600), baseline, window_frames=15, method='percentile')
+    assert timeline['method'] == 'percentile'
+    levels = np.array(timeline['levels'])
+    # Cadenza a gradini (valori interi ripetuti): un valore tipico ha rango centrale
+    assert np.mean(levels == 2) < 0.01
+    assert not any(s['level'] == 'Critico' for s in timeline['segments'])
+
+    shifted = frame_timeline(_random_video(rng, 600, pelvic_shift=1.5), baseline,
+                             window_frames=15, method='percentile')
+    assert np.mean(np.array(shifted['levels']) == 2) > 0.9
+
+
+def test_score_records_table():
+    """Valore e Z per metrica, |Z| massimo e stato generale, righe ordinate per |Z| massimo"""
+    records = [
+        {'source': 'history', 'name': 'run_001', 'values': {'pelvic_drop': 2.5, 'cadence': 176.0}},
+        {'source': 'file', 'name': 'run_002', 'values': {'pelvic_drop': 3.5, 'left_knee_valgus': 8.4}},
+        {'source': 'history', 'name': 'run_003', 'values': {'knee_valgus_symmetry': 92.5}},
+        {'source': 'file', 'name': 'run_004', 'values': {}}
+    ]
+    table = score_records(records, POSTERIOR_BASELINE)
+    columns = table['columns']
+    assert table['view_type'] == 'posterior'
+    assert columns[:2] == ['source', 'name'] and columns[-2:] == ['max_z_score', 'overall_status']
+    assert len(columns) == 2 + 2 * len(BASELINE_METRICS['posterior']) + 2
+
+    rows = {row[1]: dict(zip(columns, row)) for row in table['rows']}
+    # Z-Score con la StdDev tra video ('std')
+    assert rows['run_002']['pelvic_drop_z'] == round(1.0 / (0.3 + 1e-6), 4)
+    assert rows['run_002']['left_knee_valgus_z'] == round(0.4 / (0.8 + 1e-6), 4)
+    assert rows['run_002']['overall_status'] == 'Critico'
+    assert rows['run_003']['knee_valgus_symmetry_z'] == round(1.5 / (1.0 + 1e-6), 4)
+    assert rows['run_003']['overall_status'] == 'Attenzione'
+    assert rows['run_001']['max_z_score'] == 0.0 and rows['run_001']['overall_status'] == 'Ottimale'
+    # Metriche mancanti: None; nessuna metrica: nessun |Z| massimo, ultima riga
+    assert rows['run_001']['right_knee_valgus_value'] is None and rows['run_001']['right_knee_valgus_z'] is None
+    assert rows['run_004']['max_z_score'] is None
+
+    assert [row[1] for row in table['rows']] == ['run_002', 'run_003', 'run_001', 'run_004']
+    assert table['by_level'] == {'Ottimale': 2, 'Attenzione': 1, 'Critico': 1}
+
+
+def test_score_records_matches_single_scores():
+    """Il calcolo vettoriale coincide con lo Z-Score di ogni valore preso da solo"""
+    rng = np.random.default_rng(9)
+    metrics = BASELINE_METRICS['posterior']
+    records = [{'source': 'history', 'name': f'run_{i:03d}',
+                'values': {m: float(POSTERIOR_BASELINE[m]['mean'] + rng.normal(0, 2) * POSTERIOR_BASELINE[m]['std'])
+                           for m in metrics}}
+               for i in range(40)]
+    table = score_records(records, POSTERIOR_BASELINE)
+    by_name = {record['name']: record for record in records}
+    for row in table['rows']:
+        row = dict(zip(table['columns'], row))
+        z_values = []
+        for m in metrics:
+            stats = POSTERIOR_BASELINE[m]
+            z = (by_name[row['name']]['values'][m] - stats['mean']) / (stats['std'] + 1e-6)
+            z = -z if m == 'knee_valgus_symmetry' else z
+            assert row[f'{m}_z'] == round(z, 4)
+            z_values.append(abs(z))
+        assert row['max_z_score'] == round(max(z_values), 4)
+    max_z = [row[-2] for row in table['rows']]
+    assert max_z == sorted(max_z, reverse=True)
+
+
+def test_score_records_empty():
+    table = score_records([], POSTERIOR_BASELINE)
+    assert table['rows'] == [] and table['by_level'] == {'Ottimale': 0, 'Attenzione': 0, 'Critico': 0}
+
+
+def test_rescore_baseline_names_only(tmp_path, monkeypatch):
+    """Dai client si accettano solo nomi di baseline salvate: un percorso non legge altri file"""
+    import json
+    from config import Config
+    from rescore_analyses import load_baseline
+
+    saved = tmp_path / 'saved_analyses'
+    saved.mkdir()
+    monkeypatch.setattr(Config, 'SAVED_ANALYSES_FOLDER', str(saved))
+    with open(saved / 'easy_run.json', 'w') as f:
+        json.dump({'raw_baseline_stats': POSTERIOR_BASELINE}, f)
+    outside = tmp_path / 'secret.json'
+    with open(outside, 'w') as f:
+        json.dump(POSTERIOR_BASELINE, f)
+
+    assert load_baseline('easy_run', allow_paths=False)['view_type'] == 'posterior'
+    assert load_baseline('../saved_analyses/easy_run.json', allow_paths=False)['view_type'] == 'posterior'
+    for name in (str(outside), '../secret.json', '../secret'):
+        try:
+            load_baseline(name, allow_paths=False)
+            assert False, f"Percorso accettato: {name}"
+        except ValueError:
+            pass
+    # Da riga di comando i percorsi restano ammessi
+    assert load_baseline(str(outside))['view_type'] == 'posterior'
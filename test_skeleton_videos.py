@@ -0,0 +1,230 @@
+"""
+Test dei video con scheletro renderizzati su richiesta (skeleton_videos)
+"""
+import sys
+import os
+
+# Aggiungi backend al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import stat
+import time
+
+import cv2
+import numpy as np
+
+from skeleton_videos import SkeletonVideoStore
+
+
+class FakeJobManager:
+    """JobManager che registra i job senza eseguirli (lo stato lo decide il test)"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.submitted = []
+
+    def submit(self, kind, fn, *args, **kwargs):
+        job_id = f"job{len(self.submitted) + 1}"
+        self.jobs[job_id] = {'id': job_id, 'kind': kind, 'status': 'queued'}
+        self.submitted.append((job_id, fn, args))
+        return job_id
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+
+def _video_data(n_frames=10, fps=30.0):
+    return {'image_landmarks': np.full((n_frames, 33, 3), 0.5), 'fps': fps}
+
+
+def _upload(folder, name='corsa 1.mp4', content=b'video sorgente'):
+    path = os.path.join(folder, name)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+def _store(tmp_path, **kwargs):
+    folder = tmp_path / 'processed_videos'
+    folder.mkdir(exist_ok=True)
+    return SkeletonVideoStore(str(folder), FakeJobManager(), **kwargs)
+
+
+def test_publish_lazy_keep_source(tmp_path):
+    """keep_source collega o copia il caricamento in sources/ e lo lascia al chiamante"""
+    store = _store(tmp_path)
+    upload = _upload(str(tmp_path))
+
+    filename = store.publish(_video_data(), upload, lazy=True, keep_source=True)
+    landmarks = store.load_landmarks(filename)
+    stored = os.path.join(store.folder, 'sources', landmarks['source_name'])
+    assert os.path.exists(upload) and os.path.exists(stored)
+    with open(stored, 'rb') as f:
+        assert f.read() == b'video sorgente'
+    assert landmarks['fps'] == 30.0 and landmarks['landmarks'].shape == (10, 33, 3)
+    assert store.can_render(filename) and not store.is_ready(filename)
+
+    # Un nuovo caricamento con lo stesso nome sostituisce sorgente e video renderizzato
+    with open(store.video_path(filename), 'wb') as f:
+        f.write(b'vecchio video')
+    os.remove(upload)
+    upload = _upload(str(tmp_path), content=b'nuovo sorgente')
+    assert store.publish(_video_data(), upload, lazy=True, keep_source=True) == filename
+    with open(stored, 'rb') as f:
+        assert f.read() == b'nuovo sorgente'
+    assert not store.is_ready(filename) and os.path.exists(upload)
+
+
+def test_publish_keep_source_copy_fallback(tmp_path, monkeypatch):
+    """Se il collegamento non è possibile (es. altro filesystem) il sorgente viene copiato"""
+    def no_link(src, dst):
+        raise OSError("Collegamento non supportato")
+
+    monkeypatch.setattr(os, 'link', no_link)
+    store = _store(tmp_path)
+    upload = _upload(str(tmp_path))
+    filename = store.publish(_video_data(), upload, lazy=True, keep_source=True)
+    stored = os.path.join(store.folder, 'sources', store.load_landmarks(filename)['source_name'])
+    assert os.stat(stored).st_ino != os.stat(upload).st_ino
+    with open(stored, 'rb') as f:
+        assert f.read() == b'video sorgente'
+
+
+def test_publish_lazy_moves_source(tmp_path):
+    """Senza keep_source il caricamento viene spostato in sources/"""
+    store = _store(tmp_path)
+    upload = _upload(str(tmp_path))
+    filename = store.publish(_video_data(), upload, lazy=True)
+    assert not os.path.exists(upload) and store.can_render(filename)
+
+    # Senza landmark non c'è niente da renderizzare
+    upload = _upload(str(tmp_path), name='altra.mp4')
+    assert store.publish({'image_landmarks': None, 'fps': 30.0}, upload, lazy=True) is None
+    assert os.path.exists(upload)
+
+
+def test_request_render_error_reported_once(tmp_path):
+    """Un job in corso viene riusato; un errore viene riportato una volta, poi si riprova"""
+    store = _store(tmp_path)
+    jobs = store.jobs
+
+    first = store.request_render('corsa_1_skeleton.mp4')
+    assert store.request_render('corsa_1_skeleton.mp4') == first
+    jobs.jobs[first]['status'] = 'running'
+    assert store.request_render('corsa_1_skeleton.mp4') == first
+    assert len(jobs.submitted) == 1
+
+    jobs.jobs[first]['status'] = 'error'
+    assert store.request_render('corsa_1_skeleton.mp4') == first
+    retry = store.request_render('corsa_1_skeleton.mp4')
+    assert retry != first and len(jobs.submitted) == 2
+    assert jobs.submitted[1][2] == ('corsa_1_skeleton.mp4',)
+
+
+def _source(store, name, size, age_hours):
+    path = os.path.join(store.folder, 'sources', name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+    mtime = time.time() - age_hours * 3600
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_prune_sources_age_and_size(tmp_path):
+    """Rimossi i sorgenti scaduti, poi i più vecchi oltre il limite di spazio"""
+    store = _store(tmp_path, max_source_age_hours=24)
+    old = _source(store, 'a_skeleton.mp4', 1000, age_hours=30)
+    recent = _source(store, 'b_skeleton.mp4', 1000, age_hours=2)
+    assert store.prune_sources() == 1
+    assert not os.path.exists(old) and os.path.exists(recent)
+
+    megabyte = 1024 * 1024
+    store = _store(tmp_path, max_sources_mb=2)
+    os.remove(recent)
+    paths = [_source(store, f'{name}_skeleton.mp4', megabyte, age_hours=age)
+             for name, age in (('c', 5), ('d', 4), ('e', 3), ('f', 2))]
+    assert store.prune_sources() == 2
+    assert [os.path.exists(p) for p in paths] == [False, False, True, True]
+
+    # Nessun limite: non si rimuove niente
+    assert _store(tmp_path).prune_sources() == 0
+    assert os.path.exists(paths[2])
+
+
+def test_prune_skips_rendering_sources(tmp_path):
+    """I sorgenti con un rendering in coda o in corso non vengono rimossi"""
+    store = _store(tmp_path, max_source_age_hours=1)
+    rendering = _source(store, 'a_skeleton.mp4', 100, age_hours=5)
+    idle = _source(store, 'b_skeleton.mp4', 100, age_hours=5)
+    job_id = store.request_render('a_skeleton.mp4')
+
+    for status in ('queued', 'running'):
+        store.jobs.jobs[job_id]['status'] = status
+        assert store.prune_sources() == (1 if status == 'queued' else 0)
+        assert os.path.exists(rendering) and not os.path.exists(idle)
+
+    store.jobs.jobs[job_id]['status'] = 'done'
+    assert store.prune_sources() == 1 and not os.path.exists(rendering)
+
+
+# Supera la verifica di libx264 (sorgente lavfi) ma fallisce ogni codifica reale
+FAILING_FFMPEG = """#!/bin/sh
+for a in "$@"; do last="$a"; done
+case "$*" in *lavfi*) printf 'x' > "$last"; exit 0;; esac
+cat > /dev/null
+printf 'parziale' > "$last"
+echo "errore di codifica" >&2
+exit 1
+"""
+
+
+class FakeJob:
+    def __init__(self):
+        self.updates = []
+
+    def update(self, **kwargs):
+        self.updates.append(kwargs)
+
+
+def test_render_falls_back_to_opencv(tmp_path, monkeypatch):
+    """Se ffmpeg fallisce il video viene renderizzato di nuovo con cv2.VideoWriter"""
+    from config import Config
+
+    ffmpeg_path = tmp_path / 'ffmpeg'
+    ffmpeg_path.write_text(FAILING_FFMPEG)
+    ffmpeg_path.chmod(ffmpeg_path.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(Config, 'FFMPEG_BINARY', str(ffmpeg_path))
+    monkeypatch.setattr(Config, 'SKELETON_VIDEO_ENCODER', 'ffmpeg')
+
+    upload = str(tmp_path / 'corsa.avi')
+    writer = cv2.VideoWriter(upload, cv2.VideoWriter_fourcc(*'MJPG'), 30.0, (64, 48))
+    for i in range(20):
+        writer.write(np.full((48, 64, 3), i * 10, dtype=np.uint8))
+    writer.release()
+
+    store = _store(tmp_path)
+    filename = store.publish(_video_data(n_frames=20), upload, lazy=True)
+    source = os.path.join(store.folder, 'sources', store.load_landmarks(filename)['source_name'])
+
+    from pose_engine import PoseEngine
+    from video_encoder import FFmpegVideoWriter
+    open_writer = PoseEngine.open_skeleton_writer
+    writers = []
+
+    def recording_open(*args, **kwargs):
+        writer = open_writer(*args, **kwargs)
+        writers.append(type(writer))
+        return writer
+
+    monkeypatch.setattr(PoseEngine, 'open_skeleton_writer', staticmethod(recording_open))
+
+    result = store._render(FakeJob(), filename)
+    assert writers == [FFmpegVideoWriter, cv2.VideoWriter]
+    assert result == {'filename': filename, 'frames': 20}
+    cap = cv2.VideoCapture(store.video_path(filename))
+    assert int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) == 20
+    cap.release()
+    # Niente file temporanei; il sorgente non serve più
+    assert not [name for name in os.listdir(store.folder) if name.startswith('.rendering_')]
+    assert not os.path.exists(source)
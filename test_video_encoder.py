@@ -0,0 +1,86 @@
+"""
+Test della codifica dei video con scheletro (video_encoder)
+"""
+import sys
+import os
+
+# Aggiungi backend al path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import stat
+
+import numpy as np
+
+from video_encoder import FFmpegVideoWriter, _mp4_codec_tag, _probe_opencv_codec, release_writer
+
+# Scrive un output parziale e termina con errore (o con successo se FAKE_FFMPEG_OK è impostata)
+FAKE_FFMPEG = """#!/bin/sh
+for a in "$@"; do last="$a"; done
+cat > /dev/null
+printf 'parziale' > "$last"
+if [ -n "$FAKE_FFMPEG_OK" ]; then exit 0; fi
+echo "errore di codifica" >&2
+exit 1
+"""
+
+
+def _fake_ffmpeg(tmp_path):
+    path = tmp_path / 'ffmpeg'
+    path.write_text(FAKE_FFMPEG)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+def _write_frames(writer, n_frames=5, frame_size=(32, 24)):
+    width, height = frame_size
+    for i in range(n_frames):
+        writer.write(np.full((height, width, 3), i, dtype=np.uint8))
+
+
+def test_release_reports_ffmpeg_failure(tmp_path):
+    """ffmpeg uscito con errore: release() restituisce False e il file parziale viene rimosso"""
+    output_path = str(tmp_path / 'video_skeleton.mp4')
+    writer = FFmpegVideoWriter(output_path, 30.0, (32, 24), _fake_ffmpeg(tmp_path))
+    _write_frames(writer)
+    assert writer.release() is False
+    assert not os.path.exists(output_path)
+    # Una seconda chiamata riporta lo stesso risultato
+    assert writer.release() is False
+
+    writer = FFmpegVideoWriter(output_path, 30.0, (32, 24), _fake_ffmpeg(tmp_path))
+    _write_frames(writer)
+    assert release_writer(writer) is False
+
+
+def test_release_success_keeps_file(tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_FFMPEG_OK', '1')
+    output_path = str(tmp_path / 'video_skeleton.mp4')
+    writer = FFmpegVideoWriter(output_path, 30.0, (32, 24), _fake_ffmpeg(tmp_path))
+    _write_frames(writer)
+    assert release_writer(writer) is True
+    assert os.path.exists(output_path)
+
+
+def test_release_writer_opencv(tmp_path):
+    """cv2.VideoWriter.release() non riporta errori: release_writer restituisce True"""
+    import cv2
+    writer = cv2.VideoWriter(str(tmp_path / 'video.avi'), cv2.VideoWriter_fourcc(*'MJPG'), 30.0, (32, 24))
+    _write_frames(writer)
+    assert release_writer(writer) is True
+
+
+def test_mp4_codec_tag(tmp_path):
+    """Il codec tag è letto dal box 'stsd' del file scritto da cv2"""
+    import cv2
+    output_path = str(tmp_path / 'video.mp4')
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), 10.0, (64, 48))
+    assert writer.isOpened()
+    _write_frames(writer, frame_size=(64, 48))
+    writer.release()
+    assert _mp4_codec_tag(output_path) == 'mp4v'
+    assert _probe_opencv_codec('mp4v', str(tmp_path))
+
+    # File senza box 'stsd' o mancante
+    (tmp_path / 'vuoto.mp4').write_bytes(b'\0' * 64)
+    assert _mp4_codec_tag(str(tmp_path / 'vuoto.mp4')) is None
+    assert _mp4_codec_tag(str(tmp_path / 'mancante.mp4')) is None